@@ -0,0 +1,449 @@
+"""Price alert rules evaluated in-stream by the sync.
+
+Rules live in ALERT_RULES, one row per user and rule:
+- `price`: PRICE_USD against THRESHOLD
+- `change_24h`: PRICE_CHANGE_24H_PCT against THRESHOLD
+- `rsi`: the running RSI(14) against THRESHOLD, e.g. above 70 or below 30
+- `ema_cross`: EMA(14) crossing EMA(30); DIRECTION is the side it crosses to
+- `volume_spike`: VOLUME_24H_USD as a multiple of its running average
+
+DIRECTION is `above`, `below` or `outside` (absolute value above
+THRESHOLD). A rule with a NULL COIN_ID applies to every coin. The `rsi`
+and `ema_cross` kinds read the sync's running indicators, so they need
+SNOWFLAKE_SYNC_INDICATORS.
+
+The engine indexes rules by coin, so a sync batch only evaluates the rules
+of the coins it wrote. A rule fires at most once per coin within its
+COOLDOWN_SECONDS. Fired alerts are inserted into the ALERTS outbox in the
+sync transaction, and consumers read rows whose DELIVERED_AT is NULL. The
+cooldown and per-coin state are kept only once the sync commits.
+"""
+import json
+import os
+import sys
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from indicators import EMA_PERIODS, RSI_PERIOD
+from price_dedup import get_state_dir, to_micros
+from records import as_price_batch
+
+ALERT_RULES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ALERT_RULES (
+    RULE_ID STRING NOT NULL,
+    USER_ID STRING NOT NULL,
+    COIN_ID STRING,
+    NAME STRING,
+    KIND STRING NOT NULL,
+    DIRECTION STRING NOT NULL,
+    THRESHOLD FLOAT,
+    COOLDOWN_SECONDS NUMBER NOT NULL,
+    ENABLED BOOLEAN DEFAULT TRUE,
+    CREATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (RULE_ID)
+)
+"""
+
+# Outbox of fired alerts; delivery sets DELIVERED_AT
+ALERTS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS ALERTS (
+    ALERT_ID STRING NOT NULL,
+    RULE_ID STRING NOT NULL,
+    USER_ID STRING NOT NULL,
+    COIN_ID STRING NOT NULL,
+    TIMESTAMP TIMESTAMP_NTZ NOT NULL,
+    KIND STRING NOT NULL,
+    VALUE FLOAT,
+    THRESHOLD FLOAT,
+    MESSAGE STRING,
+    CREATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    DELIVERED_AT TIMESTAMP_NTZ,
+    PRIMARY KEY (ALERT_ID)
+)
+"""
+
+RULES_SELECT_SQL = """
+SELECT RULE_ID, USER_ID, COIN_ID, NAME, KIND, DIRECTION, THRESHOLD, COOLDOWN_SECONDS
+FROM ALERT_RULES
+WHERE ENABLED
+"""
+
+RULE_INSERT_SQL = """
+INSERT INTO ALERT_RULES (RULE_ID, USER_ID, COIN_ID, NAME, KIND, DIRECTION, THRESHOLD, COOLDOWN_SECONDS)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+ALERTS_INSERT_SQL = """
+INSERT INTO ALERTS (ALERT_ID, RULE_ID, USER_ID, COIN_ID, TIMESTAMP, KIND, VALUE, THRESHOLD, MESSAGE)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+PENDING_ALERTS_SQL = """
+SELECT ALERT_ID, RULE_ID, USER_ID, COIN_ID, TIMESTAMP, KIND, VALUE, THRESHOLD, MESSAGE
+FROM ALERTS
+WHERE DELIVERED_AT IS NULL
+ORDER BY TIMESTAMP, ALERT_ID
+LIMIT %s
+"""
+
+KINDS = ('price', 'change_24h', 'rsi', 'ema_cross', 'volume_spike')
+DIRECTIONS = ('above', 'below', 'outside')
+
+KIND_LABELS = {
+    'price': 'price',
+    'change_24h': '24h change %',
+    'rsi': f'RSI({RSI_PERIOD})',
+    'volume_spike': '24h volume / average',
+}
+
+DEFAULT_COOLDOWN_SECONDS = 3600
+DEFAULT_REFRESH_SECONDS = 60
+# Observations in the running volume average, and needed before volume_spike fires
+VOLUME_PERIOD = 30
+
+# The thresholds of the PRICE_ALERTS view, as (rule suffix, name, kind, direction, threshold).
+# They overlap on purpose: each rule fires on its own, so a move beyond 10%
+# raises both High Volatility and Significant Rise or Drop, where the view's
+# CASE labels it High Volatility only
+DEFAULT_RULES = [
+    ('high-volatility', 'High Volatility', 'change_24h', 'outside', 10.0),
+    ('significant-rise', 'Significant Rise', 'change_24h', 'above', 5.0),
+    ('significant-drop', 'Significant Drop', 'change_24h', 'below', -5.0),
+]
+
+Rule = namedtuple('Rule', ['rule_id', 'user_id', 'coin_id', 'name', 'kind', 'direction', 'threshold', 'cooldown'])
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def validate_rule(rule):
+    if rule.kind not in KINDS:
+        raise ValueError(f"Unknown alert kind {rule.kind!r}; expected one of {', '.join(KINDS)}")
+    if rule.direction not in DIRECTIONS:
+        raise ValueError(f"Unknown alert direction {rule.direction!r}; expected one of {', '.join(DIRECTIONS)}")
+    if rule.kind == 'ema_cross':
+        if rule.direction == 'outside':
+            raise ValueError("ema_cross rules cross 'above' or 'below'")
+    elif rule.threshold is None:
+        raise ValueError(f"{rule.kind} rules need a threshold")
+    if rule.cooldown is None or rule.cooldown < 0:
+        raise ValueError("Cooldown must be zero or more seconds")
+
+def exceeds(direction, value, threshold):
+    if direction == 'above':
+        return value > threshold
+    if direction == 'below':
+        return value < threshold
+    return abs(value) > threshold
+
+def crossed(direction, previous, current):
+    """Whether EMA(fast) - EMA(slow) moved from `previous` to `current` across zero towards `direction`"""
+    if direction == 'above':
+        return previous <= 0 < current
+    return previous >= 0 > current
+
+def describe(rule, coin_id, value):
+    label = rule.name or rule.rule_id
+    if rule.kind == 'ema_cross':
+        fast, slow = EMA_PERIODS
+        return f"{label}: {coin_id} EMA({fast}) crossed {rule.direction} EMA({slow})"
+    return f"{label}: {coin_id} {KIND_LABELS[rule.kind]} {value:.6g} is {rule.direction} {rule.threshold:g}"
+
+def write_alerts(cur, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        cur.executemany(ALERTS_INSERT_SQL, rows[start:start + batch_size])
+    return len(rows)
+
+class AlertEngine:
+    """Rules indexed by coin, evaluated against each batch of written prices.
+
+    Per coin it keeps the time of the last evaluated price, the last
+    EMA(fast) - EMA(slow) difference and a running volume average; per
+    (rule, coin) the time the rule last fired. Both are staged during a
+    sync, kept on commit and persisted to a JSON file like the indicator
+    state. Rules are reloaded from ALERT_RULES once `refresh_seconds` have
+    passed; with `refresh_seconds=None` they are only set by set_rules().
+    """
+
+    def __init__(self, path=None, refresh_seconds=DEFAULT_REFRESH_SECONDS):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.rules = {}
+        self.index = {}
+        self.any_coin = ()
+        self.observations = {}
+        self.last_fired = {}
+        self.evaluated = 0
+        self.suppressed = 0
+        self._pending_observations = {}
+        self._pending_fired = {}
+        self._loaded_at = None
+        self._reconciled = False
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+                self.observations = state['observations']
+                self.last_fired = {(rule_id, coin_id): micros for rule_id, coin_id, micros in state['fired']}
+            except (OSError, ValueError, KeyError) as e:
+                print_debug(f"⚠️ Ignoring unreadable alert state {path}: {e}")
+
+    def set_rules(self, rules):
+        """Replace the rules and rebuild the coin -> rules index"""
+        index = {}
+        any_coin = []
+        self.rules = {}
+        for rule in rules:
+            self.rules[rule.rule_id] = rule
+            if rule.coin_id is None:
+                any_coin.append(rule)
+            else:
+                index.setdefault(rule.coin_id, []).append(rule)
+        self.index = {coin_id: tuple(coin_rules) for coin_id, coin_rules in index.items()}
+        self.any_coin = tuple(any_coin)
+
+    def load_rules(self, cur):
+        cur.execute(RULES_SELECT_SQL)
+        rules = []
+        for row in cur.fetchall():
+            rule = Rule(*row[:6], None if row[6] is None else float(row[6]), float(row[7]))
+            try:
+                validate_rule(rule)
+            except ValueError as e:
+                print_debug(f"⚠️ Skipping alert rule {rule.rule_id}: {e}")
+                continue
+            rules.append(rule)
+        self.set_rules(rules)
+        self._loaded_at = time.monotonic()
+        return len(rules)
+
+    def _reconcile(self, cur):
+        """Pick up cooldowns from ALERTS rows written by other processes or lost with the state file"""
+        longest = max((rule.cooldown for rule in self.rules.values()), default=0)
+        if longest:
+            since = (datetime.utcnow() - timedelta(seconds=longest)).isoformat()
+            cur.execute(
+                "SELECT RULE_ID, COIN_ID, MAX(TIMESTAMP) FROM ALERTS WHERE TIMESTAMP >= %s GROUP BY RULE_ID, COIN_ID",
+                [since]
+            )
+            for rule_id, coin_id, timestamp in cur.fetchall():
+                key = (rule_id, coin_id)
+                self.last_fired[key] = max(self.last_fired.get(key, 0), to_micros(timestamp))
+        self._reconciled = True
+
+    def begin(self, cur=None):
+        """Start a sync: drop state staged by a failed one and reload rules when they are stale"""
+        self._pending_observations = {}
+        self._pending_fired = {}
+        if cur is None or self.refresh_seconds is None:
+            return
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            self.load_rules(cur)
+        if not self._reconciled:
+            self._reconcile(cur)
+
+    def _working_observation(self, coin_id):
+        observation = self._pending_observations.get(coin_id)
+        if observation is None:
+            committed = self.observations.get(coin_id)
+            observation = list(committed) if committed is not None else [None, None, None, 0]
+            self._pending_observations[coin_id] = observation
+        return observation
+
+    def evaluate(self, prices, timestamp, indicator_engine=None):
+        """ALERTS rows for the rules that fire on a PriceBatch (or price dicts) sharing one timestamp.
+
+        Only the rules indexed under each price's coin (plus any-coin rules)
+        are evaluated. A coin's rows at or before its last evaluated price
+        are ignored, so each (rule, coin, timestamp) fires at most once.
+        """
+        micros = to_micros(timestamp)
+        fired = []
+        for coin_id, _, price, _, volume, change in as_price_batch(prices).rows():
+            rules = self.index.get(coin_id, ())
+            if self.any_coin:
+                rules = rules + self.any_coin
+            if not rules:
+                continue
+            observation = self._working_observation(coin_id)
+            last_micros, previous_diff, volume_average, volume_count = observation
+            if last_micros is not None and micros <= last_micros:
+                continue
+
+            indicators = indicator_engine.values(coin_id, pending=True) if indicator_engine is not None else None
+            diff = rsi = None
+            if indicators is not None:
+                fast, slow = (indicators[f'ema_{period}'] for period in EMA_PERIODS)
+                if fast is not None and slow is not None:
+                    diff = fast - slow
+                rsi = indicators[f'rsi_{RSI_PERIOD}']
+            ratio = None
+            if volume and volume_count >= VOLUME_PERIOD and volume_average:
+                ratio = volume / volume_average
+            values = {
+                'price': price,
+                'change_24h': change,
+                'rsi': rsi,
+                'ema_cross': diff,
+                'volume_spike': ratio,
+            }
+
+            for rule in rules:
+                self.evaluated += 1
+                value = values[rule.kind]
+                if value is None:
+                    continue
+                if rule.kind == 'ema_cross':
+                    if previous_diff is None or not crossed(rule.direction, previous_diff, value):
+                        continue
+                elif not exceeds(rule.direction, value, rule.threshold):
+                    continue
+                key = (rule.rule_id, coin_id)
+                last = self._pending_fired.get(key, self.last_fired.get(key))
+                if last is not None and micros - last < rule.cooldown * 1_000_000:
+                    self.suppressed += 1
+                    continue
+                self._pending_fired[key] = micros
+                fired.append((
+                    f"{rule.rule_id}:{coin_id}:{micros}", rule.rule_id, rule.user_id, coin_id, timestamp,
+                    rule.kind, float(value), rule.threshold, describe(rule, coin_id, value)
+                ))
+
+            observation[0] = micros
+            if diff is not None:
+                observation[1] = diff
+            if volume:
+                observation[2] = volume if volume_average is None else (
+                    volume_average + 2 / (VOLUME_PERIOD + 1) * (volume - volume_average)
+                )
+                observation[3] = volume_count + 1
+        return fired
+
+    def process(self, cur, prices, timestamp, indicator_engine=None, batch_size=1000):
+        """Evaluate a batch and insert the fired alerts in the caller's transaction; returns the count"""
+        return write_alerts(cur, self.evaluate(prices, timestamp, indicator_engine), batch_size)
+
+    def commit(self):
+        self.observations.update(self._pending_observations)
+        self.last_fired.update(self._pending_fired)
+        self._pending_observations = {}
+        self._pending_fired = {}
+        self.save()
+
+    def rollback(self):
+        self._pending_observations = {}
+        self._pending_fired = {}
+
+    def save(self):
+        if not self.path:
+            return
+        # Forget cooldowns that have run out, and those of deleted rules
+        newest = max(self.last_fired.values(), default=0)
+        self.last_fired = {
+            key: micros for key, micros in self.last_fired.items()
+            if key[0] in self.rules and newest - micros < self.rules[key[0]].cooldown * 1_000_000
+        }
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'observations': self.observations,
+                'fired': [[rule_id, coin_id, micros] for (rule_id, coin_id), micros in self.last_fired.items()]
+            }, f)
+        os.replace(tmp_path, self.path)
+
+def get_alert_engine():
+    """Build the engine when SNOWFLAKE_SYNC_ALERTS is enabled, otherwise None"""
+    if os.getenv('SNOWFLAKE_SYNC_ALERTS', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    path = os.getenv('ALERT_STATE_PATH', os.path.join(get_state_dir(), 'alerts.json'))
+    return AlertEngine(path, float(os.getenv('ALERT_RULES_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS)))
+
+def add_rule(cur, rule):
+    validate_rule(rule)
+    cur.execute(RULE_INSERT_SQL, list(rule))
+    return rule
+
+def default_rules(user_id, cooldown=DEFAULT_COOLDOWN_SECONDS):
+    """The PRICE_ALERTS view thresholds as any-coin rules for one user.
+
+    Unlike the view's single label, a move beyond 10% fires two of them.
+    """
+    return [
+        Rule(f"{user_id}:{suffix}", user_id, None, name, kind, direction, threshold, cooldown)
+        for suffix, name, kind, direction, threshold in DEFAULT_RULES
+    ]
+
+def pending_alerts(cur, limit=1000):
+    cur.execute(PENDING_ALERTS_SQL, [limit])
+    return cur.fetchall()
+
+def mark_delivered(cur, alert_ids, batch_size=1000):
+    for start in range(0, len(alert_ids), batch_size):
+        batch = alert_ids[start:start + batch_size]
+        cur.execute(
+            f"UPDATE ALERTS SET DELIVERED_AT = CURRENT_TIMESTAMP() WHERE ALERT_ID IN ({', '.join(['%s'] * len(batch))})",
+            batch
+        )
+    return len(alert_ids)
+
+if __name__ == '__main__':
+    import argparse
+
+    from connection_pool import get_pool
+
+    parser = argparse.ArgumentParser(description='Manage alert rules and read the ALERTS outbox')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='add a rule')
+    add.add_argument('user')
+    add.add_argument('kind', choices=KINDS)
+    add.add_argument('direction', choices=DIRECTIONS)
+    add.add_argument('threshold', type=float, nargs='?')
+    add.add_argument('--coin', help='coin id (default: every coin)')
+    add.add_argument('--name')
+    add.add_argument('--rule-id')
+    add.add_argument('--cooldown', type=float, default=DEFAULT_COOLDOWN_SECONDS, help='seconds')
+    defaults = commands.add_parser('defaults', help="add the PRICE_ALERTS view's thresholds as rules for a user")
+    defaults.add_argument('user')
+    defaults.add_argument('--cooldown', type=float, default=DEFAULT_COOLDOWN_SECONDS, help='seconds')
+    commands.add_parser('rules', help='list enabled rules')
+    pending = commands.add_parser('pending', help='print undelivered alerts as NDJSON')
+    pending.add_argument('--limit', type=int, default=1000)
+    pending.add_argument('--mark-delivered', action='store_true')
+    args = parser.parse_args()
+
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN")
+            if args.command == 'add':
+                rule = add_rule(cur, Rule(
+                    args.rule_id or uuid.uuid4().hex, args.user, args.coin, args.name, args.kind,
+                    args.direction, args.threshold, args.cooldown
+                ))
+                print(f"✅ Added rule {rule.rule_id}")
+            elif args.command == 'defaults':
+                for rule in default_rules(args.user, args.cooldown):
+                    add_rule(cur, rule)
+                print(f"✅ Added {len(DEFAULT_RULES)} rules for {args.user}")
+            elif args.command == 'rules':
+                engine = AlertEngine(refresh_seconds=None)
+                engine.load_rules(cur)
+                for rule in engine.rules.values():
+                    print(json.dumps(rule._asdict()))
+            else:
+                columns = ['alert_id', 'rule_id', 'user_id', 'coin_id', 'timestamp', 'kind', 'value', 'threshold', 'message']
+                rows = pending_alerts(cur, args.limit)
+                for row in rows:
+                    print(json.dumps(dict(zip(columns, row)), default=str))
+                if args.mark_delivered:
+                    mark_delivered(cur, [row[0] for row in rows])
+            cur.execute("COMMIT")
+        except Exception as e:
+            cur.execute("ROLLBACK")
+            print(f"❌ Error: {str(e)}", file=sys.stderr)
+            raise
+        finally:
+            cur.close()
@@ -0,0 +1,359 @@
+"""Read-through cache for analytics view results.
+
+Entries are keyed by (view, parameters, data version). A data version is a
+per-table counter that the sync bumps after a commit that changed that
+table. A sync that only touches HOLDINGS therefore leaves cached
+DAILY_PRICE_ANALYSIS results valid, and a sync whose prices were all
+deduplicated invalidates nothing. Entries also expire after a TTL, since
+most views are relative to CURRENT_TIMESTAMP().
+
+Results are cached in two tiers:
+- an in-process LRU bounded by entry count and bytes
+- an optional SQLite file shared across processes, which also holds the
+  data versions and accumulated hit/miss counters
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from price_dedup import get_state_dir
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Tables each view reads; views not listed depend on all of them. Every
+# writer of these tables bumps their versions, including the backfill CLIs
+VIEW_DEPENDENCIES = {
+    'DAILY_PRICE_ANALYSIS': ('DAILY_OHLC',),
+    'PORTFOLIO_ANALYSIS': ('HOLDINGS', 'LATEST_PRICES'),
+    'PORTFOLIO_PERFORMANCE': ('HOLDINGS', 'LATEST_PRICES'),
+    'PRICE_ALERTS': ('HOLDINGS', 'LATEST_PRICES'),
+    'TECHNICAL_INDICATORS': ('HOLDINGS', 'PRICES'),
+    'VOLATILITY_ANALYSIS': ('HOLDINGS', 'DAILY_OHLC'),
+    'PRICE_MOMENTUM': ('HOLDINGS', 'PRICES'),
+    'PORTFOLIO_RISK_ANALYSIS': ('HOLDINGS', 'PRICES'),
+}
+DEFAULT_DEPENDENCIES = ('HOLDINGS', 'PRICES', 'LATEST_PRICES', 'DAILY_OHLC', 'HOURLY_OHLC')
+
+COUNTERS = ('hits', 'disk_hits', 'misses', 'stores', 'evictions', 'expirations')
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS DATA_VERSIONS (NAME TEXT PRIMARY KEY, VERSION INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS RESULTS (
+    KEY TEXT PRIMARY KEY,
+    EXPIRES REAL NOT NULL,
+    LAST_USED REAL NOT NULL,
+    COST REAL NOT NULL,
+    SIZE INTEGER NOT NULL,
+    VALUE BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS STATS (NAME TEXT PRIMARY KEY, VALUE REAL NOT NULL);
+"""
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def view_dependencies(view):
+    return VIEW_DEPENDENCIES.get(view.upper(), DEFAULT_DEPENDENCIES)
+
+def cache_key(view, params, versions):
+    payload = json.dumps(
+        [view.upper(), params or {}, [versions.get(table, 0) for table in view_dependencies(view)]],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class SharedState:
+    """SQLite file holding data versions, shared results and counters"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA_SQL)
+        self._lock = threading.Lock()
+
+    def versions(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT NAME, VERSION FROM DATA_VERSIONS"))
+
+    def bump(self, tables):
+        with self._lock:
+            self._conn.executemany(
+                """INSERT INTO DATA_VERSIONS (NAME, VERSION) VALUES (?, 1)
+                ON CONFLICT(NAME) DO UPDATE SET VERSION = VERSION + 1""",
+                [(table,) for table in tables]
+            )
+
+    def get(self, key, now):
+        with self._lock:
+            row = self._conn.execute("SELECT EXPIRES, COST, VALUE FROM RESULTS WHERE KEY = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[0] <= now:
+                self._conn.execute("DELETE FROM RESULTS WHERE KEY = ?", (key,))
+                return 'expired'
+            self._conn.execute("UPDATE RESULTS SET LAST_USED = ? WHERE KEY = ?", (now, key))
+            return row[1], row[2]
+
+    def put(self, key, expires, cost, blob, max_bytes, now):
+        """Store a result and evict least recently used entries over max_bytes; returns evictions"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM RESULTS WHERE EXPIRES <= ?", (now,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO RESULTS (KEY, EXPIRES, LAST_USED, COST, SIZE, VALUE) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, expires, now, cost, len(blob), blob)
+                )
+                evicted = 0
+                total = self._conn.execute("SELECT COALESCE(SUM(SIZE), 0) FROM RESULTS").fetchone()[0]
+                if total > max_bytes:
+                    for old_key, size in self._conn.execute(
+                        "SELECT KEY, SIZE FROM RESULTS WHERE KEY != ? ORDER BY LAST_USED", (key,)
+                    ).fetchall():
+                        if total <= max_bytes:
+                            break
+                        self._conn.execute("DELETE FROM RESULTS WHERE KEY = ?", (old_key,))
+                        total -= size
+                        evicted += 1
+                self._conn.execute("COMMIT")
+                return evicted
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM RESULTS")
+
+    def add_stats(self, counters):
+        with self._lock:
+            self._conn.executemany(
+                """INSERT INTO STATS (NAME, VALUE) VALUES (?, ?)
+                ON CONFLICT(NAME) DO UPDATE SET VALUE = VALUE + excluded.VALUE""",
+                list(counters.items())
+            )
+
+    def stats(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT NAME, VALUE FROM STATS"))
+
+    def close(self):
+        self._conn.close()
+
+class DataVersions:
+    """Per-table change counters, bumped by the sync once its transaction commits"""
+
+    def __init__(self, shared=None):
+        self.shared = shared
+        self._local = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def current(self):
+        return self.shared.versions() if self.shared is not None else dict(self._local)
+
+    def begin(self):
+        self._pending = set()
+
+    def touch(self, *tables):
+        self._pending.update(tables)
+
+    def commit(self):
+        tables, self._pending = sorted(self._pending), set()
+        self.bump(*tables)
+
+    def bump(self, *tables):
+        """Advance the versions of `tables` now, outside begin/commit"""
+        if not tables:
+            return
+        if self.shared is not None:
+            self.shared.bump(tables)
+        else:
+            with self._lock:
+                for table in tables:
+                    self._local[table] = self._local.get(table, 0) + 1
+
+    def rollback(self):
+        self._pending = set()
+
+class ResultCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, shared=None,
+                 versions=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.versions = versions or DataVersions(shared)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # Warehouse seconds not spent because a result was served from cache
+        self.counters['saved_seconds'] = 0.0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flushed = dict.fromkeys(self.counters, 0)
+
+    def _evict_memory(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.counters['evictions'] += 1
+
+    def _get_memory(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, cost, size, value = entry
+        if expires <= now:
+            del self._entries[key]
+            self._bytes -= size
+            self.counters['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters['hits'] += 1
+        self.counters['saved_seconds'] += cost
+        return value
+
+    def _put_memory(self, key, expires, cost, size, value):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (expires, cost, size, value)
+        self._bytes += size
+        self._evict_memory()
+
+    def get_or_compute(self, view, params, compute):
+        """Return the cached result for (view, params) at the current data version, or compute and store it"""
+        key = cache_key(view, params, self.versions.current())
+        now = time.time()
+        with self._lock:
+            value = self._get_memory(key, now)
+        if value is not None:
+            return value
+
+        if self.shared is not None:
+            found = self.shared.get(key, now)
+            if found == 'expired':
+                with self._lock:
+                    self.counters['expirations'] += 1
+            elif found is not None:
+                cost, blob = found
+                value = pickle.loads(blob)
+                with self._lock:
+                    self.counters['disk_hits'] += 1
+                    self.counters['saved_seconds'] += cost
+                    self._put_memory(key, now + self.ttl, cost, len(blob), value)
+                return value
+
+        start = time.perf_counter()
+        value = compute()
+        cost = time.perf_counter() - start
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.counters['misses'] += 1
+            self.counters['stores'] += 1
+            self._put_memory(key, now + self.ttl, cost, len(blob), value)
+        if self.shared is not None:
+            evicted = self.shared.put(key, now + self.ttl, cost, blob, self.max_bytes, now)
+            with self._lock:
+                self.counters['evictions'] += evicted
+        return value
+
+    def query(self, cur, view, where=None, params=()):
+        """Read-through SELECT from a view; `where` and `params` are part of the cache key"""
+        sql = f"SELECT * FROM {view}" + (f" WHERE {where}" if where else "")
+
+        def compute():
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+        return self.get_or_compute(view, {'where': where, 'params': list(params)}, compute)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, entries=len(self._entries), bytes=self._bytes)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def flush_stats(self):
+        """Add counters accumulated since the last flush to the shared totals"""
+        if self.shared is None:
+            return
+        with self._lock:
+            delta = {name: value - self._flushed[name] for name, value in self.counters.items()}
+            self._flushed = dict(self.counters)
+        self.shared.add_stats(delta)
+
+def get_cache_path():
+    return os.getenv('ANALYTICS_CACHE_PATH', os.path.join(get_state_dir(), 'analytics_cache.sqlite'))
+
+_shared = None
+
+def get_shared_state():
+    """The process-wide SQLite tier, or None when ANALYTICS_CACHE_PATH is set to an empty string"""
+    global _shared
+    path = get_cache_path()
+    if not path:
+        return None
+    if _shared is None or _shared.path != path:
+        _shared = SharedState(path)
+    return _shared
+
+def get_data_versions():
+    return DataVersions(get_shared_state())
+
+def get_result_cache():
+    return ResultCache(
+        ttl=float(os.getenv('ANALYTICS_CACHE_TTL', DEFAULT_TTL)),
+        max_entries=int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        max_bytes=int(os.getenv('ANALYTICS_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+        shared=get_shared_state()
+    )
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect the analytics result cache or read a view through it')
+    parser.add_argument('command', choices=['stats', 'clear', 'query'])
+    parser.add_argument('view', nargs='?')
+    args = parser.parse_args()
+
+    shared = get_shared_state()
+    if shared is None:
+        raise SystemExit("ANALYTICS_CACHE_PATH is empty; there is no shared cache to inspect")
+
+    if args.command == 'stats':
+        print(json.dumps({'data_versions': shared.versions(), **shared.stats()}, indent=2))
+    elif args.command == 'clear':
+        shared.clear()
+        print("✅ Cleared cached results")
+    else:
+        from connection_pool import get_pool
+
+        if not args.view:
+            raise SystemExit("query needs a view name")
+        cache = get_result_cache()
+        try:
+            with get_pool().checkout() as conn:
+                for row in cache.query(conn.cursor(), args.view):
+                    print(json.dumps(row, default=str))
+        finally:
+            cache.flush_stats()
+        print_debug(json.dumps(cache.stats()))
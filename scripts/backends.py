@@ -0,0 +1,249 @@
+"""Database backends for the sync and setup scripts.
+
+STORAGE_BACKEND selects where the scripts read and write:
+- snowflake (the default) connects to the warehouse from the SNOWFLAKE_* variables
+- sqlite or duckdb opens an embedded database file at STORAGE_PATH, for
+  offline development, CI benchmarks and edge deployments
+
+The embedded backends take the same Snowflake SQL and %s parameters as the
+warehouse connector and translate each statement into their dialect.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import sqlite_dialect
+from price_dedup import get_state_dir
+
+BACKENDS = ('snowflake', 'sqlite', 'duckdb')
+
+REQUIRED_SNOWFLAKE_VARS = [
+    'SNOWFLAKE_ACCOUNT',
+    'SNOWFLAKE_USERNAME',
+    'SNOWFLAKE_PASSWORD',
+    'SNOWFLAKE_DATABASE',
+    'SNOWFLAKE_WAREHOUSE',
+    'SNOWFLAKE_ROLE',
+    'SNOWFLAKE_REGION'
+]
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def get_backend_name():
+    backend = os.getenv('STORAGE_BACKEND', 'snowflake').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid STORAGE_BACKEND: {backend}")
+    return backend
+
+def get_storage_path(backend):
+    return os.getenv('STORAGE_PATH', os.path.join(get_state_dir(), f'portfolio.{backend}'))
+
+def validate_env_vars():
+    missing_vars = [var for var in REQUIRED_SNOWFLAKE_VARS if not os.getenv(var)]
+    if missing_vars:
+        error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
+        print_debug(f"❌ {error_msg}")
+        raise ValueError(error_msg)
+
+    print_debug("✅ All required environment variables are set")
+
+def connect_snowflake():
+    try:
+        import snowflake.connector
+        from dotenv import load_dotenv
+    except ImportError as e:
+        raise ImportError(
+            f"STORAGE_BACKEND=snowflake needs {e.name or 'snowflake-connector-python'}: "
+            "pip install -r requirements.txt, or set STORAGE_BACKEND=sqlite or duckdb"
+        ) from e
+
+    load_dotenv()
+    validate_env_vars()
+
+    account = os.getenv('SNOWFLAKE_ACCOUNT')
+    region = os.getenv('SNOWFLAKE_REGION')
+    try:
+        print_debug(f"Connecting to Snowflake account: {account}.{region}")
+        print_debug(f"Using warehouse: {os.getenv('SNOWFLAKE_WAREHOUSE')}")
+        print_debug(f"Using database: {os.getenv('SNOWFLAKE_DATABASE')}")
+        print_debug(f"Using role: {os.getenv('SNOWFLAKE_ROLE')}")
+
+        conn = snowflake.connector.connect(
+            user=os.getenv('SNOWFLAKE_USERNAME'),
+            password=os.getenv('SNOWFLAKE_PASSWORD'),
+            account=f"{account}.{region}",
+            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+            database=os.getenv('SNOWFLAKE_DATABASE'),
+            schema=os.getenv('SNOWFLAKE_SCHEMA', 'PUBLIC'),
+            role=os.getenv('SNOWFLAKE_ROLE'),
+            # Skips OCSP certificate checks; only for networks that block them
+            insecure_mode=os.getenv('SNOWFLAKE_INSECURE_MODE', '').lower() in ('1', 'true', 'yes'),
+            client_session_keep_alive=True
+        )
+
+        print_debug("✅ Successfully connected to Snowflake")
+        return conn
+    except Exception as e:
+        print_debug(f"❌ Error connecting to Snowflake: {str(e)}")
+        print_debug(f"Connection details (sanitized):")
+        print_debug(f"- Account: {account}")
+        print_debug(f"- Region: {region}")
+        print_debug(f"- Username: {os.getenv('SNOWFLAKE_USERNAME')}")
+        print_debug(f"- Database: {os.getenv('SNOWFLAKE_DATABASE')}")
+        print_debug(f"- Warehouse: {os.getenv('SNOWFLAKE_WAREHOUSE')}")
+        print_debug(f"- Role: {os.getenv('SNOWFLAKE_ROLE')}")
+        raise
+
+class SQLiteCursor:
+    """DB-API cursor over sqlite3 that accepts the connector's %s placeholders and Snowflake SQL"""
+
+    def __init__(self, conn, latency=0.0):
+        self._cur = conn.cursor()
+        self._latency = latency
+
+    def _round_trip(self):
+        if self._latency:
+            time.sleep(self._latency)
+
+    def execute(self, sql, params=()):
+        self._round_trip()
+        for statement in sqlite_dialect.translate(sql.replace('%s', '?')):
+            # A translated statement list binds the parameters only where they appear
+            try:
+                self._cur.execute(statement, params if '?' in statement else ())
+            except sqlite3.OperationalError as e:
+                if not (sqlite_dialect.ADD_COLUMN_IF_NOT_EXISTS.match(sql) and 'duplicate column' in str(e)):
+                    raise
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._round_trip()
+        self._cur.executemany(sql.replace('%s', '?'), seq_of_params)
+        return self
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def close(self):
+        self._cur.close()
+
+class SQLiteConnection:
+    """Embedded sqlite database with a Snowflake-compatible cursor.
+
+    `latency` simulates a network round trip per call and `now` pins
+    CURRENT_TIMESTAMP() for the analytics views.
+    """
+
+    def __init__(self, path=':memory:', latency=0.0, now=None):
+        self._latency = latency
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        sqlite_dialect.register_functions(self._conn, now)
+
+    def cursor(self):
+        return SQLiteCursor(self._conn, self._latency)
+
+    def close(self):
+        self._conn.close()
+
+class DuckDBCursor:
+    """DuckDB cursor that accepts the connector's %s placeholders and Snowflake SQL"""
+
+    DML = ('INSERT', 'UPDATE', 'DELETE', 'MERGE')
+
+    def __init__(self, conn, latency=0.0):
+        self._cur = conn.cursor()
+        self._rowcount = -1
+        self._latency = latency
+
+    def _round_trip(self):
+        if self._latency:
+            time.sleep(self._latency)
+
+    def execute(self, sql, params=()):
+        import duckdb_dialect
+
+        self._round_trip()
+        for statement in duckdb_dialect.translate(sql.replace('%s', '?')):
+            self._cur.execute(statement, list(params) if '?' in statement else None)
+            # DuckDB reports affected rows as a one-row result rather than rowcount
+            if statement.lstrip().upper().startswith(self.DML):
+                self._rowcount = self._cur.fetchone()[0]
+            else:
+                self._rowcount = -1
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._round_trip()
+        self._cur.executemany(sql.replace('%s', '?'), [list(params) for params in seq_of_params])
+        self._rowcount = -1
+        return self
+
+    @property
+    def rowcount(self):
+        return self._rowcount
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def close(self):
+        self._cur.close()
+
+_duckdb_setup_lock = threading.Lock()
+
+class DuckDBConnection:
+    """Embedded DuckDB database with a Snowflake-compatible cursor.
+
+    `now` pins CURRENT_TIMESTAMP() and `latency` simulates a network round trip per call.
+    """
+
+    def __init__(self, path=':memory:', now=None, latency=0.0):
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("STORAGE_BACKEND=duckdb needs the duckdb package: pip install duckdb")
+        import duckdb_dialect
+
+        # Sessions on one file share a catalog, and concurrent macro registration conflicts
+        with _duckdb_setup_lock:
+            self._conn = duckdb.connect(path)
+            duckdb_dialect.register_functions(self._conn, now)
+        self._latency = latency
+
+    def cursor(self):
+        return DuckDBCursor(self._conn, self._latency)
+
+    def close(self):
+        self._conn.close()
+
+def get_connection(backend=None):
+    """Open a connection to the configured backend"""
+    backend = backend or get_backend_name()
+    if backend == 'snowflake':
+        return connect_snowflake()
+    path = get_storage_path(backend)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    print_debug(f"Using embedded {backend} database: {path}")
+    if backend == 'sqlite':
+        return SQLiteConnection(path)
+    return DuckDBConnection(path)
@@ -0,0 +1,290 @@
+"""Backfill PRICES with historical market-chart data.
+
+Each coin's date range is split into windows of BACKFILL_WINDOW_DAYS days
+(default 90, the longest range CoinGecko serves at hourly granularity).
+Each window commits in one transaction:
+- its price rows, with their original timestamps
+- its LATEST_PRICES update and rebuilt OHLC rollup buckets
+- a BACKFILL_PROGRESS row marking the window complete
+
+A rerun skips windows already in BACKFILL_PROGRESS, so a crashed backfill
+resumes at the first unfinished window. Rows whose (coin, timestamp) is
+already in PRICES are skipped, so overlapping the live sync or an earlier
+backfill writes nothing twice. Coins run in parallel over pooled
+connections; windows of one coin run in order.
+
+Data comes from CoinGecko's /coins/{id}/market_chart/range, or from a
+directory of saved responses named <coin_id>.json (--dump). Rows older
+than the retention window are compacted by the next retention run.
+
+    python scripts/backfill.py bitcoin ethereum --start 2023-01-01 [--end 2024-01-01] [--dump DIR]
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from backends import get_backend_name
+from connection_pool import get_pool
+from latest_prices import upsert_latest_prices
+from price_dedup import to_micros
+from rollups import ROLLUPS, get_rollups_enabled, rebuild_coin_rollups
+from setup_snowflake import BACKFILL_PROGRESS_TABLE_SQL
+from snowflake_sync import (
+    PRICES_INSERT_SQL, copy_price_rows, get_batch_size, get_copy_threshold, insert_rows
+)
+
+PROGRESS_INSERT_SQL = """
+INSERT INTO BACKFILL_PROGRESS (COIN_ID, WINDOW_START, WINDOW_END, ROWS_FETCHED, ROWS_WRITTEN)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_WORKERS = 4
+DAY_MS = 86_400_000
+
+Window = namedtuple('Window', ['coin_id', 'start', 'end'])
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def get_window_days():
+    return int(os.getenv('BACKFILL_WINDOW_DAYS', DEFAULT_WINDOW_DAYS))
+
+def get_workers():
+    # Embedded databases allow one writer at a time, so parallel coins would only wait on the lock
+    default = DEFAULT_WORKERS if get_backend_name() == 'snowflake' else 1
+    return int(os.getenv('BACKFILL_WORKERS', default))
+
+def plan_windows(coin_ids, start, end, window_days):
+    """Windows of [start, end) per coin; start and end are dates, so windows are whole UTC days"""
+    windows = []
+    for coin_id in dict.fromkeys(coin_ids):
+        day = start
+        while day < end:
+            stop = min(day + timedelta(days=window_days), end)
+            windows.append(Window(coin_id, datetime.combine(day, datetime.min.time()),
+                                  datetime.combine(stop, datetime.min.time())))
+            day = stop
+    return windows
+
+def market_chart_rows(coin_id, payload, start, end):
+    """Price rows in [start, end) from a /market_chart/range payload, one per timestamp.
+
+    PRICE_CHANGE_24H_PCT is measured against the last price at least 24
+    hours earlier in the payload, and is NULL without one.
+    """
+    points = {}
+    for ms, price in payload.get('prices') or []:
+        if price is not None:
+            points[int(ms)] = [price, 0, 0]
+    for field, position in (('market_caps', 1), ('total_volumes', 2)):
+        for ms, value in payload.get(field) or []:
+            if int(ms) in points and value is not None:
+                points[int(ms)][position] = value
+    if not points:
+        return []
+
+    times = np.array(sorted(points), dtype=np.int64)
+    prices = np.array([points[ms][0] for ms in times], dtype=float)
+    earlier = np.searchsorted(times, times - DAY_MS, side='right') - 1
+
+    start_ms, end_ms = to_micros(start) // 1000, to_micros(end) // 1000
+    rows = []
+    for i in np.flatnonzero((times >= start_ms) & (times < end_ms)):
+        ms = int(times[i])
+        change = None
+        if earlier[i] >= 0 and prices[earlier[i]]:
+            change = float((prices[i] / prices[earlier[i]] - 1) * 100)
+        timestamp = datetime.utcfromtimestamp(ms / 1000).isoformat()
+        rows.append((coin_id, timestamp, points[ms][0], points[ms][1], points[ms][2], change))
+    return rows
+
+@lru_cache(maxsize=16)
+def _read_dump(path):
+    with open(path) as f:
+        return json.load(f)
+
+class DumpSource:
+    """Saved /market_chart/range responses, one DIR/<coin_id>.json file per coin"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def market_chart(self, coin_id, start, end):
+        path = os.path.join(self.directory, f'{coin_id}.json')
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No market chart dump for {coin_id}: {path}")
+        # The whole file is returned; market_chart_rows keeps the window's rows
+        return _read_dump(path)
+
+    def close(self):
+        pass
+
+class FetcherSource:
+    """CoinGecko market charts over one session and rate limit shared by all worker threads"""
+
+    def __init__(self, fetcher=None):
+        from price_fetcher import PriceFetcher
+
+        self.fetcher = fetcher or PriceFetcher()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._session, self._bucket = self._call(self._open())
+
+    async def _open(self):
+        return self.fetcher.session(), self.fetcher.token_bucket()
+
+    def _call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def market_chart(self, coin_id, start, end):
+        # A day of margin before the window lets the first rows get a 24h change
+        since = (to_micros(start) // 1000 - DAY_MS) / 1000
+        return self._call(self.fetcher.fetch_market_chart(
+            self._session, self._bucket, coin_id, since, to_micros(end) / 1_000_000
+        ))
+
+    def close(self):
+        self._call(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+def completed_windows(cur):
+    cur.execute(BACKFILL_PROGRESS_TABLE_SQL)
+    cur.execute("SELECT COIN_ID, WINDOW_START, WINDOW_END FROM BACKFILL_PROGRESS")
+    return {(coin_id, to_micros(start), to_micros(end)) for coin_id, start, end in cur.fetchall()}
+
+def existing_timestamps(cur, window):
+    cur.execute(
+        "SELECT TIMESTAMP FROM PRICES WHERE COIN_ID = %s AND TIMESTAMP >= %s AND TIMESTAMP < %s",
+        [window.coin_id, window.start.isoformat(), window.end.isoformat()]
+    )
+    return {to_micros(row[0]) for row in cur.fetchall()}
+
+def write_window(cur, window, rows, batch_size, copy_threshold, rollups):
+    """Write one window's new rows and its checkpoint; the caller owns the transaction"""
+    present = existing_timestamps(cur, window)
+    new_rows = [row for row in rows if to_micros(row[1]) not in present]
+    if new_rows:
+        if copy_threshold and len(new_rows) >= copy_threshold:
+            copy_price_rows(cur, new_rows)
+        else:
+            insert_rows(cur, PRICES_INSERT_SQL, new_rows, batch_size)
+        upsert_latest_prices(cur, new_rows, batch_size)
+        if rollups:
+            rebuild_coin_rollups(cur, window.coin_id, window.start.isoformat(), window.end.isoformat())
+    cur.execute(PROGRESS_INSERT_SQL, [
+        window.coin_id, window.start.isoformat(), window.end.isoformat(), len(rows), len(new_rows)
+    ])
+    return len(new_rows)
+
+def backfill_coin(pool, source, windows, options, report, lock):
+    """Run one coin's windows in order, stopping at the first failure so a rerun resumes there"""
+    for window in windows:
+        try:
+            rows = market_chart_rows(window.coin_id, source.market_chart(*window), window.start, window.end)
+            with pool.checkout() as conn:
+                cur = conn.cursor()
+                try:
+                    cur.execute("BEGIN")
+                    written = write_window(cur, window, rows, *options)
+                    cur.execute("COMMIT")
+                except Exception:
+                    cur.execute("ROLLBACK")
+                    raise
+                finally:
+                    cur.close()
+        except Exception as e:
+            print_debug(f"❌ {window.coin_id} {window.start:%Y-%m-%d}..{window.end:%Y-%m-%d}: {e}")
+            with lock:
+                report['failed'].append(window.coin_id)
+            return
+        with lock:
+            report['windows_completed'] += 1
+            report['rows_fetched'] += len(rows)
+            report['rows_written'] += written
+        print(f"✅ {window.coin_id} {window.start:%Y-%m-%d}..{window.end:%Y-%m-%d}: "
+              f"{written} of {len(rows)} rows written")
+
+def backfill(coin_ids, start, end, source, pool=None, workers=None, window_days=None, batch_size=None,
+             copy_threshold=None, rollups=None):
+    """Backfill [start, end) for each coin from `source`; returns a report"""
+    pool = pool or get_pool()
+    workers = workers or get_workers()
+    window_days = window_days or get_window_days()
+    options = (
+        batch_size or get_batch_size(),
+        get_copy_threshold() if copy_threshold is None else copy_threshold,
+        get_rollups_enabled() if rollups is None else rollups,
+    )
+    report = {'windows': 0, 'windows_skipped': 0, 'windows_completed': 0, 'rows_fetched': 0,
+              'rows_written': 0, 'failed': [], 'seconds': 0.0}
+    started = time.perf_counter()
+
+    with pool.checkout() as conn:
+        cur = conn.cursor()
+        try:
+            done = completed_windows(cur)
+        finally:
+            cur.close()
+
+    by_coin = {}
+    for window in plan_windows(coin_ids, start, end, window_days):
+        report['windows'] += 1
+        if (window.coin_id, to_micros(window.start), to_micros(window.end)) in done:
+            report['windows_skipped'] += 1
+        else:
+            by_coin.setdefault(window.coin_id, []).append(window)
+
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max(1, workers)) as executor:
+        for future in [executor.submit(backfill_coin, pool, source, windows, options, report, lock)
+                       for windows in by_coin.values()]:
+            future.result()
+    report['seconds'] = time.perf_counter() - started
+    return report
+
+if __name__ == '__main__':
+    import argparse
+
+    from analytics_cache import get_data_versions
+
+    parser = argparse.ArgumentParser(description='Backfill historical prices with resumable per-window checkpoints')
+    parser.add_argument('coins', nargs='*', help='coin ids; read one per line from stdin when omitted')
+    parser.add_argument('--start', type=date.fromisoformat, required=True, help='first day, YYYY-MM-DD')
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help='day after the last, YYYY-MM-DD (default today)')
+    parser.add_argument('--dump', help='directory of <coin_id>.json market chart responses instead of the API')
+    parser.add_argument('--workers', type=int, default=None, help='coins in parallel (default BACKFILL_WORKERS)')
+    parser.add_argument('--window-days', type=int, default=None, help='days per checkpointed window')
+    args = parser.parse_args()
+
+    coin_ids = args.coins or [line.strip() for line in sys.stdin if line.strip()]
+    end = args.end or datetime.utcnow().date()
+    source = DumpSource(args.dump) if args.dump else FetcherSource()
+    try:
+        report = backfill(coin_ids, args.start, end, source, workers=args.workers, window_days=args.window_days)
+    finally:
+        source.close()
+
+    if report['rows_written']:
+        versions = get_data_versions()
+        versions.begin()
+        versions.touch('PRICES', 'LATEST_PRICES')
+        if get_rollups_enabled():
+            versions.touch(*(rollup.table for rollup in ROLLUPS))
+        versions.commit()
+    print(f"{'❌' if report['failed'] else '✅'} Backfilled {report['rows_written']} rows in "
+          f"{report['windows_completed']} windows ({report['windows_skipped']} already done) "
+          f"in {report['seconds']:.1f}s")
+    print(json.dumps(report, indent=2))
+    raise SystemExit(1 if report['failed'] else 0)
@@ -0,0 +1,237 @@
+"""Checks and timings for the in-stream alert engine.
+
+- the default rules fire for the same coins as the PRICE_ALERTS view,
+  including its label (beyond 10% they also fire Rise or Drop)
+- cooldowns suppress repeats and are discarded when a sync rolls back
+- rsi, ema_cross and volume_spike rules fire at the same steps as a
+  reference that recomputes every indicator from the full history and
+  scans every rule
+- indexed evaluation against a full scan of all rules per batch
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from alerts import VOLUME_PERIOD, AlertEngine, Rule, crossed, default_rules, exceeds
+from benchmark_sync import LocalConnection
+from indicators import IndicatorEngine, backfill_series
+from local_analytics import CoinSeries
+from setup_snowflake_analytics import ANALYTICS_VIEWS
+from snowflake_sync import sync_data
+
+START = datetime(2024, 1, 1)
+
+def check(name, ok, failures):
+    print(f"{'✅' if ok else '❌'} {name}")
+    if not ok:
+        failures.append(name)
+
+def change_payload(rng, coins):
+    holdings = [
+        {'coin_id': f'coin-{i}', 'symbol': f'C{i}', 'name': f'Coin {i}', 'amount': 1, 'category': 'Other'}
+        for i in range(coins)
+    ]
+    prices = [
+        {'coin_id': f'coin-{i}', 'price_usd': float(rng.uniform(1, 100)), 'market_cap_usd': 1e9,
+         'volume_24h_usd': 1e7, 'price_change_24h_pct': float(rng.normal(0, 7))}
+        for i in range(coins)
+    ]
+    return {'holdings': holdings, 'prices': prices}
+
+def check_price_alerts_view(failures, coins=500):
+    """Default rules installed in ALERT_RULES and fired by sync_data, against the PRICE_ALERTS view"""
+    conn = LocalConnection()
+    cur = conn.cursor()
+    cur.execute(ANALYTICS_VIEWS['PRICE_ALERTS'])
+    cur.executemany(
+        "INSERT INTO ALERT_RULES (RULE_ID, USER_ID, COIN_ID, NAME, KIND, DIRECTION, THRESHOLD, COOLDOWN_SECONDS) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        [list(rule) for rule in default_rules('alice')]
+    )
+    names = {rule.rule_id: rule.name for rule in default_rules('alice')}
+
+    engine = AlertEngine()
+    payload = change_payload(np.random.default_rng(5), coins)
+    first = sync_data(payload, conn=conn, copy_threshold=0, alert_engine=engine)
+    cur.execute("SELECT COIN_ID, ALERT_TYPE FROM PRICE_ALERTS")
+    view = dict(cur.fetchall())
+    cur.execute("SELECT COIN_ID, RULE_ID FROM ALERTS")
+    fired = {}
+    for coin_id, rule_id in cur.fetchall():
+        fired.setdefault(coin_id, set()).add(names[rule_id])
+    check(f"{first['details']['alerts_fired']} alerts cover the {len(view)} coins in PRICE_ALERTS with matching types",
+          first['status'] == 'success' and set(view) == set(fired)
+          and all(view[coin_id] in fired[coin_id] for coin_id in view), failures)
+
+    second = sync_data(payload, conn=conn, copy_threshold=0, alert_engine=engine)
+    check("a repeat sync within the cooldown fires nothing",
+          second['status'] == 'success' and second['details']['alerts_fired'] == 0, failures)
+
+    fresh = AlertEngine()
+    third = sync_data(payload, conn=conn, copy_threshold=0, alert_engine=fresh)
+    check("a new engine picks up cooldowns from ALERTS",
+          third['status'] == 'success' and third['details']['alerts_fired'] == 0, failures)
+    conn.close()
+
+def check_rollback(failures):
+    engine = AlertEngine(refresh_seconds=None)
+    engine.set_rules([Rule('r', 'u', 'bitcoin', None, 'price', 'above', 10.0, 60)])
+    price = [{'coin_id': 'bitcoin', 'price_usd': 11.0}]
+    at = lambda seconds: (START + timedelta(seconds=seconds)).isoformat()
+
+    engine.begin()
+    rolled_back = len(engine.evaluate(price, at(0)))
+    engine.rollback()
+    engine.begin()
+    retried = len(engine.evaluate(price, at(0)))
+    engine.commit()
+    engine.begin()
+    within = len(engine.evaluate(price, at(30)))
+    after = len(engine.evaluate(price, at(61)))
+    check("rolled-back alerts refire; committed ones are held for the cooldown",
+          (rolled_back, retried, within, after) == (1, 1, 0, 1), failures)
+
+def synthetic_series(rng, coins, steps):
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (coins, steps)), axis=1))
+    volumes = rng.lognormal(16, 0.3, (coins, steps))
+    spikes = rng.random((coins, steps)) < 0.03
+    volumes[spikes] *= rng.uniform(2, 6, spikes.sum())
+    return prices, volumes
+
+def random_rules(rng, coins, count):
+    rules = []
+    for i in range(count):
+        kind = rng.choice(['rsi', 'ema_cross', 'volume_spike', 'price'])
+        coin_id = None if rng.random() < 0.1 else f'coin-{rng.integers(coins)}'
+        if kind == 'rsi':
+            direction, threshold = ('above', 65.0) if rng.random() < 0.5 else ('below', 35.0)
+        elif kind == 'ema_cross':
+            direction, threshold = rng.choice(['above', 'below']), None
+        elif kind == 'volume_spike':
+            direction, threshold = 'above', float(rng.uniform(1.5, 3))
+        else:
+            direction, threshold = 'outside', float(rng.uniform(90, 130))
+        cooldown = float(rng.choice([0, 3600, 6 * 3600]))
+        rules.append(Rule(f'rule-{i}', f'user-{i % 7}', coin_id, None, str(kind), str(direction), threshold, cooldown))
+    return rules
+
+def reference_alerts(rules, prices, volumes, step_seconds):
+    """(rule, coin, step) firings from full recomputation at every step, scanning every rule"""
+    coins, steps = prices.shape
+    fired = []
+    last_fired = {}
+    for step in range(steps):
+        for c in range(coins):
+            coin_id = f'coin-{c}'
+            history = CoinSeries(np.arange(step + 1), prices[c, :step + 1], None, None, None)
+            emas, rsi, _ = backfill_series(history)
+            diff = emas[0][-1] - emas[1][-1]
+            previous = emas[0][-2] - emas[1][-2] if step else np.nan
+            average = volumes[c, 0]
+            for v in volumes[c, 1:step]:
+                average += 2 / (VOLUME_PERIOD + 1) * (v - average)
+            ratio = volumes[c, step] / average if step >= VOLUME_PERIOD else None
+            values = {'price': prices[c, step], 'rsi': None if np.isnan(rsi[-1]) else rsi[-1],
+                      'ema_cross': None if np.isnan(diff) else diff, 'volume_spike': ratio}
+            for rule in rules:
+                if rule.coin_id not in (None, coin_id) or values[rule.kind] is None:
+                    continue
+                if rule.kind == 'ema_cross':
+                    if np.isnan(previous) or not crossed(rule.direction, previous, diff):
+                        continue
+                elif not exceeds(rule.direction, values[rule.kind], rule.threshold):
+                    continue
+                key = (rule.rule_id, coin_id)
+                if key in last_fired and (step - last_fired[key]) * step_seconds < rule.cooldown:
+                    continue
+                last_fired[key] = step
+                fired.append((rule.rule_id, coin_id, step))
+    return sorted(fired)
+
+def engine_alerts(rules, prices, volumes, step_seconds):
+    coins, steps = prices.shape
+    indicators = IndicatorEngine()
+    engine = AlertEngine(refresh_seconds=None)
+    engine.set_rules(rules)
+    fired = []
+    for step in range(steps):
+        timestamp = (START + timedelta(seconds=step * step_seconds)).isoformat()
+        batch = [{'coin_id': f'coin-{c}', 'price_usd': float(prices[c, step]), 'volume_24h_usd': float(volumes[c, step])}
+                 for c in range(coins)]
+        indicators.begin()
+        indicators.update_prices(batch, timestamp)
+        engine.begin()
+        for row in engine.evaluate(batch, timestamp, indicators):
+            fired.append((row[1], row[3], step))
+        indicators.commit()
+        engine.commit()
+    return sorted(fired)
+
+def check_reference(failures, coins=12, steps=150, rules=120, step_seconds=1800):
+    rng = np.random.default_rng(11)
+    prices, volumes = synthetic_series(rng, coins, steps)
+    rule_list = random_rules(rng, coins, rules)
+    expected = reference_alerts(rule_list, prices, volumes, step_seconds)
+    actual = engine_alerts(rule_list, prices, volumes, step_seconds)
+    kinds = {rule.rule_id: rule.kind for rule in rule_list}
+    counts = {kind: sum(kinds[rule_id] == kind for rule_id, _, _ in expected)
+              for kind in ('rsi', 'ema_cross', 'volume_spike', 'price')}
+    check(f"{len(actual)} firings match the full-recompute reference "
+          f"({', '.join(f'{kind} {count}' for kind, count in counts.items())})",
+          actual == expected and all(counts.values()), failures)
+
+def run_benchmark(rules, coins, batch_coins, batches):
+    rng = np.random.default_rng(3)
+    rule_list = [
+        Rule(f'rule-{i}', f'user-{i % 1000}', f'coin-{rng.integers(coins)}', None, 'price', 'above',
+             float(rng.uniform(0, 200)), 3600.0)
+        for i in range(rules)
+    ]
+    engine = AlertEngine(refresh_seconds=None)
+    engine.set_rules(rule_list)
+    print(f"\n{rules:,} rules over {coins:,} coins, batches of {batch_coins:,} prices\n")
+
+    indexed = scanned = 0.0
+    fired_indexed = fired_scanned = 0
+    for b in range(batches):
+        timestamp = (START + timedelta(minutes=b)).isoformat()
+        touched = rng.choice(coins, batch_coins, replace=False)
+        batch = [{'coin_id': f'coin-{c}', 'price_usd': float(rng.uniform(0, 200))} for c in touched]
+
+        start = time.perf_counter()
+        engine.begin()
+        fired_indexed += len(engine.evaluate(batch, timestamp))
+        engine.commit()
+        indexed += time.perf_counter() - start
+
+        # The same rules without the index: every rule is checked against the batch
+        start = time.perf_counter()
+        by_coin = {price['coin_id']: price for price in batch}
+        for rule in rule_list:
+            price = by_coin.get(rule.coin_id)
+            if price is not None and exceeds(rule.direction, price['price_usd'], rule.threshold):
+                fired_scanned += 1
+        scanned += time.perf_counter() - start
+
+    print(f"{'method':>10} {'ms/batch':>10} {'rules/batch':>12}")
+    print(f"{'indexed':>10} {indexed / batches * 1000:>10.2f} {engine.evaluated / batches:>12,.0f}")
+    print(f"{'scan':>10} {scanned / batches * 1000:>10.2f} {rules:>12,}  (threshold test only, no cooldowns or rows)")
+    print(f"\n{fired_indexed:,} alerts after cooldowns ({engine.suppressed:,} suppressed), "
+          f"{fired_scanned:,} threshold hits without cooldowns")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the alert engine and compare indexed evaluation with a full rule scan')
+    parser.add_argument('--rules', type=int, default=200_000)
+    parser.add_argument('--coins', type=int, default=20_000)
+    parser.add_argument('--batch', type=int, default=500, help='prices per sync batch')
+    parser.add_argument('--batches', type=int, default=50)
+    args = parser.parse_args()
+
+    failures = []
+    check_price_alerts_view(failures)
+    check_rollback(failures)
+    check_reference(failures)
+    run_benchmark(args.rules, args.coins, args.batch, args.batches)
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+from price_fetcher import MAX_URL_LENGTH, PriceFetcher
+
+class FakeCoinGecko:
+    """Local /simple/price server with CoinGecko-like limits.
+
+    Requests beyond `rate_per_minute` in a sliding minute get 429 with
+    Retry-After, URLs over MAX_URL_LENGTH get 414, and `failure_rate` of
+    the remaining requests fail to exercise retries: half with 503, half
+    with a 200 HTML page as from a proxy in front of the API. With a
+    `market` (see benchmark_suite.SyntheticMarket), prices come from it and
+    /coins/{id}/market_chart/range serves its history.
+    """
+
+    def __init__(self, rate_per_minute, latency=0.05, failure_rate=0.0, seed=1, market=None):
+        self.rate_per_minute = rate_per_minute
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.market = market
+        self.random = random.Random(seed)
+        self.recent = []
+        self.counts = {200: 0, 404: 0, 414: 0, 429: 0, 503: 0, 'html': 0}
+
+    def respond(self, status, **kwargs):
+        self.counts[status] += 1
+        if status == 200:
+            return web.json_response(**kwargs)
+        return web.Response(status=status, **kwargs)
+
+    async def limited(self, request):
+        """The error response for a request over a limit or chosen to fail, else None"""
+        now = time.monotonic()
+        self.recent = [t for t in self.recent if now - t < 60]
+        if len(str(request.url)) > MAX_URL_LENGTH:
+            return self.respond(414)
+        if len(self.recent) >= self.rate_per_minute:
+            return self.respond(429, headers={'Retry-After': f'{60 - (now - self.recent[0]):.2f}'})
+        self.recent.append(now)
+
+        await asyncio.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            if self.random.random() < 0.5:
+                self.counts['html'] += 1
+                return web.Response(text='<html><body>Checking your browser...</body></html>',
+                                    content_type='text/html')
+            return self.respond(503)
+        return None
+
+    async def simple_price(self, request):
+        error = await self.limited(request)
+        if error is not None:
+            return error
+        ids = request.query.get('ids', '').split(',')
+        if self.market is not None:
+            return self.respond(200, data=self.market.quotes(ids))
+        # Like CoinGecko, unknown ids are silently left out of the response
+        return self.respond(200, data={
+            coin_id: {
+                'usd': 1.0 + i,
+                'usd_market_cap': 1e6 * (i + 1),
+                'usd_24h_vol': 1e5 * (i + 1),
+                'usd_24h_change': 0.5
+            }
+            for i, coin_id in enumerate(ids) if not coin_id.startswith('unknown-')
+        })
+
+    async def market_chart(self, request):
+        error = await self.limited(request)
+        if error is not None:
+            return error
+        coin_id = request.match_info['coin_id']
+        if self.market is None or coin_id not in self.market.index:
+            return self.respond(404, text=f'coin not found: {coin_id}')
+        start, end = float(request.query['from']), float(request.query['to'])
+        return self.respond(200, data=self.market.market_chart(coin_id, start, end))
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/api/v3/simple/price', self.simple_price)
+        app.router.add_get('/api/v3/coins/{coin_id}/market_chart/range', self.market_chart)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        return f'http://127.0.0.1:{port}/api/v3'
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+async def run_case(server, base_url, coin_ids, concurrency, rate_per_minute):
+    fetcher = PriceFetcher(base_url=base_url, api_key='', concurrency=concurrency, rate_per_minute=rate_per_minute)
+    start = time.perf_counter()
+    records, missing, failed = await fetcher.fetch(coin_ids)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{concurrency:>12} {elapsed:>10.2f} {len(records):>9} {len(missing):>8} {len(failed):>7} "
+        f"{fetcher.stats['requests']:>9} {fetcher.stats['retries']:>8}"
+    )
+
+async def run_benchmark(num_ids, concurrencies, rate_per_minute, latency, failure_rate):
+    coin_ids = [f'coin-{i}' for i in range(num_ids)] + [f'unknown-{i}' for i in range(10)]
+    print(f"{len(coin_ids)} ids, server limit {rate_per_minute}/min, {latency * 1000:.0f}ms latency, "
+          f"{failure_rate:.0%} injected failures\n")
+    print(f"{'concurrency':>12} {'seconds':>10} {'records':>9} {'missing':>8} {'failed':>7} {'requests':>9} {'retries':>8}")
+    for concurrency in concurrencies:
+        # A fresh server per case so one case's requests don't count against the next
+        server = FakeCoinGecko(rate_per_minute, latency, failure_rate)
+        base_url = await server.start()
+        try:
+            await run_case(server, base_url, coin_ids, concurrency, rate_per_minute)
+        finally:
+            await server.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the async price fetcher against a local fake CoinGecko')
+    parser.add_argument('--ids', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--rate-per-minute', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=50.0)
+    parser.add_argument('--failure-rate', type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.ids, args.concurrency, args.rate_per_minute, args.latency_ms / 1000,
+                              args.failure_rate))
@@ -0,0 +1,69 @@
+import argparse
+import os
+import time
+from statistics import NormalDist
+
+import numpy as np
+
+from benchmark_risk import generate_closes
+from monte_carlo import build_model, simulate, summarize
+from risk import returns_matrix
+
+def synthetic_model(coins, days, kind, seed=42):
+    rng = np.random.default_rng(seed)
+    matrix = returns_matrix(*generate_closes(rng, coins, days))
+    holdings = [(coin, coin, coin, float(rng.uniform(1, 100)), 'Other') for coin in matrix.coins]
+    return build_model(matrix, holdings, kind)
+
+def check_gbm(paths, horizon):
+    """One coin under GBM: simulated log-return quantiles against the normal distribution"""
+    model = synthetic_model(1, 3 * 365, 'gbm')
+    aggregate = simulate(model, paths, [horizon], workers=1, seed=1)
+    drift, sigma = model.drift[0] * horizon, abs(model.factor[0, 0]) * np.sqrt(horizon)
+    worst = 0.0
+    for q in (0.01, 0.05, 0.5, 0.95, 0.99):
+        expected = np.expm1(drift + sigma * NormalDist().inv_cdf(q))
+        worst = max(worst, abs(aggregate.percentile(0, q) - expected) / sigma)
+    status = '✅' if worst < 0.02 else '❌'
+    print(f"{status} GBM quantiles within {worst:.4f} standard deviations of the closed form ({paths:,} paths)")
+    return worst < 0.02
+
+def run_benchmark(coins, days, paths, horizons, kind, worker_counts):
+    model = synthetic_model(coins, days, kind)
+    print(f"{kind} model, {coins} coins, {paths:,} paths, horizons {', '.join(f'{h}d' for h in horizons)}\n")
+    print(f"{'workers':>7} {'seconds':>9} {'paths/sec':>12} {'path-days/sec':>14}")
+    reports = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        aggregate = simulate(model, paths, horizons, workers=workers, seed=7)
+        seconds = time.perf_counter() - start
+        reports.append(summarize(model, aggregate))
+        print(f"{workers:>7} {seconds:>9.2f} {paths / seconds:>12,.0f} {paths * max(horizons) / seconds:>14,.0f}")
+
+    same = all(report == reports[0] for report in reports)
+    print(f"\n{'✅' if same else '❌'} Identical results across worker counts")
+    last = reports[0]['horizons'][f"{max(horizons)}d"]
+    print(f"{max(horizons)}d 95% VaR {last['var']['95%']['var']:.2%}, CVaR {last['var']['95%']['cvar']:.2%}, "
+          f"median max drawdown {last['max_drawdown']['p50']:.2%}")
+    return same
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Monte Carlo throughput per worker count')
+    parser.add_argument('--coins', type=int, default=20)
+    parser.add_argument('--days', type=int, default=3 * 365)
+    parser.add_argument('--paths', type=int, default=200_000)
+    parser.add_argument('--horizons', default='1,7,30')
+    parser.add_argument('--model', choices=['gbm', 'bootstrap'], default='gbm')
+    parser.add_argument('--workers', default=None, help='comma-separated worker counts (default 1, 2, 4, ... up to the CPU count)')
+    args = parser.parse_args()
+
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(',')]
+    else:
+        cpus = os.cpu_count() or 1
+        worker_counts = sorted({min(2 ** i, cpus) for i in range(cpus.bit_length() + 1)})
+    ok = check_gbm(200_000, 30)
+    print()
+    ok = run_benchmark(args.coins, args.days, args.paths, [int(h) for h in args.horizons.split(',')],
+                       args.model, worker_counts) and ok
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,152 @@
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from connection_pool import ConnectionPool, PoolTimeout
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, params=()):
+        if self._conn.dead:
+            raise ConnectionError("Session no longer exists")
+        time.sleep(self._conn.query_latency)
+        return self
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, query_latency):
+        self.query_latency = query_latency
+        self.dead = False
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+class FakeConnector:
+    """Connection factory that sleeps like a warehouse login and can kill its sessions"""
+
+    def __init__(self, login_seconds=0.5, query_latency=0.005):
+        self.login_seconds = login_seconds
+        self.query_latency = query_latency
+        self.connections = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        time.sleep(self.login_seconds)
+        conn = FakeConnection(self.query_latency)
+        with self._lock:
+            self.connections.append(conn)
+        return conn
+
+    def kill_all(self):
+        with self._lock:
+            for conn in self.connections:
+                conn.dead = True
+
+def run_job(conn, queries):
+    cur = conn.cursor()
+    for _ in range(queries):
+        cur.execute("SELECT 1")
+    cur.close()
+
+def run_fresh(connector, jobs, workers, queries):
+    def job(_):
+        conn = connector()
+        try:
+            run_job(conn, queries)
+        finally:
+            conn.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(job, range(jobs)))
+    return time.perf_counter() - start
+
+def run_pooled(pool, jobs, workers, queries):
+    def job(_):
+        with pool.checkout() as conn:
+            run_job(conn, queries)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(job, range(jobs)))
+    return time.perf_counter() - start
+
+def check_health_checks(login_seconds):
+    """Kill every idle session and make sure the next checkouts get live replacements"""
+    connector = FakeConnector(login_seconds, query_latency=0)
+    pool = ConnectionPool(connector, max_size=2, health_check_interval=0)
+    run_pooled(pool, 4, 2, 1)
+    connector.kill_all()
+    run_pooled(pool, 4, 2, 1)
+    metrics = pool.metrics()
+    pool.close()
+    if metrics['health_check_failures'] < 1 or metrics['connects'] < 3:
+        raise RuntimeError(f"Dead connections were not replaced: {metrics}")
+    print(f"✅ Health checks replaced {metrics['health_check_failures']} dead connection(s)")
+
+def check_eviction():
+    connector = FakeConnector(0, query_latency=0)
+    pool = ConnectionPool(connector, max_size=2, max_idle=0.05)
+    run_pooled(pool, 4, 2, 1)
+    time.sleep(0.1)
+    evicted = pool.evict()
+    metrics = pool.metrics()
+    pool.close()
+    if evicted != 2 or metrics['idle'] != 0:
+        raise RuntimeError(f"Idle connections were not evicted: {metrics}")
+    print(f"✅ Evicted {evicted} idle connection(s)")
+
+def check_timeout():
+    pool = ConnectionPool(FakeConnector(0, query_latency=0), max_size=1)
+    with pool.checkout():
+        try:
+            with pool.checkout(timeout=0.05):
+                pass
+        except PoolTimeout as e:
+            print(f"✅ Checkout past max_size timed out: {e}")
+        else:
+            raise RuntimeError("Checkout past max_size should have timed out")
+    pool.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare pooled checkouts with a fresh connection per job using a fake connector')
+    parser.add_argument('--jobs', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=5, help='queries per job')
+    parser.add_argument('--login-ms', type=float, default=500, help='simulated login/SSL/warehouse-resume time')
+    parser.add_argument('--latency-ms', type=float, default=5, help='simulated round trip per query')
+    args = parser.parse_args()
+
+    login, latency = args.login_ms / 1000, args.latency_ms / 1000
+    fresh = run_fresh(FakeConnector(login, latency), args.jobs, args.workers, args.queries)
+
+    pool = ConnectionPool(FakeConnector(login, latency), max_size=args.pool_size)
+    pooled = run_pooled(pool, args.jobs, args.workers, args.queries)
+    metrics = pool.metrics()
+    pool.close()
+
+    print(f"{'mode':>8} {'jobs':>6} {'seconds':>10} {'jobs/sec':>10}")
+    print(f"{'fresh':>8} {args.jobs:>6} {fresh:>10.3f} {args.jobs / fresh:>10.1f}")
+    print(f"{'pooled':>8} {args.jobs:>6} {pooled:>10.3f} {args.jobs / pooled:>10.1f}")
+    print(json.dumps(metrics, indent=2))
+
+    check_health_checks(login / 10)
+    check_eviction()
+    check_timeout()
@@ -0,0 +1,54 @@
+import argparse
+import time
+from datetime import date
+
+import numpy as np
+
+from benchmark_analytics import CATEGORIES
+from local_analytics import Holding
+from risk import covariance, portfolio_risk, returns_matrix
+
+def generate_closes(rng, coins, days, missing=0.02):
+    """(coin_id, date, close) columns for random walks with staggered listings and missing days"""
+    first = np.where(np.arange(coins) % 4 == 0, rng.integers(0, days // 2, coins), 0)
+    day = np.tile(np.arange(days), coins)
+    coin = np.repeat(np.arange(coins), days)
+    walk = np.exp(np.cumsum(rng.normal(0, 0.04, (coins, days)), axis=1)) * rng.uniform(0.01, 50000, (coins, 1))
+    keep = (day >= first[coin]) & ((rng.random(coins * days) >= missing) | (day == first[coin]))
+    coin_ids = np.array([f'coin-{i}' for i in range(coins)], dtype=object)[coin[keep]]
+    dates = np.datetime64(date(2021, 1, 1), 'D') + day[keep]
+    return coin_ids, dates, walk.ravel()[keep]
+
+def timed(label, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    print(f"{label:<28} {seconds:>8.3f}s")
+    return result, seconds
+
+def run_benchmark(coins, days, seed=42):
+    rng = np.random.default_rng(seed)
+    coin_ids, dates, closes = generate_closes(rng, coins, days)
+    holdings = [
+        Holding(f'coin-{i}', f'C{i}', f'Coin {i}', float(rng.uniform(1, 1000)), CATEGORIES[i % len(CATEGORIES)])
+        for i in range(coins)
+    ]
+    print(f"{coins} coins x {days} days = {len(closes):,} daily closes\n")
+
+    matrix, build = timed('returns matrix', returns_matrix, coin_ids, dates, closes)
+    timed('covariance + correlation', covariance, matrix)
+    report, risk = timed('portfolio_risk (all metrics)', portfolio_risk, matrix, holdings)
+    print(f"{'total':<28} {build + risk:>8.3f}s\n")
+
+    print(f"Annualized volatility: {report['annualized_volatility']:.2%}")
+    for confidence, values in report['var'].items():
+        print(f"{confidence:.0%} VaR historical {values['historical'][0]:.2%} / parametric {values['parametric'][0]:.2%}, "
+              f"CVaR historical {values['historical'][1]:.2%} / parametric {values['parametric'][1]:.2%}")
+    print(f"Max drawdown: {report['max_drawdown']:.2%}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the NumPy risk engine on synthetic daily closes')
+    parser.add_argument('--coins', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=3 * 365)
+    args = parser.parse_args()
+    run_benchmark(args.coins, args.days)
@@ -0,0 +1,196 @@
+"""Measure how much data each view reads.
+
+On Snowflake each view is queried with the result cache off, and
+QUERY_HISTORY_BY_SESSION reports the bytes and micro-partitions scanned.
+On DuckDB the JSON profiler reports rows scanned, which drops when row
+group zonemaps prune a range filter.
+
+Save a run before a schema change with --output, then compare:
+
+    python scripts/benchmark_scans.py --output before.json
+    python scripts/setup_snowflake.py && python scripts/setup_snowflake_analytics.py
+    python scripts/benchmark_scans.py --compare before.json
+
+--synthetic DAYS builds an in-memory DuckDB database with DAYS of hourly
+ticks, then measures it before and after the retention job.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from backends import DuckDBConnection, get_backend_name
+from connection_pool import get_pool
+from latest_prices import backfill_latest_prices
+from retention import archive_prices, get_retention_days, retention_cutoff
+from rollups import backfill_rollups
+from setup_snowflake import create_tables
+from setup_snowflake_analytics import ANALYTICS_VIEWS
+
+VIEWS = ['PORTFOLIO_ANALYSIS'] + list(ANALYTICS_VIEWS)
+
+QUERY_STATS_SQL = """
+SELECT BYTES_SCANNED, PARTITIONS_SCANNED, PARTITIONS_TOTAL
+FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 100))
+WHERE QUERY_ID = %s
+"""
+
+SYNTHETIC_NOW = datetime(2024, 3, 31, 12, 0, 0)
+
+SYNTHETIC_PRICES_SQL = """
+INSERT INTO PRICES (COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD, PRICE_CHANGE_24H_PCT)
+SELECT
+    'coin-' || (i % {coins}),
+    TIMESTAMP '{start}' + to_hours(CAST(i // {coins} AS INTEGER)),
+    100 + (i % {coins}) + sin(i / 97.0) * 5,
+    1e9,
+    1e7 + (i % 1000),
+    sin(i / 13.0) * 8
+FROM range({rows}) t(i)
+"""
+
+def measure_snowflake(cur, view):
+    start = time.perf_counter()
+    cur.execute(f"SELECT * FROM {view}")
+    rows = len(cur.fetchall())
+    seconds = time.perf_counter() - start
+    query_id = cur.sfqid
+
+    # Query history is populated shortly after the query finishes
+    stats = None
+    for _ in range(10):
+        cur.execute(QUERY_STATS_SQL, [query_id])
+        stats = cur.fetchone()
+        if stats and stats[0] is not None:
+            break
+        time.sleep(1)
+    bytes_scanned, partitions_scanned, partitions_total = stats or (None, None, None)
+    return {
+        'rows': rows,
+        'seconds': seconds,
+        'bytes_scanned': bytes_scanned,
+        'partitions_scanned': partitions_scanned,
+        'partitions_total': partitions_total
+    }
+
+def measure_duckdb(cur, view, profile_path):
+    cur.execute("PRAGMA enable_profiling='json'")
+    cur.execute(f"PRAGMA profiling_output='{profile_path}'")
+    start = time.perf_counter()
+    cur.execute(f"SELECT * FROM {view}")
+    rows = len(cur.fetchall())
+    seconds = time.perf_counter() - start
+    cur.execute("PRAGMA disable_profiling")
+    with open(profile_path) as f:
+        profile = json.load(f)
+    return {'rows': rows, 'seconds': seconds, 'rows_scanned': profile.get('cumulative_rows_scanned')}
+
+def measure(cur, backend):
+    if backend == 'snowflake':
+        cur.execute("ALTER SESSION SET USE_CACHED_RESULT = FALSE")
+    fd, profile_path = tempfile.mkstemp(prefix='scan_profile_', suffix='.json')
+    os.close(fd)
+    try:
+        cur.execute("SELECT COUNT(*) FROM PRICES")
+        results = {'backend': backend, 'prices_rows': cur.fetchone()[0], 'views': {}}
+        for view in VIEWS:
+            if backend == 'snowflake':
+                results['views'][view] = measure_snowflake(cur, view)
+            else:
+                results['views'][view] = measure_duckdb(cur, view, profile_path)
+    finally:
+        os.remove(profile_path)
+    return results
+
+def scan_metric(results):
+    return 'bytes_scanned' if results['backend'] == 'snowflake' else 'rows_scanned'
+
+def print_results(results):
+    metric = scan_metric(results)
+    print(f"PRICES rows: {results['prices_rows']:,}")
+    print(f"{'view':<26} {'rows':>8} {'seconds':>9} {metric:>16} {'partitions':>14}")
+    for view, stats in results['views'].items():
+        partitions = ''
+        if stats.get('partitions_total') is not None:
+            partitions = f"{stats['partitions_scanned']}/{stats['partitions_total']}"
+        scanned = stats.get(metric)
+        scanned = f"{scanned:,}" if scanned is not None else 'n/a'
+        print(f"{view:<26} {stats['rows']:>8} {stats['seconds']:>9.3f} {scanned:>16} {partitions:>14}")
+
+def print_comparison(before, after):
+    metric = scan_metric(after)
+    print(f"{'view':<26} {'before':>16} {'after':>16} {'change':>8}")
+    for view, stats in after['views'].items():
+        old = before['views'].get(view, {}).get(metric)
+        new = stats.get(metric)
+        if old is None or new is None:
+            print(f"{view:<26} {'n/a':>16} {new if new is not None else 'n/a':>16}")
+            continue
+        change = f"{(new - old) / old * 100:+.0f}%" if old else 'n/a'
+        print(f"{view:<26} {old:>16,} {new:>16,} {change:>8}")
+
+def synthetic_connection(days, coins):
+    conn = DuckDBConnection(now=SYNTHETIC_NOW)
+    cur = conn.cursor()
+    create_tables(cur)
+    for sql in ANALYTICS_VIEWS.values():
+        cur.execute(sql)
+    cur.executemany(
+        "INSERT INTO HOLDINGS (COIN_ID, SYMBOL, NAME, AMOUNT, CATEGORY) VALUES (%s, %s, %s, %s, %s)",
+        [(f'coin-{i}', f'C{i}', f'Coin {i}', i + 1, ('Layer 1', 'DeFi', 'Meme')[i % 3]) for i in range(coins)]
+    )
+    start = SYNTHETIC_NOW - timedelta(hours=days * 24 - 1)
+    cur.execute(SYNTHETIC_PRICES_SQL.format(coins=coins, start=start.isoformat(sep=' '), rows=days * 24 * coins))
+    backfill_rollups(cur)
+    backfill_latest_prices(cur)
+    return conn, cur
+
+def run_synthetic(days, coins, retention_days):
+    conn, cur = synthetic_connection(days, coins)
+    try:
+        before = measure(cur, 'duckdb')
+        print(f"Before retention ({days} days of hourly ticks for {coins} coins)")
+        print_results(before)
+
+        result = archive_prices(cur, retention_cutoff(retention_days, SYNTHETIC_NOW))
+        after = measure(cur, 'duckdb')
+        print(f"\nAfter archiving {result['rows_archived']:,} rows older than {result['cutoff']}")
+        print_results(after)
+        print()
+        print_comparison(before, after)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure data scanned by each analytics view')
+    parser.add_argument('--output', help='write the measurements to this JSON file')
+    parser.add_argument('--compare', help='compare against measurements saved with --output')
+    parser.add_argument('--synthetic', type=int, metavar='DAYS', help='measure a synthetic DuckDB database instead')
+    parser.add_argument('--coins', type=int, default=100, help='coins in the synthetic database')
+    parser.add_argument('--retention-days', type=int, default=None, help='retention applied in the synthetic run')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        run_synthetic(args.synthetic, args.coins, args.retention_days or get_retention_days())
+        raise SystemExit(0)
+
+    backend = get_backend_name()
+    if backend == 'sqlite':
+        raise SystemExit("sqlite has no scan statistics; use STORAGE_BACKEND=snowflake or duckdb")
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        try:
+            results = measure(cur, backend)
+        finally:
+            cur.close()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            print_comparison(json.load(f), results)
@@ -0,0 +1,127 @@
+"""Multi-portfolio sync throughput by connection pool size.
+
+A DuckDB file stands in for the warehouse, with a simulated round trip on
+every statement (--latency-ms): a sync against a remote warehouse spends
+most of its time waiting on the network, which is what concurrent syncs
+overlap. Each tick syncs --portfolios payloads of --holdings coins drawn
+from --coins, so portfolios overlap and the merged price write is much
+smaller than the quotes received.
+
+For each of --pool-sizes the scheduler runs a warm-up tick, which opens
+the connections, then --ticks timed ticks with one sync per connection at
+a time. Every tick must succeed and add exactly one PRICES row per
+distinct coin quoted.
+"""
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+
+from backends import DuckDBConnection
+from connection_pool import ConnectionPool
+
+def make_portfolios(rng, portfolios, holdings, coins):
+    return {
+        f'portfolio-{i}': sorted(rng.sample(range(coins), holdings))
+        for i in range(portfolios)
+    }
+
+def make_tick(portfolios, prices):
+    """{portfolio_id: payload} quoting each portfolio's coins at this tick's prices"""
+    return {
+        portfolio_id: {
+            'holdings': [
+                {'coin_id': f'coin-{coin}', 'symbol': f'C{coin}', 'name': f'Coin {coin}',
+                 'amount': 1.0 + coin % 7, 'category': 'Layer 1'}
+                for coin in coins
+            ],
+            'prices': [
+                {'coin_id': f'coin-{coin}', 'price_usd': prices[coin], 'market_cap_usd': prices[coin] * 1e7,
+                 'volume_24h_usd': 1e6, 'price_change_24h_pct': 0.0}
+                for coin in coins
+            ]
+        }
+        for portfolio_id, coins in portfolios.items()
+    }
+
+def count_prices(path):
+    conn = DuckDBConnection(path)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM PRICES")
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+        conn.close()
+
+def run_pool_size(path, size, portfolios, prices, rng, ticks, latency, holdings_mode):
+    """(seconds per timed tick, quotes received, PRICES rows written) for one pool size"""
+    from portfolio_scheduler import PortfolioScheduler
+
+    pool = ConnectionPool(lambda: DuckDBConnection(path, latency=latency), max_size=size)
+    scheduler = PortfolioScheduler(pool, concurrency=size, holdings_mode=holdings_mode)
+    times = []
+    received = written = 0
+    try:
+        for tick in range(ticks + 1):
+            for coin in range(len(prices)):
+                prices[coin] *= math.exp(rng.gauss(0, 0.01))
+            payloads = make_tick(portfolios, prices)
+            before = count_prices(path)
+            start = time.perf_counter()
+            result = scheduler.run(payloads)
+            seconds = time.perf_counter() - start
+            if result['status'] != 'success':
+                raise RuntimeError(f"Tick failed at pool size {size}: {result['message']}")
+            added = count_prices(path) - before
+            if added != result['details']['prices_merged']:
+                raise RuntimeError(f"Tick wrote {added} PRICES rows for {result['details']['prices_merged']} coins")
+            if tick:
+                times.append(seconds)
+                received += result['details']['prices_received']
+                written += added
+    finally:
+        scheduler.close()
+        pool.close()
+    return sum(times) / len(times), received, written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark concurrent multi-portfolio syncs against pool size')
+    parser.add_argument('--portfolios', type=int, default=64)
+    parser.add_argument('--holdings', type=int, default=20, help='coins per portfolio')
+    parser.add_argument('--coins', type=int, default=300, help='coins the portfolios draw from')
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--ticks', type=int, default=2, help='timed ticks per pool size')
+    parser.add_argument('--latency-ms', type=float, default=20, help='simulated round trip per statement')
+    parser.add_argument('--holdings-mode', choices=['replace', 'delta'], default='replace')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    portfolios = make_portfolios(rng, args.portfolios, min(args.holdings, args.coins), args.coins)
+    prices = [rng.uniform(0.01, 1000) for _ in range(args.coins)]
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        # Keeps the sync's local state out of the real state directory
+        os.environ.update({'STORAGE_BACKEND': 'duckdb', 'SYNC_STATE_DIR': state_dir})
+        path = os.path.join(state_dir, 'portfolio.duckdb')
+        from setup_snowflake import create_tables
+
+        conn = DuckDBConnection(path)
+        create_tables(conn.cursor())
+        conn.close()
+
+        print(f"{args.portfolios} portfolios x {args.holdings} coins from {args.coins}, "
+              f"{args.latency_ms:g} ms per statement, {args.holdings_mode} holdings\n")
+        print(f"{'pool':>6} {'s/tick':>8} {'portfolios/s':>13} {'speedup':>8} {'quotes':>8} {'written':>8}")
+        baseline = None
+        for size in args.pool_sizes:
+            seconds, received, written = run_pool_size(
+                path, size, portfolios, prices, rng, args.ticks, args.latency_ms / 1000, args.holdings_mode
+            )
+            baseline = baseline or seconds
+            print(f"{size:>6} {seconds:>8.3f} {args.portfolios / seconds:>13.1f} {baseline / seconds:>7.2f}x "
+                  f"{received // args.ticks:>8} {written // args.ticks:>8}")
+    print("\n✅ Every tick wrote one PRICES row per distinct coin")
@@ -0,0 +1,154 @@
+"""Startup cost of the sync module and CLI, with an enforceable budget.
+
+Each measurement runs in a fresh interpreter:
+
+- `python -X importtime -c "import snowflake_sync"`: cumulative import time
+  of snowflake_sync and its slowest dependencies. Modules the interpreter
+  loads at startup (site hooks) are not counted.
+- the modules that must stay off the default path (numpy, the Snowflake
+  connector, dotenv) are checked for in sys.modules after the import
+- a CLI sync of a small payload into a temporary SQLite database, with the
+  optional participants off and then with indicators and alerts on
+
+Exits 1 when the median import time exceeds --budget-ms or a heavy module
+was imported, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET_MS = 100
+HEAVY_MODULES = ('numpy', 'snowflake.connector', 'dotenv')
+FEATURE_VARS = (
+    'PRICE_STORE_DIR', 'SNOWFLAKE_SYNC_INDICATORS', 'SNOWFLAKE_SYNC_ALERTS',
+    'SNOWFLAKE_SYNC_METRICS_PATH', 'SNOWFLAKE_SYNC_PROFILE'
+)
+
+def base_env(state_dir, **extra):
+    env = {key: value for key, value in os.environ.items() if key not in FEATURE_VARS}
+    env.update({
+        'STORAGE_BACKEND': 'sqlite',
+        'STORAGE_PATH': os.path.join(state_dir, 'portfolio.sqlite'),
+        'SYNC_STATE_DIR': state_dir,
+        'PYTHONPATH': SCRIPTS_DIR
+    })
+    env.update(extra)
+    return env
+
+def run(args, env, **kwargs):
+    return subprocess.run([sys.executable, *args], env=env, cwd=SCRIPTS_DIR, capture_output=True, text=True, **kwargs)
+
+def import_times(env, module='snowflake_sync'):
+    """(total µs for `module`, {dependency: cumulative µs}) from one -X importtime run"""
+    result = run(['-X', 'importtime', '-c', f'import {module}'], env)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+
+    # Lines are printed as each import finishes, children first; the module's
+    # own dependencies are the rows just before it that are indented deeper
+    total = None
+    dependencies = {}
+    for index, (cumulative, name) in enumerate(rows):
+        if name.strip() == module and len(name) - len(name.lstrip()) == 1:
+            total = cumulative
+            depth = 1
+            for child_cumulative, child in reversed(rows[:index]):
+                child_depth = len(child) - len(child.lstrip())
+                if child_depth <= depth:
+                    break
+                dependencies[child.strip()] = child_cumulative
+            break
+    if total is None:
+        raise RuntimeError(f"{module} not found in -X importtime output")
+    return total, dependencies
+
+def heavy_imports(env, module='snowflake_sync'):
+    code = f"import json, sys, {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = run(['-c', code], env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout)
+
+def payload(coins=20):
+    return {
+        'holdings': [
+            {'coin_id': f'coin-{i}', 'symbol': f'C{i}', 'name': f'Coin {i}', 'amount': 1, 'category': 'Other'}
+            for i in range(coins)
+        ],
+        'prices': [
+            {'coin_id': f'coin-{i}', 'price_usd': 100.0 + i, 'market_cap_usd': 1e9,
+             'volume_24h_usd': 1e7, 'price_change_24h_pct': 1.0}
+            for i in range(coins)
+        ]
+    }
+
+def cli_times(env, runs):
+    """Wall milliseconds of `python snowflake_sync.py <payload>` per run"""
+    data = json.dumps(payload())
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run(['snowflake_sync.py', data], env)
+        times.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"CLI sync failed:\n{result.stdout}\n{result.stderr}")
+    return times
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure sync module import and CLI cold-start time against a budget')
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='maximum median import time of snowflake_sync')
+    parser.add_argument('--top', type=int, default=10, help='slowest dependencies to list')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = base_env(state_dir)
+        setup = run(['setup_snowflake.py'], env)
+        if setup.returncode != 0:
+            raise SystemExit(f"❌ Could not create the benchmark database:\n{setup.stdout}\n{setup.stderr}")
+
+        samples = [import_times(env) for _ in range(args.runs)]
+        median_ms = statistics.median(total for total, _ in samples) / 1000
+        dependencies = {}
+        for _, sample in samples:
+            for name, micros in sample.items():
+                dependencies.setdefault(name, []).append(micros)
+        print(f"import snowflake_sync: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:g} ms)")
+        slowest = sorted(dependencies.items(), key=lambda item: -statistics.median(item[1]))[:args.top]
+        for name, micros in slowest:
+            print(f"  {statistics.median(micros) / 1000:>8.1f} ms  {name}")
+        if median_ms > args.budget_ms:
+            failures.append(f"import time {median_ms:.1f} ms is over the {args.budget_ms:g} ms budget")
+
+        heavy = heavy_imports(env)
+        print(f"{'❌' if heavy else '✅'} heavy modules after import: {', '.join(heavy) or 'none'}")
+        if heavy:
+            failures.append(f"imported {', '.join(heavy)} on the default path")
+
+        print(f"\n{'CLI sync (20 coins)':<32} {'median ms':>10} {'min ms':>8}")
+        for label, extra in (
+            ('participants off', {}),
+            ('indicators + alerts on', {'SNOWFLAKE_SYNC_INDICATORS': '1', 'SNOWFLAKE_SYNC_ALERTS': '1'})
+        ):
+            times = cli_times(base_env(state_dir, **extra), args.runs)
+            print(f"{label:<32} {statistics.median(times):>10.1f} {min(times):>8.1f}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("\n✅ Startup within budget")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,477 @@
+"""End-to-end benchmark of backfill, sync and analytics on synthetic data.
+
+A SyntheticMarket generates random-walk price histories for `--coins`
+coins at `--ticks-per-day` over `--days`, and keeps walking them for live
+quotes. A local fake CoinGecko (benchmark_fetcher.FakeCoinGecko) serves
+both to the real fetcher. The data lands in a temporary SQLite or DuckDB
+database. Scenarios:
+
+- backfill: backfill.py loads the history, one market chart per coin
+- fetch / sync: `--sync-ticks` live ticks, each fetched from the fake
+  server and written with sync_data; stage times are summed per stage
+- views: every analytics view in setup_snowflake_analytics, `--repeat` times
+- local_analytics: the NumPy engine over the same history, `--repeat` times
+
+Each scenario runs in a fresh process, so its peak RSS is its own. The
+results file has throughput, p50/p99/max latency per operation and peak
+RSS per scenario, plus the scale and environment of the run.
+
+    python scripts/benchmark_suite.py run [--coins 50 --days 30] [--output results.json] [--compare baseline.json]
+    python scripts/benchmark_suite.py compare baseline.json results.json [--tolerance 0.15]
+
+`compare` flags a metric that is more than `--tolerance` worse than the
+baseline: lower rows/sec, or higher p50, p99 or peak RSS. It exits 1 if
+any metric regressed.
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from multiprocessing import get_context
+
+import numpy as np
+
+from price_dedup import get_state_dir
+
+SCENARIOS = ('backfill', 'live', 'views', 'local_analytics')
+COMPARED_METRICS = (
+    # (metric, higher is better)
+    ('rows_per_second', True),
+    ('p50_ms', False),
+    ('p99_ms', False),
+    ('peak_rss_mb', False),
+)
+DEFAULT_TOLERANCE = 0.15
+CATEGORIES = ['Layer 1', 'Layer 2', 'DeFi', 'Oracle', 'Meme', 'Other']
+UNLIMITED_RATE = 1_000_000
+
+SuiteOptions = namedtuple('SuiteOptions', [
+    'coins', 'holdings', 'ticks_per_day', 'days', 'sync_ticks', 'repeat', 'backend', 'path', 'end', 'seed',
+    'server_latency'
+])
+
+class SyntheticMarket:
+    """Deterministic random-walk prices for coin-0 .. coin-N.
+
+    History runs from a day before `days` ahead of `end` up to `end` (the
+    extra day gives the first backfilled rows a 24h change). Live quotes
+    continue each walk from its last historical price, one tick per advance().
+    """
+
+    def __init__(self, coins, ticks_per_day, days, end, seed=42):
+        self.coin_ids = [f'coin-{i}' for i in range(coins)]
+        self.index = {coin_id: i for i, coin_id in enumerate(self.coin_ids)}
+        self.ticks_per_day = ticks_per_day
+        self.interval_ms = 86_400_000 // ticks_per_day
+        self.first_ms = int((end - timedelta(days=days + 1)).replace(tzinfo=timezone.utc).timestamp() * 1000)
+        self.count = (days + 1) * ticks_per_day
+        self.seed = seed
+        # Only the live state is kept; each history is regenerated on request
+        self.price = np.array([self.history(i)[1][-1] for i in range(coins)])
+        self.day_ago = self.price.copy()
+        self.recent = [self.price.copy()]
+        self.rng = np.random.default_rng([seed, coins])
+
+    def history(self, i):
+        """(epoch ms, price, market cap, volume) arrays of coin i's full history"""
+        rng = np.random.default_rng([self.seed, i])
+        times = self.first_ms + np.arange(self.count, dtype=np.int64) * self.interval_ms
+        price = rng.uniform(0.01, 50000) * np.exp(np.cumsum(rng.normal(0, 0.01, self.count)))
+        market_cap = price * rng.uniform(1e6, 1e9)
+        volume = rng.lognormal(16, 0.5, self.count)
+        return times, price, market_cap, volume
+
+    def market_chart(self, coin_id, start, end):
+        """A /market_chart/range payload between two epoch seconds"""
+        times, price, market_cap, volume = self.history(self.index[coin_id])
+        keep = (times >= start * 1000) & (times <= end * 1000)
+        times = times[keep].tolist()
+        return {
+            'prices': [list(point) for point in zip(times, price[keep].tolist())],
+            'market_caps': [list(point) for point in zip(times, market_cap[keep].tolist())],
+            'total_volumes': [list(point) for point in zip(times, volume[keep].tolist())],
+        }
+
+    def advance(self):
+        self.price = self.price * np.exp(self.rng.normal(0, 0.01, len(self.price)))
+        self.recent.append(self.price)
+        if len(self.recent) > self.ticks_per_day:
+            self.day_ago = self.recent.pop(0)
+
+    def quotes(self, coin_ids):
+        """A /simple/price payload for the known ids at the current tick"""
+        quotes = {}
+        for coin_id in coin_ids:
+            i = self.index.get(coin_id)
+            if i is None:
+                continue
+            price = float(self.price[i])
+            quotes[coin_id] = {
+                'usd': price,
+                'usd_market_cap': price * 1e7,
+                'usd_24h_vol': 1e6 * (1 + i % 100),
+                'usd_24h_change': (price / float(self.day_ago[i]) - 1) * 100
+            }
+        return quotes
+
+    def holdings(self, count):
+        return [
+            {'coin_id': coin_id, 'symbol': f'C{i}', 'name': f'Coin {i}', 'amount': float(i + 1),
+             'category': CATEGORIES[i % len(CATEGORIES)]}
+            for i, coin_id in enumerate(self.coin_ids[:count])
+        ]
+
+class ServerThread:
+    """A FakeCoinGecko on its own event loop thread, so synchronous code can call it"""
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.base_url = self.call(server.start())
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def close(self):
+        self.call(self.server.stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+def connect(options):
+    from backends import DuckDBConnection, SQLiteConnection
+
+    return SQLiteConnection(options.path) if options.backend == 'sqlite' else DuckDBConnection(options.path)
+
+def make_market(options):
+    return SyntheticMarket(options.coins, options.ticks_per_day, options.days, options.end, options.seed)
+
+@contextlib.contextmanager
+def fake_server(options, market):
+    from benchmark_fetcher import FakeCoinGecko
+
+    server = ServerThread(FakeCoinGecko(UNLIMITED_RATE, options.server_latency, market=market))
+    try:
+        yield server.base_url
+    finally:
+        server.close()
+
+@contextlib.contextmanager
+def quiet():
+    """Hide per-window and per-sync progress lines; failures are raised, not printed"""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+def summarize(op, seconds, rows, latencies, **extra):
+    latencies_ms = np.asarray(latencies, dtype=float) * 1000
+    p50, p99 = np.percentile(latencies_ms, [50, 99]) if len(latencies_ms) else (0.0, 0.0)
+    summary = {
+        'op': op,
+        'ops': len(latencies_ms),
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(float(p50), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(latencies_ms.max()), 3) if len(latencies_ms) else 0.0,
+    }
+    summary.update(extra)
+    return summary
+
+class TimedSource:
+    """Wraps a backfill source to time each market chart fetch"""
+
+    def __init__(self, source):
+        self.source = source
+        self.latencies = []
+
+    def market_chart(self, coin_id, start, end):
+        started = time.perf_counter()
+        try:
+            return self.source.market_chart(coin_id, start, end)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+    def close(self):
+        self.source.close()
+
+def run_backfill(options):
+    from backfill import FetcherSource, backfill
+    from connection_pool import ConnectionPool
+    from price_fetcher import PriceFetcher
+
+    market = make_market(options)
+    pool = ConnectionPool(lambda: connect(options), max_size=2)
+    with fake_server(options, market) as base_url:
+        source = TimedSource(FetcherSource(PriceFetcher(base_url=base_url, api_key='', rate_per_minute=UNLIMITED_RATE)))
+        try:
+            with quiet():
+                report = backfill(market.coin_ids, (options.end - timedelta(days=options.days)).date(),
+                                  options.end.date(), source, pool=pool, workers=1)
+        finally:
+            source.close()
+            pool.close()
+    if report['failed']:
+        raise RuntimeError(f"backfill failed for {len(report['failed'])} coins")
+    return {'backfill': summarize('market_chart', report['seconds'], report['rows_written'], source.latencies,
+                                  windows=report['windows_completed'])}
+
+def run_live(options):
+    from price_fetcher import PriceFetcher
+    from snowflake_sync import sync_data
+
+    market = make_market(options)
+    holdings = market.holdings(options.holdings)
+    conn = connect(options)
+    fetch_latencies, sync_latencies, stages = [], [], {}
+    fetched = written = 0
+    fetch_seconds = sync_seconds = 0.0
+    with fake_server(options, market) as base_url:
+        fetcher = PriceFetcher(base_url=base_url, api_key='', rate_per_minute=UNLIMITED_RATE)
+        for _ in range(options.sync_ticks):
+            market.advance()
+            started = time.perf_counter()
+            records, _, failed = asyncio.run(fetcher.fetch(market.coin_ids))
+            fetch_latencies.append(time.perf_counter() - started)
+            if failed:
+                raise RuntimeError(f"fetch failed for {len(failed)} ids")
+            fetched += len(records)
+
+            started = time.perf_counter()
+            with quiet():
+                result = sync_data({'holdings': holdings, 'prices': records}, conn=conn)
+            sync_latencies.append(time.perf_counter() - started)
+            if result['status'] != 'success':
+                raise RuntimeError(f"sync failed: {result['message']}")
+            written += result['details']['prices_written']
+            for name, stage in result['details']['timings']['stages'].items():
+                stages[name] = stages.get(name, 0.0) + stage['seconds']
+        fetch_seconds = sum(fetch_latencies)
+        sync_seconds = sum(sync_latencies)
+    conn.close()
+    return {
+        'fetch': summarize('fetch', fetch_seconds, fetched, fetch_latencies),
+        'sync': summarize('sync_data', sync_seconds, written, sync_latencies,
+                          stages={name: round(seconds, 6) for name, seconds in stages.items()}),
+    }
+
+def run_views(options):
+    from setup_snowflake_analytics import ANALYTICS_VIEWS
+
+    conn = connect(options)
+    cur = conn.cursor()
+    latencies, per_view = [], {}
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(options.repeat):
+        for view in ANALYTICS_VIEWS:
+            query_started = time.perf_counter()
+            cur.execute(f"SELECT * FROM {view}")
+            rows += len(cur.fetchall())
+            latency = time.perf_counter() - query_started
+            latencies.append(latency)
+            per_view.setdefault(view, []).append(latency)
+    seconds = time.perf_counter() - started
+    cur.close()
+    conn.close()
+    return {'views': summarize('query', seconds, rows, latencies, breakdown_ms={
+        view: round(float(np.median(times)) * 1000, 3) for view, times in per_view.items()
+    })}
+
+def run_local_analytics(options):
+    from local_analytics import VIEWS, compute_view, load_holdings, load_price_history
+
+    conn = connect(options)
+    cur = conn.cursor()
+    load_started = time.perf_counter()
+    history = load_price_history(cur)
+    holdings = load_holdings(cur)
+    load_seconds = time.perf_counter() - load_started
+    cur.close()
+    conn.close()
+
+    history_rows = sum(len(series.price) for series in history.values())
+    latencies, per_view = [], {}
+    started = time.perf_counter()
+    for _ in range(options.repeat):
+        for view in VIEWS:
+            view_started = time.perf_counter()
+            compute_view(view, history, holdings)
+            latency = time.perf_counter() - view_started
+            latencies.append(latency)
+            per_view.setdefault(view, []).append(latency)
+    seconds = time.perf_counter() - started
+    return {'local_analytics': summarize(
+        'compute_view', seconds, history_rows * options.repeat, latencies, load_seconds=round(load_seconds, 6),
+        breakdown_ms={view: round(float(np.median(times)) * 1000, 3) for view, times in per_view.items()}
+    )}
+
+RUNNERS = {
+    'backfill': run_backfill,
+    'live': run_live,
+    'views': run_views,
+    'local_analytics': run_local_analytics,
+}
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run_scenario(name, options):
+    results = RUNNERS[name](options)
+    rss = peak_rss_mb()
+    for summary in results.values():
+        summary['peak_rss_mb'] = rss
+    return results
+
+def create_database(options):
+    from setup_snowflake import create_tables
+    from setup_snowflake_analytics import ANALYTICS_VIEWS
+
+    conn = connect(options)
+    cur = conn.cursor()
+    create_tables(cur)
+    for sql in ANALYTICS_VIEWS.values():
+        cur.execute(sql)
+    cur.close()
+    conn.close()
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run_suite(options, scenarios):
+    """Run the scenarios in order, each in a fresh process, against one new database"""
+    create_database(options)
+    results = {}
+    for name in scenarios:
+        print(f"⏱️ {name}...", file=sys.stderr)
+        # spawn rather than fork, so a child's peak RSS does not start from the parent's
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+            results.update(executor.submit(run_scenario, name, options).result())
+    return results
+
+def print_results(results):
+    print(f"{'scenario':<16} {'op':<14} {'ops':>6} {'rows':>10} {'rows/sec':>12} {'p50 ms':>9} {'p99 ms':>9} {'RSS MB':>8}")
+    for name, summary in results.items():
+        print(f"{name:<16} {summary['op']:<14} {summary['ops']:>6} {summary['rows']:>10,} "
+              f"{summary['rows_per_second']:>12,.0f} {summary['p50_ms']:>9.2f} {summary['p99_ms']:>9.2f} "
+              f"{summary['peak_rss_mb']:>8.1f}")
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Print each compared metric's change; returns the (scenario, metric) pairs that regressed"""
+    if baseline['scale'] != current['scale']:
+        print(f"⚠️ Runs have different scales: {baseline['scale']} vs {current['scale']}")
+    regressions = []
+    print(f"{'scenario':<16} {'metric':<16} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, summary in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            print(f"{name:<16} {'(new)':<16}")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = before.get(metric), summary.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            regressed = worse > tolerance
+            if regressed:
+                regressions.append((name, metric))
+            print(f"{name:<16} {metric:<16} {old:>12,.2f} {new:>12,.2f} {change:>+8.1%} {'❌' if regressed else '✅'}")
+    return regressions
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def report_comparison(baseline, current, tolerance):
+    regressions = compare(baseline, current, tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} metrics regressed by more than {tolerance:.0%}: "
+              f"{', '.join(f'{name}.{metric}' for name, metric in regressions)}")
+    else:
+        print(f"\n✅ No metric regressed by more than {tolerance:.0%}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Synthetic end-to-end benchmark of backfill, sync and analytics')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the suite and write a results file')
+    run.add_argument('--coins', type=int, default=50)
+    run.add_argument('--holdings', type=int, default=None, help='coins held in the portfolio (default all)')
+    run.add_argument('--ticks-per-day', type=int, default=24, help='history resolution')
+    run.add_argument('--days', type=int, default=30, help='days of history to backfill')
+    run.add_argument('--sync-ticks', type=int, default=48, help='live fetch-and-sync rounds')
+    run.add_argument('--repeat', type=int, default=3, help='runs of each view query and analytics view')
+    run.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite')
+    run.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    run.add_argument('--server-latency-ms', type=float, default=0.0, help='fake price server delay per request')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--output', help='results file (default benchmarks/<time>.json in the state directory)')
+    run.add_argument('--compare', metavar='BASELINE', help='compare against an earlier results file')
+    run.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+
+    diff = commands.add_parser('compare', help='compare two results files')
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        raise SystemExit(report_comparison(load_results(args.baseline), load_results(args.current), args.tolerance))
+
+    now = datetime.utcnow()
+    scale = {
+        'coins': args.coins, 'holdings': args.holdings or args.coins, 'ticks_per_day': args.ticks_per_day,
+        'days': args.days, 'sync_ticks': args.sync_ticks, 'repeat': args.repeat, 'backend': args.backend,
+        'server_latency_ms': args.server_latency_ms, 'seed': args.seed
+    }
+    output = args.output or os.path.join(get_state_dir(), 'benchmarks', f"{now:%Y%m%dT%H%M%S}.json")
+    with tempfile.TemporaryDirectory() as directory:
+        # Children inherit the environment, so their sync state stays in the temporary directory too
+        os.environ['SYNC_STATE_DIR'] = directory
+        options = SuiteOptions(
+            args.coins, scale['holdings'], args.ticks_per_day, args.days, args.sync_ticks, args.repeat,
+            args.backend, os.path.join(directory, f'portfolio.{args.backend}'),
+            datetime.combine(now.date(), datetime.min.time()), args.seed, args.server_latency_ms / 1000
+        )
+        scenarios = run_suite(options, args.scenarios)
+
+    results = {
+        'created_at': now.isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'scale': scale,
+        'scenarios': scenarios,
+    }
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print_results(scenarios)
+    print(f"\n✅ Results written to {output}")
+    if args.compare:
+        print()
+        raise SystemExit(report_comparison(load_results(args.compare), results, args.tolerance))
@@ -0,0 +1,64 @@
+import argparse
+import time
+
+from backends import SQLiteConnection
+from setup_snowflake import create_tables
+from snowflake_sync import sync_data
+
+class LocalConnection(SQLiteConnection):
+    """In-memory stand-in for a Snowflake connection with the sync tables.
+
+    `now` pins CURRENT_TIMESTAMP() for the analytics views.
+    """
+
+    def __init__(self, latency=0.0, now=None):
+        super().__init__(':memory:', latency, now)
+        cur = self.cursor()
+        create_tables(cur)
+        cur.close()
+
+def make_payload(num_prices, num_holdings=100):
+    holdings = [
+        {
+            'coin_id': f'coin-{i}',
+            'symbol': f'C{i}',
+            'name': f'Coin {i}',
+            'amount': i + 1,
+            'category': 'Layer 1'
+        }
+        for i in range(num_holdings)
+    ]
+    prices = [
+        {
+            'coin_id': f'coin-{i}',
+            'price_usd': 1.0 + i * 0.01,
+            'market_cap_usd': 1e9,
+            'volume_24h_usd': 1e7,
+            'price_change_24h_pct': 0.5
+        }
+        for i in range(num_prices)
+    ]
+    return {'holdings': holdings, 'prices': prices}
+
+def run_benchmark(sizes, batch_sizes, latency=0.0):
+    print(f"{'rows':>10} {'batch':>8} {'seconds':>10} {'rows/sec':>14}")
+    for size in sizes:
+        payload = make_payload(size)
+        for batch_size in batch_sizes:
+            conn = LocalConnection(latency)
+            start = time.perf_counter()
+            result = sync_data(payload, conn=conn, batch_size=batch_size, copy_threshold=0)
+            elapsed = time.perf_counter() - start
+            conn.close()
+            if result['status'] != 'success':
+                raise RuntimeError(result['message'])
+            print(f"{size:>10} {batch_size:>8} {elapsed:>10.3f} {size / elapsed:>14,.0f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark sync_data price loading against a local DB-API stand-in')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10_000, 1_000_000])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 1000, 10_000])
+    parser.add_argument('--latency-ms', type=float, default=0.0,
+                        help='simulated network round trip per execute/executemany call')
+    args = parser.parse_args()
+    run_benchmark(args.sizes, args.batch_sizes, args.latency_ms / 1000)
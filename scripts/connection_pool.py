@@ -0,0 +1,295 @@
+"""Bounded pool of warm database connections shared by the scripts.
+
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        ...
+
+A checkout reuses an idle connection when one is available. A connection
+that sat idle longer than the health-check interval is pinged with
+SELECT 1 first. Connections idle longer than max_idle, or older than
+max_lifetime, are closed instead of reused. An optional reaper thread does
+the same eviction in the background and pings idle connections so
+warehouse sessions stay logged in. Each checkout records how long it
+waited and how old the connection was; metrics() reports both.
+"""
+import atexit
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from backends import get_connection
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_HEALTH_CHECK_INTERVAL = 60
+DEFAULT_MAX_IDLE = 600
+DEFAULT_MAX_LIFETIME = 3600
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+class PoolTimeout(Exception):
+    pass
+
+class PooledConnection:
+    __slots__ = ('conn', 'created', 'last_used', 'last_checked')
+
+    def __init__(self, conn, now):
+        self.conn = conn
+        self.created = now
+        self.last_used = now
+        self.last_checked = now
+
+def ping(conn):
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+        finally:
+            cur.close()
+        return True
+    except Exception as e:
+        print_debug(f"⚠️ Connection health check failed: {e}")
+        return False
+
+class ConnectionPool:
+    def __init__(self, connect=None, max_size=DEFAULT_POOL_SIZE, health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+                 max_idle=DEFAULT_MAX_IDLE, max_lifetime=DEFAULT_MAX_LIFETIME):
+        self._connect = connect or get_connection
+        self.max_size = max_size
+        self.health_check_interval = health_check_interval
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._reaper = None
+        self._broken = set()
+        self._stats = {
+            'checkouts': 0,
+            'connects': 0,
+            'connect_seconds': 0.0,
+            'discarded': 0,
+            'evicted_idle': 0,
+            'evicted_lifetime': 0,
+            'health_check_failures': 0,
+            'timeouts': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'age_seconds_total': 0.0,
+            'age_seconds_max': 0.0,
+        }
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, pooled, now):
+        if self.max_lifetime and now - pooled.created > self.max_lifetime:
+            return 'evicted_lifetime'
+        if self.max_idle and now - pooled.last_used > self.max_idle:
+            return 'evicted_idle'
+        return None
+
+    def _acquire(self, timeout):
+        """Take an idle connection, or a slot to open a new one; returns (pooled or None, waited seconds)"""
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                now = time.monotonic()
+                while self._idle:
+                    # Most recently used first, so rarely needed connections age out
+                    pooled = self._idle.pop()
+                    reason = self._expired(pooled, now)
+                    if reason is None:
+                        return pooled, now - start
+                    self._stats[reason] += 1
+                    self._open -= 1
+                    self._close_quietly(pooled.conn)
+                if self._open < self.max_size:
+                    self._open += 1
+                    return None, now - start
+                remaining = None if deadline is None else deadline - now
+                if remaining is not None and remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No connection available within {timeout}s ({self.max_size} in use)")
+                self._cond.wait(remaining)
+
+    def _new_connection(self):
+        start = time.monotonic()
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        now = time.monotonic()
+        with self._cond:
+            self._stats['connects'] += 1
+            self._stats['connect_seconds'] += now - start
+        return PooledConnection(conn, now)
+
+    def discard(self, conn):
+        """Mark a checked-out connection as broken so it is closed instead of returned to the pool"""
+        with self._cond:
+            self._broken.add(id(conn))
+
+    def _release(self, pooled, reusable):
+        with self._cond:
+            if id(pooled.conn) in self._broken:
+                self._broken.discard(id(pooled.conn))
+                reusable = False
+            if reusable and not self._closed:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            else:
+                self._open -= 1
+                self._stats['discarded'] += 1
+                self._close_quietly(pooled.conn)
+            self._cond.notify()
+
+    def _ensure_healthy(self, pooled):
+        """Ping a connection that has been idle a while; returns it, or a fresh one if it was dead"""
+        now = time.monotonic()
+        if now - pooled.last_checked < self.health_check_interval:
+            return pooled
+        if ping(pooled.conn):
+            pooled.last_checked = now
+            return pooled
+        with self._cond:
+            self._stats['health_check_failures'] += 1
+            self._stats['discarded'] += 1
+        self._close_quietly(pooled.conn)
+        # The dead connection's slot is reused for its replacement
+        return self._new_connection()
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        """Borrow a connection; it goes back to the pool unless it fails a health check after an error"""
+        pooled, waited = self._acquire(timeout)
+        pooled = self._new_connection() if pooled is None else self._ensure_healthy(pooled)
+        now = time.monotonic()
+        with self._cond:
+            stats = self._stats
+            stats['checkouts'] += 1
+            stats['wait_seconds_total'] += waited
+            stats['wait_seconds_max'] = max(stats['wait_seconds_max'], waited)
+            age = now - pooled.created
+            stats['age_seconds_total'] += age
+            stats['age_seconds_max'] = max(stats['age_seconds_max'], age)
+
+        reusable = True
+        try:
+            yield pooled.conn
+        except BaseException:
+            reusable = ping(pooled.conn)
+            if reusable:
+                pooled.last_checked = time.monotonic()
+            raise
+        finally:
+            self._release(pooled, reusable)
+
+    def evict(self):
+        """Close idle connections past max_idle or max_lifetime; returns how many were closed"""
+        now = time.monotonic()
+        with self._cond:
+            keep = []
+            expired = []
+            for pooled in self._idle:
+                reason = self._expired(pooled, now)
+                if reason is None:
+                    keep.append(pooled)
+                else:
+                    self._stats[reason] += 1
+                    expired.append(pooled)
+            self._idle = keep
+            self._open -= len(expired)
+            self._cond.notify(len(expired))
+        for pooled in expired:
+            self._close_quietly(pooled.conn)
+        return len(expired)
+
+    def keepalive(self):
+        """Ping idle connections that are due a health check, dropping any that fail"""
+        now = time.monotonic()
+        with self._cond:
+            due = [pooled for pooled in self._idle if now - pooled.last_checked >= self.health_check_interval]
+            for pooled in due:
+                self._idle.remove(pooled)
+        for pooled in due:
+            alive = ping(pooled.conn)
+            if alive:
+                pooled.last_checked = time.monotonic()
+            else:
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+            with self._cond:
+                # Put it back without counting as a use, so idle eviction still applies
+                if alive and not self._closed:
+                    self._idle.append(pooled)
+                else:
+                    self._open -= 1
+                    self._stats['discarded'] += 1
+                    self._close_quietly(pooled.conn)
+                self._cond.notify()
+
+    def start_reaper(self, interval=None):
+        """Run evict() and keepalive() in a daemon thread every `interval` seconds"""
+        if self._reaper is not None:
+            return
+        interval = interval or max(1.0, min(self.health_check_interval, self.max_idle or self.health_check_interval) / 2)
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.evict()
+                self.keepalive()
+
+        self._reaper = (threading.Thread(target=run, name='connection-pool-reaper', daemon=True), stop)
+        self._reaper[0].start()
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats, open=self._open, idle=len(self._idle), max_size=self.max_size)
+        checkouts = stats['checkouts']
+        stats['wait_seconds_avg'] = stats['wait_seconds_total'] / checkouts if checkouts else 0.0
+        stats['age_seconds_avg'] = stats['age_seconds_total'] / checkouts if checkouts else 0.0
+        return stats
+
+    def close(self):
+        if self._reaper is not None:
+            self._reaper[1].set()
+            self._reaper = None
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled.conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """The process-wide pool over get_connection(), configured from DB_POOL_* variables"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                max_size=int(os.getenv('DB_POOL_SIZE', DEFAULT_POOL_SIZE)),
+                health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', DEFAULT_HEALTH_CHECK_INTERVAL)),
+                max_idle=float(os.getenv('DB_POOL_MAX_IDLE', DEFAULT_MAX_IDLE)),
+                max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', DEFAULT_MAX_LIFETIME))
+            )
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,84 @@
+import re
+
+# Snowflake functions used by the setup scripts, rewritten to SF_* macros
+# that register_functions() creates on a DuckDB connection. Timestamps are
+# TIMESTAMP (naive UTC) values, matching Snowflake's TIMESTAMP_NTZ.
+_REWRITES = [
+    (re.compile(r'CURRENT_TIMESTAMP\(\)', re.I), 'SF_NOW()'),
+    (re.compile(r'CURRENT_DATE\(\)', re.I), 'SF_TODAY()'),
+    (re.compile(r'\bDATEADD\(\s*(\w+)\s*,', re.I), r"SF_DATEADD('\1',"),
+    (re.compile(r'\bTO_TIMESTAMP_NTZ\(', re.I), 'SF_TO_TIMESTAMP_NTZ('),
+]
+
+_CREATE_TABLE = re.compile(r'^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.I)
+_SHOW = re.compile(r'^\s*SHOW\s+(TABLES|VIEWS)\s*;?\s*$', re.I)
+_CLUSTER_BY = re.compile(r'^\s*ALTER\s+TABLE\s+\w+\s+CLUSTER\s+BY\b', re.I)
+_VALUES_COLUMN = re.compile(r'\bcolumn(\d+)\b')
+
+# FLOAT is single precision in DuckDB, so it maps to DOUBLE
+_DDL_REWRITES = [
+    (re.compile(r'\bDEFAULT\s+CURRENT_TIMESTAMP\(\)', re.I), "DEFAULT (CAST(current_timestamp AT TIME ZONE 'UTC' AS TIMESTAMP))"),
+    (re.compile(r'\bSTRING\b', re.I), 'VARCHAR'),
+    (re.compile(r'\bTIMESTAMP_NTZ\b', re.I), 'TIMESTAMP'),
+    (re.compile(r'\bNUMBER\b', re.I), 'BIGINT'),
+    (re.compile(r'\bFLOAT\b', re.I), 'DOUBLE'),
+]
+
+_DATEADD_UNITS = {
+    'year': 'to_years', 'years': 'to_years', 'y': 'to_years',
+    'month': 'to_months', 'months': 'to_months', 'mon': 'to_months', 'mm': 'to_months',
+    'week': 'to_weeks', 'weeks': 'to_weeks', 'w': 'to_weeks',
+    'day': 'to_days', 'days': 'to_days', 'd': 'to_days',
+    'hour': 'to_hours', 'hours': 'to_hours', 'h': 'to_hours',
+    'minute': 'to_minutes', 'minutes': 'to_minutes', 'm': 'to_minutes',
+    'second': 'to_seconds', 'seconds': 'to_seconds', 's': 'to_seconds',
+}
+
+def translate(sql):
+    """Translate one Snowflake statement into a list of DuckDB statements"""
+    # Row groups already carry min/max zonemaps that prune range scans, so a clustering key is a no-op
+    if _CLUSTER_BY.match(sql):
+        return []
+
+    show = _SHOW.match(sql)
+    if show:
+        kind = 'BASE TABLE' if show.group(1).upper() == 'TABLES' else 'VIEW'
+        # Name in the second column, like Snowflake's SHOW output
+        return [
+            "SELECT table_type, table_name FROM information_schema.tables "
+            f"WHERE table_type = '{kind}' AND table_schema = current_schema() ORDER BY table_name"
+        ]
+
+    statements = []
+    table = _CREATE_TABLE.match(sql)
+    if table:
+        sequence = f"{table.group(1)}_ID_SEQ"
+        if re.search(r'\bNUMBER\s+AUTOINCREMENT\b', sql, re.I):
+            statements.append(f"CREATE SEQUENCE IF NOT EXISTS {sequence}")
+            sql = re.sub(r'\bNUMBER\s+AUTOINCREMENT\b', f"BIGINT DEFAULT nextval('{sequence}')", sql, flags=re.I)
+        for pattern, replacement in _DDL_REWRITES:
+            sql = pattern.sub(replacement, sql)
+
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+
+    # Inline VALUES lists name their columns col0, col1, ... instead of column1, column2, ...
+    if re.search(r'\(\s*VALUES\b', sql, re.I):
+        sql = _VALUES_COLUMN.sub(lambda m: f"col{int(m.group(1)) - 1}", sql)
+
+    statements.append(sql)
+    return statements
+
+def register_functions(conn, now=None):
+    """Create the SF_* macros on a DuckDB connection; `now` pins CURRENT_TIMESTAMP()"""
+    if now is not None:
+        conn.execute(f"CREATE OR REPLACE MACRO SF_NOW() AS TIMESTAMP '{now.isoformat(sep=' ')}'")
+    else:
+        conn.execute("CREATE OR REPLACE MACRO SF_NOW() AS CAST(current_timestamp AT TIME ZONE 'UTC' AS TIMESTAMP)")
+    conn.execute("CREATE OR REPLACE MACRO SF_TODAY() AS CAST(SF_NOW() AS DATE)")
+    conn.execute("CREATE OR REPLACE MACRO SF_TO_TIMESTAMP_NTZ(value) AS CAST(value AS TIMESTAMP)")
+    branches = ' '.join(
+        f"WHEN '{unit}' THEN value + {function}(CAST(amount AS INTEGER))"
+        for unit, function in _DATEADD_UNITS.items()
+    )
+    conn.execute(f"CREATE OR REPLACE MACRO SF_DATEADD(unit, amount, value) AS CASE lower(unit) {branches} END")
@@ -0,0 +1,299 @@
+"""Incremental technical indicators: true EMAs and Wilder-smoothed RSI.
+
+The TECHNICAL_INDICATORS view computes simple rolling averages (SMA_14 and
+SMA_30) from full history on every query. Here each
+coin keeps a small running state that sync_data advances in O(1) per
+written price; the state is persisted so the next sync resumes from it.
+backfill() rebuilds the same state from stored history with a blocked,
+vectorised form of the EMA recursion.
+
+Conventions: an EMA(n) is seeded with the simple average of its first n
+prices and then follows ema += 2 / (n + 1) * (price - ema). RSI(14) seeds
+average gain/loss with the mean of the first 14 price changes and then
+applies Wilder's smoothing (alpha = 1 / 14); RSI is 100 when there were
+no losses over the smoothing window.
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+from price_dedup import get_state_dir, to_micros
+from records import as_price_batch
+
+EMA_PERIODS = (14, 30)
+RSI_PERIOD = 14
+BLOCK_SIZE = 64
+
+FRAME_COLUMNS = ['COIN_ID', 'TIMESTAMP', 'PRICE_USD'] + [f'EMA_{p}' for p in EMA_PERIODS] + [f'RSI_{RSI_PERIOD}']
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def rsi_value(avg_gain, avg_loss):
+    if avg_gain is None:
+        return None
+    if avg_loss == 0:
+        return 100.0
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+class IndicatorState:
+    __slots__ = (
+        'count', 'last_timestamp', 'last_price', 'ema', 'ema_seed',
+        'avg_gain', 'avg_loss', 'gain_seed', 'loss_seed'
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.last_timestamp = None
+        self.last_price = None
+        self.ema = [None] * len(EMA_PERIODS)
+        self.ema_seed = [0.0] * len(EMA_PERIODS)
+        self.avg_gain = None
+        self.avg_loss = None
+        self.gain_seed = 0.0
+        self.loss_seed = 0.0
+
+    def copy(self):
+        state = IndicatorState()
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(state, name, list(value) if isinstance(value, list) else value)
+        return state
+
+    def update(self, timestamp, price):
+        """Advance by one price; rows at or before the last timestamp are ignored"""
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+
+        for i, period in enumerate(EMA_PERIODS):
+            if self.ema[i] is None:
+                self.ema_seed[i] += price
+                if self.count + 1 == period:
+                    self.ema[i] = self.ema_seed[i] / period
+            else:
+                self.ema[i] += 2 / (period + 1) * (price - self.ema[i])
+
+        if self.last_price is not None:
+            change = price - self.last_price
+            gain = change if change > 0 else 0.0
+            loss = -change if change < 0 else 0.0
+            if self.avg_gain is None:
+                self.gain_seed += gain
+                self.loss_seed += loss
+                # self.count is the number of changes seen including this one
+                if self.count == RSI_PERIOD:
+                    self.avg_gain = self.gain_seed / RSI_PERIOD
+                    self.avg_loss = self.loss_seed / RSI_PERIOD
+            else:
+                self.avg_gain += (gain - self.avg_gain) / RSI_PERIOD
+                self.avg_loss += (loss - self.avg_loss) / RSI_PERIOD
+
+        self.count += 1
+        self.last_timestamp = timestamp
+        self.last_price = price
+        return True
+
+    def values(self):
+        values = {f'ema_{period}': self.ema[i] for i, period in enumerate(EMA_PERIODS)}
+        values[f'rsi_{RSI_PERIOD}'] = rsi_value(self.avg_gain, self.avg_loss)
+        return values
+
+    def to_json(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_json(cls, values):
+        state = cls()
+        for name, value in zip(cls.__slots__, values):
+            setattr(state, name, value)
+        return state
+
+# Batch (backfill) computation
+
+def ema_filter(values, alpha, initial, block=BLOCK_SIZE):
+    """y[t] = y[t-1] + alpha * (x[t] - y[t-1]) with y[-1] = initial.
+
+    Each block of `block` rows is solved at once as a lower-triangular
+    matrix product; only the carry between blocks is sequential.
+    """
+    n = len(values)
+    if n == 0:
+        return np.zeros(0)
+    decay = 1.0 - alpha
+    k = np.arange(block)
+    lags = k[:, None] - k[None, :]
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    carry = decay ** (k + 1)
+
+    padded = np.zeros(-(-n // block) * block)
+    padded[:n] = values
+    partial = padded.reshape(-1, block) @ weights.T
+    previous = initial
+    for row in partial:
+        row += carry * previous
+        previous = row[-1]
+    return partial.ravel()[:n]
+
+def ema_series(prices, period):
+    result = np.full(len(prices), np.nan)
+    if len(prices) >= period:
+        seed = prices[:period].mean()
+        result[period - 1] = seed
+        result[period:] = ema_filter(prices[period:], 2 / (period + 1), seed)
+    return result
+
+def wilder_series(values, period):
+    """Wilder average of per-change values; values[0] is the change into row 1"""
+    result = np.full(len(values) + 1, np.nan)
+    if len(values) >= period:
+        seed = values[:period].mean()
+        result[period] = seed
+        result[period + 1:] = ema_filter(values[period:], 1 / period, seed)
+    return result
+
+def backfill_series(series):
+    """Indicator arrays over a CoinSeries plus the state to resume from its last row"""
+    prices = np.asarray(series.price, dtype=float)
+    emas = [ema_series(prices, period) for period in EMA_PERIODS]
+    changes = np.diff(prices)
+    avg_gain = wilder_series(np.where(changes > 0, changes, 0.0), RSI_PERIOD)
+    avg_loss = wilder_series(np.where(changes < 0, -changes, 0.0), RSI_PERIOD)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    rsi[np.isnan(avg_gain)] = np.nan
+
+    state = IndicatorState()
+    n = len(prices)
+    if n:
+        state.count = n
+        state.last_timestamp = int(np.asarray(series.timestamp[-1:]).astype('datetime64[us]').astype(np.int64)[0])
+        state.last_price = float(prices[-1])
+        for i, period in enumerate(EMA_PERIODS):
+            if n >= period:
+                state.ema[i] = float(emas[i][-1])
+            else:
+                state.ema_seed[i] = float(prices.sum())
+        if n > RSI_PERIOD:
+            state.avg_gain = float(avg_gain[-1])
+            state.avg_loss = float(avg_loss[-1])
+        else:
+            state.gain_seed = float(np.where(changes > 0, changes, 0.0).sum())
+            state.loss_seed = float(np.where(changes < 0, -changes, 0.0).sum())
+    return emas, rsi, state
+
+def indicator_frame(coin_id, series):
+    emas, rsi, _ = backfill_series(series)
+    size = len(series.price)
+    frame = {
+        'COIN_ID': np.full(size, coin_id, dtype=object),
+        'TIMESTAMP': np.asarray(series.timestamp).astype('datetime64[us]'),
+        'PRICE_USD': np.asarray(series.price, dtype=float)
+    }
+    for period, values in zip(EMA_PERIODS, emas):
+        frame[f'EMA_{period}'] = values
+    frame[f'RSI_{RSI_PERIOD}'] = rsi
+    return frame
+
+class IndicatorEngine:
+    """Per-coin indicator states, advanced during a sync and persisted after it commits"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.states = {}
+        self._pending = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.states = {coin_id: IndicatorState.from_json(values) for coin_id, values in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                print_debug(f"⚠️ Ignoring unreadable indicator state {path}: {e}")
+
+    def begin(self):
+        self._pending = {}
+
+    def _working_state(self, coin_id):
+        state = self._pending.get(coin_id)
+        if state is None:
+            committed = self.states.get(coin_id)
+            state = committed.copy() if committed is not None else IndicatorState()
+            self._pending[coin_id] = state
+        return state
+
+    def update(self, coin_id, timestamp, price):
+        return self._working_state(coin_id).update(to_micros(timestamp), float(price))
+
+    def update_prices(self, prices, timestamp):
+        """Feed a PriceBatch (or price dicts) sharing one timestamp; returns how many advanced a state"""
+        prices = as_price_batch(prices)
+        timestamp = to_micros(timestamp)
+        return sum(
+            self._working_state(coin_id).update(timestamp, price)
+            for coin_id, price in zip(prices.coin_ids, prices.price_usd)
+        )
+
+    def values(self, coin_id, pending=False):
+        """Committed indicator values, or with `pending` those advanced by the current sync"""
+        state = self._pending.get(coin_id) if pending else None
+        if state is None:
+            state = self.states.get(coin_id)
+        return None if state is None else state.values()
+
+    def backfill(self, history, coin_ids=None):
+        """Rebuild committed states from a coin_id -> CoinSeries mapping (e.g. a PriceStore)"""
+        count = 0
+        for coin_id in coin_ids or list(history.keys()):
+            series = history.get(coin_id)
+            if series is None or len(series.price) == 0:
+                continue
+            self.states[coin_id] = backfill_series(series)[2]
+            count += 1
+        self.save()
+        return count
+
+    def commit(self):
+        self.states.update(self._pending)
+        self._pending = {}
+        self.save()
+
+    def rollback(self):
+        self._pending = {}
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({coin_id: state.to_json() for coin_id, state in self.states.items()}, f)
+        os.replace(tmp_path, self.path)
+
+def get_indicator_engine():
+    """Build the engine when SNOWFLAKE_SYNC_INDICATORS is enabled, otherwise None"""
+    if os.getenv('SNOWFLAKE_SYNC_INDICATORS', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    path = os.getenv('INDICATOR_STATE_PATH', os.path.join(get_state_dir(), 'indicators.json'))
+    return IndicatorEngine(path)
+
+if __name__ == '__main__':
+    import argparse
+
+    from price_store import PriceStore
+
+    parser = argparse.ArgumentParser(description='Show live indicator values or backfill them from stored history')
+    parser.add_argument('command', choices=['show', 'backfill'])
+    parser.add_argument('coins', nargs='*')
+    parser.add_argument('--state', default=os.getenv('INDICATOR_STATE_PATH', os.path.join(get_state_dir(), 'indicators.json')))
+    parser.add_argument('--store', default=os.getenv('PRICE_STORE_DIR'), help='price store to backfill from')
+    args = parser.parse_args()
+
+    engine = IndicatorEngine(args.state)
+    if args.command == 'backfill':
+        if not args.store:
+            raise SystemExit("backfill needs --store or PRICE_STORE_DIR")
+        count = engine.backfill(PriceStore(args.store), args.coins)
+        print(f"✅ Backfilled indicators for {count} coins")
+    else:
+        for coin_id in args.coins or sorted(engine.states):
+            print(json.dumps({'coin_id': coin_id, **(engine.values(coin_id) or {})}))
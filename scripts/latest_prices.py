@@ -0,0 +1,134 @@
+"""Latest price per coin, kept in LATEST_PRICES.
+
+The sync upserts each written price row into LATEST_PRICES, so views that
+need the current price read one row per coin instead of ranking the whole
+PRICES table. A row is only replaced by one with an equal or newer
+TIMESTAMP. Coins whose raw ticks were archived keep their last price here.
+`python scripts/latest_prices.py backfill` fills the table from PRICES.
+"""
+LATEST_PRICES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS LATEST_PRICES (
+    COIN_ID STRING NOT NULL,
+    TIMESTAMP TIMESTAMP_NTZ NOT NULL,
+    PRICE_USD FLOAT,
+    MARKET_CAP_USD FLOAT,
+    VOLUME_24H_USD FLOAT,
+    PRICE_CHANGE_24H_PCT FLOAT,
+    PRIMARY KEY (COIN_ID)
+)
+"""
+
+LATEST_PRICES_MERGE_SQL = """
+MERGE INTO LATEST_PRICES t
+USING ({source}) s
+ON t.COIN_ID = s.COIN_ID
+WHEN MATCHED AND s.TIMESTAMP >= t.TIMESTAMP THEN UPDATE SET
+    TIMESTAMP = s.TIMESTAMP,
+    PRICE_USD = s.PRICE_USD,
+    MARKET_CAP_USD = s.MARKET_CAP_USD,
+    VOLUME_24H_USD = s.VOLUME_24H_USD,
+    PRICE_CHANGE_24H_PCT = s.PRICE_CHANGE_24H_PCT
+WHEN NOT MATCHED THEN INSERT (
+    COIN_ID,
+    TIMESTAMP,
+    PRICE_USD,
+    MARKET_CAP_USD,
+    VOLUME_24H_USD,
+    PRICE_CHANGE_24H_PCT
+) VALUES (s.COIN_ID, s.TIMESTAMP, s.PRICE_USD, s.MARKET_CAP_USD, s.VOLUME_24H_USD, s.PRICE_CHANGE_24H_PCT)
+"""
+
+# Source rows in PriceBatch.rows() order; the timestamps are bound as ISO strings
+VALUES_SOURCE_SQL = """
+    SELECT
+        column1 AS COIN_ID,
+        TO_TIMESTAMP_NTZ(column2) AS TIMESTAMP,
+        column3 AS PRICE_USD,
+        column4 AS MARKET_CAP_USD,
+        column5 AS VOLUME_24H_USD,
+        column6 AS PRICE_CHANGE_24H_PCT
+    FROM (VALUES {values})
+"""
+
+PRICES_SOURCE_SQL = """
+    SELECT COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD, PRICE_CHANGE_24H_PCT
+    FROM (
+        SELECT
+            COIN_ID,
+            TIMESTAMP,
+            PRICE_USD,
+            MARKET_CAP_USD,
+            VOLUME_24H_USD,
+            PRICE_CHANGE_24H_PCT,
+            ROW_NUMBER() OVER (PARTITION BY COIN_ID ORDER BY TIMESTAMP DESC) as rn
+        FROM PRICES
+        {where}
+    ) ranked
+    WHERE rn = 1
+"""
+
+def latest_rows(rows):
+    """Keep the newest of (coin_id, timestamp, price, market_cap, volume, change) rows per coin.
+
+    A MERGE source must not match one target row twice, so each coin
+    appears at most once per statement.
+    """
+    latest = {}
+    for row in rows:
+        current = latest.get(row[0])
+        if current is None or str(row[1]) >= str(current[1]):
+            latest[row[0]] = row
+    return list(latest.values())
+
+def upsert_latest_prices(cur, rows, batch_size):
+    """Fold newly written price rows into LATEST_PRICES; returns the number of coins upserted"""
+    return merge_latest_rows(cur, latest_rows(rows), batch_size)
+
+def upsert_latest_batch(cur, batch, timestamp, batch_size):
+    """upsert_latest_prices() for a PriceBatch written at `timestamp`; a repeated coin keeps its last price"""
+    return merge_latest_rows(cur, list({row[0]: row for row in batch.rows(timestamp)}.values()), batch_size)
+
+def merge_latest_rows(cur, rows, batch_size):
+    """MERGE rows with at most one per coin into LATEST_PRICES"""
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(batch))
+        source = VALUES_SOURCE_SQL.format(values=values)
+        cur.execute(LATEST_PRICES_MERGE_SQL.format(source=source), [value for row in batch for value in row])
+    return len(rows)
+
+def backfill_latest_prices(cur, before=None):
+    """Bring LATEST_PRICES up to date with PRICES (or its rows before `before`); returns the row count.
+
+    Coins with no raw ticks left keep their row.
+    """
+    where = "WHERE TIMESTAMP < %s" if before else ""
+    source = PRICES_SOURCE_SQL.format(where=where)
+    cur.execute(LATEST_PRICES_MERGE_SQL.format(source=source), [before] if before else [])
+    cur.execute("SELECT COUNT(*) FROM LATEST_PRICES")
+    return cur.fetchone()[0]
+
+if __name__ == '__main__':
+    import sys
+
+    from analytics_cache import get_data_versions
+    from connection_pool import get_pool
+
+    if sys.argv[1:] != ['backfill']:
+        raise SystemExit("usage: python scripts/latest_prices.py backfill")
+
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(LATEST_PRICES_TABLE_SQL)
+            cur.execute("BEGIN")
+            count = backfill_latest_prices(cur)
+            cur.execute("COMMIT")
+            get_data_versions().bump('LATEST_PRICES')
+            print(f"✅ LATEST_PRICES: {count} rows")
+        except Exception as e:
+            cur.execute("ROLLBACK")
+            print(f"❌ Error backfilling latest prices: {str(e)}")
+            raise
+        finally:
+            cur.close()
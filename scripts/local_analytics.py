@@ -0,0 +1,513 @@
+"""In-process NumPy versions of the analytics views in setup_snowflake_analytics.py.
+
+Price history is held column-wise per coin (sorted timestamp, price, market
+cap, volume and 24h change arrays). Every view is computed as a per-coin
+partial result followed by a combine step, so callers can stream coins
+through the partials without materialising the whole history at once.
+
+Results are "frames": dicts of column name -> NumPy array with the same
+columns, in the same order, as the corresponding Snowflake view. Views over
+holdings are computed for one portfolio at a time: a frame holds the view's
+rows for that PORTFOLIO_ID, without the PORTFOLIO_ID column. As with the
+SQL, PRICE_USD is assumed non-null (sync_data requires it) and a portfolio
+is assumed to hold one row per COIN_ID.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from records import Holding, get_portfolio_id, parse_holdings
+from sqlite_dialect import add_months
+
+CoinSeries = namedtuple('CoinSeries', ['timestamp', 'price', 'market_cap', 'volume', 'change_24h'])
+ViewSpec = namedtuple('ViewSpec', ['columns', 'partial', 'combine', 'per_holding'])
+
+PRICE_HISTORY_SQL = """
+SELECT COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD, PRICE_CHANGE_24H_PCT
+FROM PRICES
+ORDER BY COIN_ID, TIMESTAMP
+"""
+
+HOLDINGS_SQL = "SELECT COIN_ID, SYMBOL, NAME, AMOUNT, CATEGORY FROM HOLDINGS WHERE PORTFOLIO_ID = %s"
+
+def _float_array(values, size):
+    if values is None:
+        return np.zeros(size)
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+def make_series(timestamps, prices, market_caps=None, volumes=None, changes=None):
+    timestamps = np.asarray(timestamps, dtype='datetime64[us]')
+    order = np.argsort(timestamps, kind='stable')
+    size = len(timestamps)
+    return CoinSeries(
+        timestamps[order],
+        _float_array(prices, size)[order],
+        _float_array(market_caps, size)[order],
+        _float_array(volumes, size)[order],
+        _float_array(changes, size)[order]
+    )
+
+class PriceHistory(dict):
+    """coin_id -> CoinSeries"""
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD, PRICE_CHANGE_24H_PCT) rows"""
+        columns = {}
+        for coin_id, timestamp, price, market_cap, volume, change in rows:
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            coin = columns.setdefault(coin_id, ([], [], [], [], []))
+            coin[0].append(timestamp)
+            coin[1].append(price)
+            coin[2].append(market_cap)
+            coin[3].append(volume)
+            coin[4].append(change)
+        return cls((coin_id, make_series(*coin)) for coin_id, coin in columns.items())
+
+def normalize_holdings(holdings):
+    """Accept HOLDINGS rows, Holding tuples or sync-style holding dicts"""
+    return [
+        parse_holdings([holding])[0] if isinstance(holding, dict) else Holding(*holding)
+        for holding in holdings
+    ]
+
+def load_price_history(cur):
+    cur.execute(PRICE_HISTORY_SQL)
+    return PriceHistory.from_rows(cur.fetchall())
+
+def load_holdings(cur, portfolio_id=None):
+    """One portfolio's holdings, by default PORTFOLIO_ID's"""
+    cur.execute(HOLDINGS_SQL, (portfolio_id or get_portfolio_id(),))
+    return normalize_holdings(cur.fetchall())
+
+def _as_datetime64(value):
+    return np.datetime64(value, 'us')
+
+# Window helpers mirroring Snowflake semantics
+
+def rolling_mean(values, window):
+    """AVG() OVER (ROWS BETWEEN window-1 PRECEDING AND CURRENT ROW), partial windows included"""
+    if len(values) == 0:
+        return values.astype(float)
+    base = values[0]
+    csum = np.concatenate(([0.0], np.cumsum(values - base)))
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    return (csum[idx] - csum[lo]) / (idx - lo) + base
+
+def rolling_nanmean(values, window):
+    """Like rolling_mean but skipping NULLs; NULL when the window has no values"""
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    n = counts[idx] - counts[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (sums[idx] - sums[lo]) / n, np.nan)
+
+def rolling_reduce(values, window, ufunc):
+    """MAX/MIN() OVER a trailing row window, skipping NULLs (ufunc is np.fmax or np.fmin)"""
+    if len(values) == 0:
+        return values.astype(float)
+    padded = np.concatenate((np.full(window - 1, np.nan), values))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    return ufunc.reduce(windows, axis=1)
+
+def lag(values, offset):
+    result = np.full(len(values), np.nan)
+    if offset < len(values):
+        result[offset:] = values[:len(values) - offset]
+    return result
+
+def pct_change(values, previous):
+    """((x - prev) / NULLIF(prev, 0)) * 100"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(previous != 0, (values - previous) / previous * 100, np.nan)
+
+def day_segments(timestamps):
+    """Start index of each calendar day in a sorted timestamp array, plus the days"""
+    days = timestamps.astype('datetime64[D]')
+    if len(days) == 0:
+        return days, np.zeros(0, dtype=np.intp)
+    starts = np.flatnonzero(np.concatenate(([True], days[1:] != days[:-1])))
+    return days[starts], starts
+
+def segment_nanmean(values, starts):
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+def daily_ohlc(series):
+    """Per-day (days, open, high, low, close, avg price, avg volume) for one coin"""
+    days, starts = day_segments(series.timestamp)
+    if len(starts) == 0:
+        empty = np.zeros(0)
+        return days, empty, empty, empty, empty, empty, empty
+    ends = np.append(starts[1:], len(series.timestamp))
+    price = series.price
+    return (
+        days,
+        price[starts],
+        np.fmax.reduceat(price, starts),
+        np.fmin.reduceat(price, starts),
+        price[ends - 1],
+        segment_nanmean(price, starts),
+        segment_nanmean(series.volume, starts)
+    )
+
+def _text_column(value, size):
+    column = np.empty(size, dtype=object)
+    column[:] = value
+    return column
+
+def concat_frames(frames, columns):
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return {column: np.zeros(0) for column in columns}
+    return {column: np.concatenate([frame[column] for frame in frames]) for column in columns}
+
+def sort_frame(frame, order):
+    return {column: values[order] for column, values in frame.items()}
+
+def frame_rows(frame):
+    """Frame -> list of tuples with Python scalars and None for NULL"""
+    columns = []
+    for values in frame.values():
+        items = values.tolist()
+        if values.dtype.kind == 'f':
+            items = [None if v != v else v for v in items]
+        columns.append(items)
+    return list(zip(*columns))
+
+# DAILY_PRICE_ANALYSIS
+
+DAILY_PRICE_ANALYSIS_COLUMNS = [
+    'COIN_ID', 'DATE', 'LOW_PRICE', 'HIGH_PRICE', 'AVG_PRICE', 'OPEN_PRICE', 'CLOSE_PRICE', 'AVG_VOLUME'
+]
+
+def daily_price_analysis_partial(coin_id, series, now):
+    days, open_, high, low, close, avg, avg_volume = daily_ohlc(series)
+    return {
+        'COIN_ID': _text_column(coin_id, len(days)),
+        'DATE': days.astype('datetime64[us]'),
+        'LOW_PRICE': low,
+        'HIGH_PRICE': high,
+        'AVG_PRICE': avg,
+        'OPEN_PRICE': open_,
+        'CLOSE_PRICE': close,
+        'AVG_VOLUME': avg_volume
+    }
+
+def daily_price_analysis_combine(parts, now):
+    frame = concat_frames(parts, DAILY_PRICE_ANALYSIS_COLUMNS)
+    return sort_frame(frame, np.argsort(frame['DATE'], kind='stable')[::-1])
+
+# TECHNICAL_INDICATORS
+
+TECHNICAL_INDICATORS_COLUMNS = [
+    'SYMBOL', 'COIN_ID', 'TIMESTAMP', 'PRICE_USD', 'SMA_14', 'SMA_30', 'TREND_SIGNAL', 'RSI'
+]
+
+def technical_indicators_partial(holding, series, now):
+    ts = series.timestamp
+    start = np.searchsorted(ts, _as_datetime64(now - timedelta(days=30)), 'left')
+    if start == len(ts):
+        return None
+    # Windows reach back 29 rows, plus one more row for the RSI lag
+    lo = max(0, start - 30)
+    price = series.price[lo:]
+
+    sma_14 = rolling_mean(price, 14)
+    sma_30 = rolling_mean(price, 30)
+    change = price - lag(price, 1)
+    avg_up = rolling_mean(np.where(change > 0, change, 0.0), 14)
+    avg_down = rolling_mean(np.where(change < 0, -change, 0.0), 14)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rsi = np.where(avg_down != 0, 100 - (100 / (1 + avg_up / avg_down)), np.nan)
+    trend = np.where(sma_14 > sma_30, 'BULLISH', np.where(sma_14 < sma_30, 'BEARISH', 'NEUTRAL')).astype(object)
+
+    keep = slice(start - lo, None)
+    size = len(ts) - start
+    return {
+        'SYMBOL': _text_column(holding.symbol, size),
+        'COIN_ID': _text_column(holding.coin_id, size),
+        'TIMESTAMP': ts[start:],
+        'PRICE_USD': price[keep],
+        'SMA_14': sma_14[keep],
+        'SMA_30': sma_30[keep],
+        'TREND_SIGNAL': trend[keep],
+        'RSI': rsi[keep]
+    }
+
+def technical_indicators_combine(parts, now):
+    return concat_frames(parts, TECHNICAL_INDICATORS_COLUMNS)
+
+# VOLATILITY_ANALYSIS
+
+VOLATILITY_ANALYSIS_COLUMNS = [
+    'SYMBOL', 'COIN_ID', 'DATE', 'HIGH', 'LOW', 'OPEN', 'CLOSE',
+    'DAILY_VOLATILITY', 'DAILY_RETURN', 'WEEKLY_AVG_VOLATILITY'
+]
+
+def volatility_analysis_partial(holding, series, now):
+    cutoff = add_months(now.replace(hour=0, minute=0, second=0, microsecond=0), -1)
+    start = np.searchsorted(series.timestamp, _as_datetime64(cutoff), 'left')
+    recent = CoinSeries(*(column[start:] for column in series))
+    days, open_, high, low, close, _, _ = daily_ohlc(recent)
+
+    volatility = pct_change(high, low)
+    daily_return = pct_change(close, open_)
+    # The 7-row window runs after the one-month filter, as in the view
+    return {
+        'SYMBOL': _text_column(holding.symbol, len(days)),
+        'COIN_ID': _text_column(holding.coin_id, len(days)),
+        'DATE': days.astype('datetime64[us]'),
+        'HIGH': high,
+        'LOW': low,
+        'OPEN': open_,
+        'CLOSE': close,
+        'DAILY_VOLATILITY': volatility,
+        'DAILY_RETURN': daily_return,
+        'WEEKLY_AVG_VOLATILITY': rolling_nanmean(volatility, 7)
+    }
+
+def volatility_analysis_combine(parts, now):
+    return concat_frames(parts, VOLATILITY_ANALYSIS_COLUMNS)
+
+# PRICE_MOMENTUM
+
+PRICE_MOMENTUM_COLUMNS = [
+    'SYMBOL', 'COIN_ID', 'TIMESTAMP', 'PRICE_USD', 'MOMENTUM_1D', 'MOMENTUM_7D', 'MOMENTUM_30D', 'TREND_DIRECTION'
+]
+
+def _momentum(price, previous):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(~np.isnan(previous) & (previous != 0), (price - previous) / previous * 100, 0.0)
+
+def price_momentum_partial(holding, series, now):
+    ts = series.timestamp
+    # LAGs count rows within the 31-day window, so slice before lagging
+    lo = np.searchsorted(ts, _as_datetime64(now - timedelta(days=31)), 'left')
+    start = np.searchsorted(ts, _as_datetime64(now - timedelta(days=30)), 'left') - lo
+    price = series.price[lo:]
+    price_7d = lag(price, 7)
+    price_30d = lag(price, 30)
+
+    up = price > price_7d
+    down = price < price_7d
+    direction = np.select(
+        [up & (price_7d > price_30d), up, down & (price_7d < price_30d), down],
+        ['STRONG_UPTREND', 'UPTREND', 'STRONG_DOWNTREND', 'DOWNTREND'],
+        'SIDEWAYS'
+    ).astype(object)
+
+    keep = slice(start, None)
+    size = len(price) - start
+    return {
+        'SYMBOL': _text_column(holding.symbol, size),
+        'COIN_ID': _text_column(holding.coin_id, size),
+        'TIMESTAMP': ts[lo:][keep],
+        'PRICE_USD': price[keep],
+        'MOMENTUM_1D': _momentum(price, lag(price, 1))[keep],
+        'MOMENTUM_7D': _momentum(price, price_7d)[keep],
+        'MOMENTUM_30D': _momentum(price, price_30d)[keep],
+        'TREND_DIRECTION': direction[keep]
+    }
+
+def price_momentum_combine(parts, now):
+    frame = concat_frames(parts, PRICE_MOMENTUM_COLUMNS)
+    return sort_frame(frame, np.argsort(frame['TIMESTAMP'], kind='stable')[::-1])
+
+# PORTFOLIO_RISK_ANALYSIS
+
+PORTFOLIO_RISK_ANALYSIS_COLUMNS = [
+    'CATEGORY', 'DATE', 'TOTAL_VALUE', 'AVG_DAILY_RETURN', 'DAILY_VOLATILITY', 'SHARPE_RATIO',
+    'NUM_ASSETS', 'RISK_CATEGORY', 'MAX_7D_RETURN', 'MIN_7D_RETURN', 'VAR_95', 'MAX_DRAWDOWN'
+]
+
+def portfolio_risk_partial(holding, series, now):
+    """Per-day (value sum, return count, mean, M2) for one holding, keyed by (category, day)"""
+    start = np.searchsorted(series.timestamp, _as_datetime64(add_months(now, -1)), 'left')
+    ts = series.timestamp[start:]
+    if len(ts) == 0:
+        return None
+    price = series.price[start:]
+    returns = pct_change(price, lag(price, 1))
+    days, starts = day_segments(ts)
+    counts = np.diff(np.append(starts, len(ts)))
+
+    value = np.add.reduceat(holding.amount * price, starts)
+    valid = ~np.isnan(returns)
+    n = np.add.reduceat(valid.astype(np.int64), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, np.add.reduceat(np.where(valid, returns, 0.0), starts) / n, 0.0)
+    deviation = np.where(valid, returns - np.repeat(mean, counts), 0.0)
+    m2 = np.add.reduceat(deviation * deviation, starts)
+
+    return [
+        ((holding.category, day), (holding.coin_id, value[i], n[i], mean[i], m2[i]))
+        for i, day in enumerate(days.tolist())
+    ]
+
+def portfolio_risk_combine(parts, now):
+    groups = {}
+    for part in parts:
+        for key, (coin_id, value, n, mean, m2) in part or ():
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [value, n, mean, m2, {coin_id}]
+                continue
+            # Chan et al. pairwise merge of count/mean/M2
+            total = group[1] + n
+            if n:
+                delta = mean - group[2]
+                group[3] += m2 + delta * delta * group[1] * n / total
+                group[2] += delta * n / total
+            group[0] += value
+            group[1] = total
+            group[4].add(coin_id)
+
+    cutoff = np.datetime64(now.date() - timedelta(days=30), 'D')
+    by_category = {}
+    for (category, day), group in groups.items():
+        if np.datetime64(day, 'D') >= cutoff:
+            by_category.setdefault(category, []).append((day, group))
+
+    frames = []
+    for category, rows in by_category.items():
+        rows.sort(key=lambda row: row[0])
+        n = np.array([group[1] for _, group in rows])
+        m2 = np.array([group[3] for _, group in rows])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.where(n > 0, np.array([group[2] for _, group in rows]), np.nan)
+            volatility = np.where(n > 1, np.sqrt(m2 / (n - 1)), np.nan)
+            sharpe = np.where(volatility != 0, avg / volatility, np.nan)
+        frames.append({
+            'CATEGORY': _text_column(category, len(rows)),
+            'DATE': np.array([day for day, _ in rows], dtype='datetime64[D]').astype('datetime64[us]'),
+            'TOTAL_VALUE': np.array([group[0] for _, group in rows], dtype=float),
+            'AVG_DAILY_RETURN': avg,
+            'DAILY_VOLATILITY': volatility,
+            'SHARPE_RATIO': sharpe,
+            'NUM_ASSETS': np.array([len(group[4]) for _, group in rows]),
+            'RISK_CATEGORY': np.select(
+                [volatility > 5, volatility > 2], ['HIGH_RISK', 'MEDIUM_RISK'], 'LOW_RISK'
+            ).astype(object),
+            'MAX_7D_RETURN': rolling_reduce(avg, 7, np.fmax),
+            'MIN_7D_RETURN': rolling_reduce(avg, 7, np.fmin),
+            'VAR_95': avg - (volatility * 1.645),
+            'MAX_DRAWDOWN': np.fmin.accumulate(avg)
+        })
+
+    frame = concat_frames(frames, PORTFOLIO_RISK_ANALYSIS_COLUMNS)
+    return sort_frame(frame, np.lexsort((-frame['TOTAL_VALUE'], -frame['DATE'].astype(np.int64))))
+
+# PORTFOLIO_PERFORMANCE
+
+PORTFOLIO_PERFORMANCE_COLUMNS = ['CATEGORY', 'TOTAL_VALUE', 'PERCENTAGE', 'NUM_COINS', 'AVG_24H_CHANGE']
+
+def portfolio_performance_partial(holding, series, now):
+    ts = series.timestamp
+    if len(ts) == 0 or ts[-1] < _as_datetime64(now - timedelta(hours=24)):
+        return None
+    change = series.change_24h[-1]
+    value = holding.amount * series.price[-1]
+    return holding.category, holding.coin_id, value, value * (0.0 if np.isnan(change) else change)
+
+def portfolio_performance_combine(parts, now):
+    groups = {}
+    for part in parts:
+        if part is None:
+            continue
+        category, coin_id, value, weighted_change = part
+        group = groups.setdefault(category, [0.0, 0.0, set()])
+        group[0] += value
+        group[1] += weighted_change
+        group[2].add(coin_id)
+
+    # HAVING runs before the SUM(...) OVER () window, so filter first
+    kept = [(category, group) for category, group in groups.items() if group[0] > 0]
+    total = sum(group[0] for _, group in kept)
+    kept.sort(key=lambda item: -item[1][0])
+    values = np.array([group[0] for _, group in kept], dtype=float)
+    return {
+        'CATEGORY': np.array([category for category, _ in kept], dtype=object),
+        'TOTAL_VALUE': values,
+        'PERCENTAGE': values / total * 100 if total else np.full(len(kept), np.nan),
+        'NUM_COINS': np.array([len(group[2]) for _, group in kept], dtype=np.int64),
+        'AVG_24H_CHANGE': np.array([group[1] / group[0] for _, group in kept], dtype=float)
+    }
+
+# PRICE_ALERTS
+
+PRICE_ALERTS_COLUMNS = ['COIN_ID', 'SYMBOL', 'NAME', 'CURRENT_PRICE', 'PRICE_CHANGE_24H_PCT', 'ALERT_TYPE']
+
+def alert_type(change):
+    if abs(change) > 10:
+        return 'High Volatility'
+    if change > 5:
+        return 'Significant Rise'
+    if change < -5:
+        return 'Significant Drop'
+    return 'Normal'
+
+def price_alerts_partial(holding, series, now):
+    if len(series.timestamp) == 0:
+        return None
+    change = series.change_24h[-1]
+    if not abs(change) > 5:
+        return None
+    return {
+        'COIN_ID': _text_column(holding.coin_id, 1),
+        'SYMBOL': _text_column(holding.symbol, 1),
+        'NAME': _text_column(holding.name, 1),
+        'CURRENT_PRICE': series.price[-1:],
+        'PRICE_CHANGE_24H_PCT': series.change_24h[-1:],
+        'ALERT_TYPE': _text_column(alert_type(change), 1)
+    }
+
+def price_alerts_combine(parts, now):
+    return concat_frames(parts, PRICE_ALERTS_COLUMNS)
+
+VIEWS = {
+    'DAILY_PRICE_ANALYSIS': ViewSpec(
+        DAILY_PRICE_ANALYSIS_COLUMNS, daily_price_analysis_partial, daily_price_analysis_combine, False),
+    'PORTFOLIO_PERFORMANCE': ViewSpec(
+        PORTFOLIO_PERFORMANCE_COLUMNS, portfolio_performance_partial, portfolio_performance_combine, True),
+    'PRICE_ALERTS': ViewSpec(
+        PRICE_ALERTS_COLUMNS, price_alerts_partial, price_alerts_combine, True),
+    'TECHNICAL_INDICATORS': ViewSpec(
+        TECHNICAL_INDICATORS_COLUMNS, technical_indicators_partial, technical_indicators_combine, True),
+    'VOLATILITY_ANALYSIS': ViewSpec(
+        VOLATILITY_ANALYSIS_COLUMNS, volatility_analysis_partial, volatility_analysis_combine, True),
+    'PRICE_MOMENTUM': ViewSpec(
+        PRICE_MOMENTUM_COLUMNS, price_momentum_partial, price_momentum_combine, True),
+    'PORTFOLIO_RISK_ANALYSIS': ViewSpec(
+        PORTFOLIO_RISK_ANALYSIS_COLUMNS, portfolio_risk_partial, portfolio_risk_combine, True),
+}
+
+def view_partials(view, history, holdings, now):
+    spec = VIEWS[view]
+    if spec.per_holding:
+        for holding in holdings:
+            series = history.get(holding.coin_id)
+            if series is not None:
+                yield spec.partial(holding, series, now)
+    else:
+        for coin_id, series in history.items():
+            yield spec.partial(coin_id, series, now)
+
+def compute_view(view, history, holdings, now=None):
+    """Compute one view as a frame; `now` stands in for CURRENT_TIMESTAMP() (naive UTC)"""
+    now = now or datetime.utcnow()
+    holdings = normalize_holdings(holdings)
+    return VIEWS[view].combine(view_partials(view, history, holdings, now), now)
+
+def compute_views(history, holdings, now=None):
+    now = now or datetime.utcnow()
+    return {view: compute_view(view, history, holdings, now) for view in VIEWS}
@@ -0,0 +1,207 @@
+"""Versioned deployment of tables and views.
+
+Each schema object is versioned by a hash of its normalized DDL. The hash
+is recorded in SCHEMA_VERSIONS once the object is deployed. A deploy skips
+objects whose hash is unchanged and, for tables and views, that still
+exist. Objects that changed, are missing, or depend on an object being
+redeployed are created in dependency order. Objects in the same wave run concurrently, each over its
+own pooled session.
+
+Tables are created with IF NOT EXISTS, so a changed table hash only
+creates the table if it is missing; column changes still need an ALTER.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import get_backend_name
+from connection_pool import get_pool
+
+SCHEMA_VERSIONS_SQL = """
+CREATE TABLE IF NOT EXISTS SCHEMA_VERSIONS (
+    NAME STRING NOT NULL,
+    KIND STRING NOT NULL,
+    HASH STRING NOT NULL,
+    DEPLOYED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (NAME)
+)
+"""
+
+DEFAULT_PARALLELISM = 4
+
+# `depends` names objects to deploy first that the DDL does not mention, e.g.
+# the ALTER adding a column a view selects
+SchemaObject = namedtuple('SchemaObject', ['name', 'kind', 'sql', 'depends'])
+
+def table(name, sql, depends=()):
+    return SchemaObject(name, 'TABLE', sql, tuple(depends))
+
+def view(name, sql, depends=()):
+    return SchemaObject(name, 'VIEW', sql, tuple(depends))
+
+def alter(name, sql, depends=()):
+    """A statement changing another object, e.g. a clustering key; tracked by hash alone"""
+    return SchemaObject(name, 'ALTER', sql, tuple(depends))
+
+def content_hash(sql):
+    normalized = ' '.join(sql.split())
+    return hashlib.sha256(normalized.encode()).hexdigest()[:16]
+
+def dependencies(obj, names):
+    """Other objects in `names` that obj's DDL refers to or that it lists in `depends`"""
+    return {
+        name for name in names
+        if name != obj.name and (name in obj.depends or re.search(rf'\b{name}\b', obj.sql, re.I))
+    }
+
+def get_parallelism():
+    # Embedded databases serialize DDL on one file, so concurrent sessions only add lock waits there
+    default = DEFAULT_PARALLELISM if get_backend_name() == 'snowflake' else 1
+    return int(os.getenv('DEPLOY_PARALLELISM', default))
+
+class StatementCounter:
+    """Cursor wrapper counting the statements a deploy sends"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, cur, report):
+        self._cur = cur
+        self._report = report
+
+    def _count(self):
+        with self._lock:
+            self._report['statements'] += 1
+
+    def execute(self, sql, params=()):
+        self._count()
+        return self._cur.execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        self._count()
+        return self._cur.executemany(sql, seq_of_params)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    def close(self):
+        self._cur.close()
+
+def deployed_state(cur):
+    """({name: hash} from SCHEMA_VERSIONS, set of existing table and view names)"""
+    cur.execute(SCHEMA_VERSIONS_SQL)
+    cur.execute("SELECT NAME, HASH FROM SCHEMA_VERSIONS")
+    versions = dict(cur.fetchall())
+    existing = set()
+    for kind in ('TABLES', 'VIEWS'):
+        cur.execute(f"SHOW {kind}")
+        existing.update(row[1].upper() for row in cur.fetchall())
+    return versions, existing
+
+def plan(objects, versions, existing, force=False):
+    """Split objects into waves of ones to deploy, in dependency order; returns (waves, skipped names)"""
+    names = [obj.name for obj in objects]
+    depends = {obj.name: dependencies(obj, names) for obj in objects}
+
+    pending = set()
+    for obj in objects:
+        missing = obj.kind in ('TABLE', 'VIEW') and obj.name not in existing
+        if force or missing or versions.get(obj.name) != content_hash(obj.sql):
+            pending.add(obj.name)
+    # Redeploy everything downstream of a redeployed object
+    changed = True
+    while changed:
+        changed = False
+        for name in names:
+            if name not in pending and depends[name] & pending:
+                pending.add(name)
+                changed = True
+
+    waves = []
+    done = set()
+    remaining = [obj for obj in objects if obj.name in pending]
+    while remaining:
+        wave = [obj for obj in remaining if not (depends[obj.name] & pending) - done]
+        if not wave:
+            raise ValueError(f"Circular dependency between {', '.join(obj.name for obj in remaining)}")
+        waves.append(wave)
+        done.update(obj.name for obj in wave)
+        remaining = [obj for obj in remaining if obj.name not in done]
+    return waves, [name for name in names if name not in pending]
+
+def record_versions(cur, objects):
+    names = [obj.name for obj in objects]
+    placeholders = ', '.join(['%s'] * len(names))
+    cur.execute(f"DELETE FROM SCHEMA_VERSIONS WHERE NAME IN ({placeholders})", names)
+    cur.executemany(
+        "INSERT INTO SCHEMA_VERSIONS (NAME, KIND, HASH) VALUES (%s, %s, %s)",
+        [(obj.name, obj.kind, content_hash(obj.sql)) for obj in objects]
+    )
+
+def deploy(objects, pool=None, parallelism=None, force=False, dry_run=False):
+    """Deploy changed objects and return a report of what ran and how long it took"""
+    pool = pool or get_pool()
+    parallelism = parallelism or get_parallelism()
+    report = {'deployed': [], 'skipped': [], 'waves': 0, 'statements': 0, 'seconds': 0.0}
+    start = time.perf_counter()
+
+    def create(obj):
+        with pool.checkout() as conn:
+            cur = StatementCounter(conn.cursor(), report)
+            try:
+                cur.execute(obj.sql)
+            finally:
+                cur.close()
+        return obj
+
+    def record(succeeded):
+        with pool.checkout() as conn:
+            cur = StatementCounter(conn.cursor(), report)
+            try:
+                record_versions(cur, succeeded)
+            finally:
+                cur.close()
+
+    try:
+        # The planning session goes back to the pool before the waves, which may need every connection
+        with pool.checkout() as conn:
+            cur = StatementCounter(conn.cursor(), report)
+            try:
+                versions, existing = deployed_state(cur)
+            finally:
+                cur.close()
+        waves, report['skipped'] = plan(objects, versions, existing, force)
+        if dry_run:
+            report['deployed'] = [obj.name for wave in waves for obj in wave]
+            report['waves'] = len(waves)
+            return report
+
+        with ThreadPoolExecutor(max(1, min(parallelism, pool.max_size))) as executor:
+            for wave in waves:
+                futures = [executor.submit(create, obj) for obj in wave]
+                succeeded, failure = [], None
+                for future in futures:
+                    try:
+                        succeeded.append(future.result())
+                    except Exception as e:
+                        failure = failure or e
+                # Record what did deploy, so a rerun after a failure only retries the rest
+                if succeeded:
+                    record(succeeded)
+                    report['deployed'].extend(obj.name for obj in succeeded)
+                report['waves'] += 1
+                if failure is not None:
+                    raise failure
+    finally:
+        report['seconds'] = time.perf_counter() - start
+    return report
+
+def print_report(report):
+    print(f"✅ Deployed {len(report['deployed'])} object(s) in {report['waves']} wave(s), "
+          f"skipped {len(report['skipped'])} unchanged")
+    for name in report['deployed']:
+        print(f"- {name}")
+    print(f"Executed {report['statements']} statement(s) in {report['seconds']:.2f}s")
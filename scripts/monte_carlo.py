@@ -0,0 +1,270 @@
+"""Monte Carlo simulation of the held portfolio's value.
+
+Paths start from today's positions (HOLDINGS amount x latest close) and
+step one day at a time under one of two models:
+- 'gbm': correlated geometric Brownian motion with the mean and the
+  pairwise covariance of each coin's daily log returns
+- 'bootstrap': whole historical days drawn with replacement, which keeps
+  fat tails and the cross-coin dependence of the sample
+
+Each batch holds paths x coins numbers, whatever the horizon. Results are
+merged as fixed-bin histograms of the log return and of the worst drawdown
+up to each horizon, so memory stays flat however many paths run.
+
+Paths are split into tasks and the tasks are spread over a process pool.
+Each task's generator is seeded from SeedSequence(seed).spawn(), so a run
+returns the same numbers with any number of workers.
+
+    python scripts/monte_carlo.py [--paths N] [--horizons 1,7,30] [--model gbm|bootstrap] [--workers N]
+"""
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from risk import covariance, portfolio_weights
+
+DEFAULT_PATHS = 100_000
+DEFAULT_HORIZONS = (1, 7, 30)
+DEFAULT_TASK_PATHS = 50_000
+DEFAULT_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+DEFAULT_CONFIDENCES = (0.95, 0.99)
+MODELS = ('gbm', 'bootstrap')
+
+# Histogram resolution: log returns in [-LOG_RANGE, LOG_RANGE] and drawdowns in [0, 1]
+LOG_RANGE = 8.0
+LOG_BINS = 32768
+DRAWDOWN_BINS = 4096
+# Numbers per batch array; bounds a worker's memory at a few of these
+BATCH_ELEMENTS = 1 << 20
+
+Model = namedtuple('Model', ['kind', 'coins', 'weights', 'value', 'drift', 'factor', 'log_returns'])
+
+def get_workers():
+    return int(os.getenv('MONTE_CARLO_WORKERS', os.cpu_count() or 1))
+
+def build_model(matrix, holdings, kind='gbm'):
+    """Model of the held coins from a risk.ReturnsMatrix and holdings"""
+    if kind not in MODELS:
+        raise ValueError(f"Unknown model {kind!r}; expected one of {', '.join(MODELS)}")
+    weights, values, missing = portfolio_weights(matrix, holdings)
+    held = weights > 0
+    if not held.any():
+        raise ValueError("No held coin has a price to simulate from")
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_returns = np.log1p(matrix.returns[:, held])
+    drift = factor = None
+    if kind == 'gbm':
+        log_matrix = matrix._replace(returns=log_returns, valid=np.isfinite(log_returns))
+        cov = np.nan_to_num(covariance(log_matrix).cov)
+        # Pairwise-complete covariance need not be positive semidefinite; clip negative eigenvalues
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+        with np.errstate(invalid='ignore'):
+            drift = np.nan_to_num(np.nanmean(np.where(log_matrix.valid, log_returns, np.nan), axis=0))
+        log_returns = None
+    else:
+        # Days on which no held coin traded carry no information
+        log_returns = np.nan_to_num(log_returns[np.isfinite(log_returns).any(axis=1)])
+        if not len(log_returns):
+            raise ValueError("No historical returns to bootstrap from")
+    return Model(kind, matrix.coins[held], weights[held], float(values.sum()), drift, factor, log_returns)
+
+class Aggregate:
+    """Mergeable per-horizon summary of simulated paths"""
+
+    def __init__(self, horizons):
+        self.horizons = tuple(horizons)
+        count = len(self.horizons)
+        self.paths = 0
+        self.counts = np.zeros((count, LOG_BINS), dtype=np.int64)
+        # Exact sum of simple returns per bin, so tail means are exact away from the cutoff bin
+        self.sums = np.zeros((count, LOG_BINS))
+        self.drawdown_counts = np.zeros((count, DRAWDOWN_BINS), dtype=np.int64)
+        self.total = np.zeros(count)
+        self.total_squares = np.zeros(count)
+        self.minimum = np.full(count, np.inf)
+        self.maximum = np.full(count, -np.inf)
+
+    def add(self, h, log_return, drawdown):
+        simple = np.expm1(log_return)
+        bins = np.clip(((log_return + LOG_RANGE) * (LOG_BINS / (2 * LOG_RANGE))).astype(np.int64), 0, LOG_BINS - 1)
+        self.counts[h] += np.bincount(bins, minlength=LOG_BINS)
+        self.sums[h] += np.bincount(bins, weights=simple, minlength=LOG_BINS)
+        dd_bins = np.minimum((drawdown * DRAWDOWN_BINS).astype(np.int64), DRAWDOWN_BINS - 1)
+        self.drawdown_counts[h] += np.bincount(dd_bins, minlength=DRAWDOWN_BINS)
+        self.total[h] += simple.sum()
+        self.total_squares[h] += (simple * simple).sum()
+        self.minimum[h] = min(self.minimum[h], simple.min())
+        self.maximum[h] = max(self.maximum[h], simple.max())
+
+    def merge(self, other):
+        self.paths += other.paths
+        self.counts += other.counts
+        self.sums += other.sums
+        self.drawdown_counts += other.drawdown_counts
+        self.total += other.total
+        self.total_squares += other.total_squares
+        np.minimum(self.minimum, other.minimum, out=self.minimum)
+        np.maximum(self.maximum, other.maximum, out=self.maximum)
+        return self
+
+    def _position(self, counts, q):
+        """(bin, fraction of the bin) at which the cumulative count reaches q of the paths"""
+        target = q * counts.sum()
+        cumulative = np.cumsum(counts)
+        i = int(np.searchsorted(cumulative, target, side='left'))
+        i = min(i, len(counts) - 1)
+        before = cumulative[i] - counts[i]
+        return i, (target - before) / counts[i] if counts[i] else 0.0
+
+    def percentile(self, h, q):
+        """Simple return at quantile q, interpolated linearly within the log-return bin"""
+        i, fraction = self._position(self.counts[h], q)
+        width = 2 * LOG_RANGE / LOG_BINS
+        return float(np.expm1(-LOG_RANGE + (i + fraction) * width))
+
+    def tail(self, h, confidence):
+        """(VaR, CVaR) as positive losses; the cutoff bin's share of the tail uses its mean"""
+        counts, sums = self.counts[h], self.sums[h]
+        i, fraction = self._position(counts, 1 - confidence)
+        in_tail = counts[:i].sum() + fraction * counts[i]
+        total = sums[:i].sum() + (fraction * sums[i] if counts[i] else 0.0)
+        return -self.percentile(h, 1 - confidence), float(-total / in_tail) if in_tail else float('nan')
+
+    def drawdown_percentile(self, h, q):
+        i, fraction = self._position(self.drawdown_counts[h], q)
+        return float((i + fraction) / DRAWDOWN_BINS)
+
+    def clipped(self, h):
+        """Paths whose log return fell outside the histogram range (counted in the edge bins)"""
+        return int(self.counts[h, 0] + self.counts[h, -1])
+
+def batch_size(model):
+    return max(1, BATCH_ELEMENTS // len(model.coins))
+
+def simulate_task(model, horizons, paths, seed):
+    """Simulate `paths` paths with a generator seeded from `seed` (a SeedSequence)"""
+    rng = np.random.default_rng(seed)
+    aggregate = Aggregate(horizons)
+    aggregate.paths = paths
+    steps = max(horizons)
+    record = {horizon: h for h, horizon in enumerate(horizons)}
+    size = batch_size(model)
+
+    for start in range(0, paths, size):
+        n = min(size, paths - start)
+        growth = np.zeros((n, len(model.coins)))
+        peak = np.ones(n)
+        drawdown = np.zeros(n)
+        for step in range(1, steps + 1):
+            if model.kind == 'gbm':
+                growth += model.drift
+                growth += rng.standard_normal((n, len(model.coins))) @ model.factor.T
+            else:
+                growth += model.log_returns[rng.integers(0, len(model.log_returns), n)]
+            # Portfolio value relative to today
+            value = np.exp(growth) @ model.weights
+            np.maximum(peak, value, out=peak)
+            np.maximum(drawdown, 1 - value / peak, out=drawdown)
+            if step in record:
+                aggregate.add(record[step], np.log(value), drawdown)
+    return aggregate
+
+_worker_model = None
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+def _run_task(horizons, paths, seed):
+    return simulate_task(_worker_model, horizons, paths, seed)
+
+def simulate(model, paths=DEFAULT_PATHS, horizons=DEFAULT_HORIZONS, workers=None, seed=0,
+             task_paths=DEFAULT_TASK_PATHS):
+    """Run `paths` paths over a process pool and return the merged Aggregate"""
+    horizons = tuple(sorted(set(int(h) for h in horizons)))
+    if not horizons or horizons[0] < 1:
+        raise ValueError("Horizons must be positive numbers of days")
+    workers = workers or get_workers()
+    sizes = [task_paths] * (paths // task_paths) + ([paths % task_paths] if paths % task_paths else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    aggregate = Aggregate(horizons)
+    if workers == 1:
+        for size, task_seed in zip(sizes, seeds):
+            aggregate.merge(simulate_task(model, horizons, size, task_seed))
+        return aggregate
+    # The model goes to each worker once, not with every task
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model,)) as executor:
+        for result in executor.map(_run_task, [horizons] * len(sizes), sizes, seeds):
+            aggregate.merge(result)
+    return aggregate
+
+def summarize(model, aggregate, percentiles=DEFAULT_PERCENTILES, confidences=DEFAULT_CONFIDENCES):
+    """JSON-friendly report: per horizon return distribution, VaR/CVaR and drawdowns"""
+    horizons = {}
+    for h, horizon in enumerate(aggregate.horizons):
+        mean = aggregate.total[h] / aggregate.paths
+        variance = aggregate.total_squares[h] / aggregate.paths - mean * mean
+        loss = aggregate.counts[h, :LOG_BINS // 2].sum() / aggregate.paths
+        horizons[f"{horizon}d"] = {
+            'expected_value': model.value * (1 + mean),
+            'mean_return': float(mean),
+            'std_return': float(np.sqrt(max(variance, 0.0))),
+            'probability_of_loss': float(loss),
+            'worst_return': float(aggregate.minimum[h]),
+            'best_return': float(aggregate.maximum[h]),
+            'percentiles': {f"p{p}": aggregate.percentile(h, p / 100) for p in percentiles},
+            'var': {
+                f"{confidence:.0%}": dict(zip(('var', 'cvar'), aggregate.tail(h, confidence)))
+                for confidence in confidences
+            },
+            'max_drawdown': {f"p{p}": aggregate.drawdown_percentile(h, p / 100) for p in (50, 95, 99)},
+            'clipped_paths': aggregate.clipped(h),
+        }
+    return {
+        'model': model.kind,
+        'paths': aggregate.paths,
+        'coins': len(model.coins),
+        'portfolio_value': model.value,
+        'horizons': horizons,
+    }
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from connection_pool import get_pool
+    from local_analytics import load_holdings
+    from risk import load_returns
+
+    parser = argparse.ArgumentParser(description='Monte Carlo simulation of the held portfolio')
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS)
+    parser.add_argument('--horizons', default=','.join(map(str, DEFAULT_HORIZONS)), help='comma-separated days')
+    parser.add_argument('--model', choices=MODELS, default='gbm')
+    parser.add_argument('--portfolio', help='portfolio to analyse (default PORTFOLIO_ID)')
+    parser.add_argument('--days', type=int, default=365, help='days of history to fit (0 for all)')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default MONTE_CARLO_WORKERS or CPU count)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        try:
+            matrix = load_returns(cur, args.days)
+            holdings = load_holdings(cur, args.portfolio)
+        finally:
+            cur.close()
+
+    model = build_model(matrix, holdings, args.model)
+    start = time.perf_counter()
+    aggregate = simulate(model, args.paths, [int(h) for h in args.horizons.split(',')], args.workers, args.seed)
+    seconds = time.perf_counter() - start
+    report = summarize(model, aggregate)
+    report['seconds'] = seconds
+    report['paths_per_second'] = aggregate.paths / seconds
+    print(json.dumps(report, indent=2))
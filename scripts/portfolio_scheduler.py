@@ -0,0 +1,163 @@
+"""Concurrent syncs of many portfolios into one database.
+
+Each tick takes one sync payload per portfolio:
+- every payload is validated on its own, so a bad payload fails only its
+  portfolio
+- the prices of all valid payloads are merged into one batch with each
+  coin once (the last quote wins) and written by a single prices-only
+  sync. A coin held by many portfolios is written to PRICES once per tick,
+  and price dedup, the price store, indicators and alerts see it once
+- each portfolio's holdings are synced in their own transaction over
+  their own pooled connection, up to `concurrency` at a time
+
+The price sync runs alongside the holdings syncs, since it only writes the
+shared price tables and each holdings sync only its portfolio's HOLDINGS
+rows. Ticks run one at a time.
+
+SYNC_CONCURRENCY sets how many syncs run at once. It defaults to the pool
+size, or 1 on SQLite, where writers queue for the database file's lock.
+"""
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from backends import get_backend_name
+from connection_pool import get_pool
+from records import PriceBatch, check_portfolio_id, parse_payload
+from snowflake_sync import sync_data, sync_holdings
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def get_concurrency(pool):
+    default = 1 if get_backend_name() == 'sqlite' else pool.max_size
+    return max(1, int(os.getenv('SYNC_CONCURRENCY', default)))
+
+def error_result(e):
+    return {
+        'status': 'error',
+        'message': str(e),
+        'details': {
+            'type': type(e).__name__,
+            'trace': traceback.format_exc()
+        }
+    }
+
+class PortfolioScheduler:
+    """Runs ticks of {portfolio_id: payload} syncs over a connection pool"""
+
+    def __init__(self, pool=None, concurrency=None, batch_size=None, holdings_mode=None):
+        self.pool = pool or get_pool()
+        self.concurrency = concurrency or get_concurrency(self.pool)
+        self.batch_size = batch_size
+        self.holdings_mode = holdings_mode
+        self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='portfolio-sync')
+
+    def parse(self, payloads):
+        """({portfolio_id: holdings}, [PriceBatch], {portfolio_id: error result}) for the payloads of a tick"""
+        holdings = {}
+        batches = []
+        failed = {}
+        for portfolio_id, payload in payloads.items():
+            try:
+                check_portfolio_id(portfolio_id)
+                if not isinstance(payload, dict):
+                    raise ValueError(f"Expected a sync payload object for portfolio {portfolio_id}")
+                holdings[portfolio_id], prices = parse_payload(payload)
+            except ValueError as e:
+                failed[portfolio_id] = error_result(e)
+                continue
+            batches.append(prices)
+        return holdings, batches, failed
+
+    def run(self, payloads):
+        """Sync one tick; returns a result whose details hold the price sync and each portfolio's sync"""
+        start = time.perf_counter()
+        holdings, batches, results = self.parse(payloads)
+        prices = PriceBatch.merge(batches)
+
+        # Submitted first so the largest transaction starts before the holdings syncs queue up
+        price_future = None
+        if len(prices):
+            price_future = self._executor.submit(
+                sync_data, {'prices': prices}, batch_size=self.batch_size, holdings_mode='keep', pool=self.pool
+            )
+        futures = {
+            portfolio_id: self._executor.submit(
+                sync_holdings, portfolio_holdings, portfolio_id, batch_size=self.batch_size,
+                holdings_mode=self.holdings_mode, pool=self.pool
+            )
+            for portfolio_id, portfolio_holdings in holdings.items()
+        }
+        for portfolio_id, future in futures.items():
+            results[portfolio_id] = future.result()
+        price_result = price_future.result() if price_future is not None else None
+
+        failed = sorted(portfolio_id for portfolio_id, result in results.items() if result['status'] != 'success')
+        prices_failed = price_result is not None and price_result['status'] != 'success'
+        syncs = len(results) + (price_result is not None)
+        if not failed and not prices_failed:
+            status, message = 'success', f"Synced {len(results)} portfolios and {len(prices)} prices"
+        else:
+            status = 'error' if len(failed) + prices_failed == syncs else 'partial'
+            message = '; '.join(
+                ([f"{len(failed)} portfolio(s) failed: {', '.join(failed)}"] if failed else [])
+                + (["the price sync failed"] if prices_failed else [])
+            )
+        print_debug(f"{'✅' if status == 'success' else '⚠️'} Tick: {message}")
+        return {
+            'status': status,
+            'message': message,
+            'details': {
+                'portfolios': results,
+                'prices': price_result,
+                'prices_received': sum(len(batch) for batch in batches),
+                'prices_merged': len(prices),
+                'concurrency': self.concurrency,
+                'seconds': time.perf_counter() - start
+            }
+        }
+
+    def close(self):
+        self._executor.shutdown()
+
+def read_ticks(args):
+    if args.stdin:
+        for line in sys.stdin:
+            if line.strip():
+                yield json.loads(line)
+    elif args.file:
+        with open(args.file) as f:
+            yield json.load(f)
+    elif args.payloads:
+        yield json.loads(args.payloads)
+    else:
+        raise ValueError("No input data provided")
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sync many portfolios concurrently, writing their prices once')
+    parser.add_argument('payloads', nargs='?', help='JSON object mapping portfolio ids to sync payloads')
+    parser.add_argument('--file', help='read the JSON object from this file')
+    parser.add_argument('--stdin', action='store_true',
+                        help='read one JSON object per line from stdin and sync each as a tick')
+    parser.add_argument('--concurrency', type=int, help='syncs run at once (default SYNC_CONCURRENCY)')
+    args = parser.parse_args()
+
+    scheduler = PortfolioScheduler(concurrency=args.concurrency)
+    status = 0
+    try:
+        for payloads in read_ticks(args):
+            result = scheduler.run(payloads)
+            status = status or int(result['status'] != 'success')
+            print(json.dumps(result), flush=True)
+    except Exception as e:
+        print(json.dumps(error_result(e)))
+        status = 1
+    finally:
+        scheduler.close()
+    sys.exit(status)
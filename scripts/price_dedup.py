@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from records import as_price_batch
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STATE_DIR = os.path.join(PROJECT_ROOT, '.sync_state')
+
+# The sync keeps LATEST_PRICES current, so reconciling reads one row per coin
+LATEST_PRICES_SQL = "SELECT COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD FROM LATEST_PRICES"
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def get_state_dir():
+    return os.getenv('SYNC_STATE_DIR', DEFAULT_STATE_DIR)
+
+def to_epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    # PRICES.TIMESTAMP is TIMESTAMP_NTZ holding UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def to_micros(value):
+    """Epoch microseconds from an int, ISO string, datetime (naive is UTC) or NumPy integer/datetime64"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        # NumPy scalars; numpy is only imported by callers that already hold one
+        import numpy as np
+
+        if isinstance(value, np.datetime64):
+            return int(value.astype('datetime64[us]').astype(np.int64))
+        return int(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(round(value.timestamp() * 1_000_000))
+
+def relative_change(old, new):
+    old = old or 0.0
+    new = new or 0.0
+    if old == new:
+        return 0.0
+    return abs(new - old) / max(abs(old), 1e-12)
+
+class PriceDeduplicator:
+    """Suppresses price rows that did not move enough, or arrived too soon, since the last write per coin.
+
+    The last written (timestamp, price, market cap, volume) per coin is kept
+    in memory, persisted to a JSON cache after each commit, and reconciled
+    against LATEST_PRICES the first time it is used in a process.
+    """
+
+    def __init__(self, epsilon=0.0, min_interval=0.0, cache_path=None):
+        self.epsilon = epsilon
+        self.min_interval = min_interval
+        self.cache_path = cache_path
+        self.last = {}
+        self._pending = {}
+        self._loaded = False
+        self.suppressed_total = 0
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return {coin_id: tuple(values) for coin_id, values in json.load(f).items()}
+        except (OSError, ValueError) as e:
+            print_debug(f"⚠️ Ignoring unreadable price cache {self.cache_path}: {e}")
+            return {}
+
+    def begin(self, cur):
+        """Start a sync: drop pending rows from any failed transaction and load state on first use"""
+        self._pending = {}
+        if not self._loaded:
+            self._reconcile(cur)
+
+    def _reconcile(self, cur):
+        """Load the cache and refresh it from LATEST_PRICES if another writer got ahead of it"""
+        self.last = self._load_cache()
+        cached_max = max((values[0] for values in self.last.values()), default=None)
+
+        cur.execute("SELECT MAX(TIMESTAMP) FROM LATEST_PRICES")
+        table_max = cur.fetchone()[0]
+        if table_max is not None and (cached_max is None or to_epoch(table_max) > cached_max):
+            cur.execute(LATEST_PRICES_SQL)
+            self.last = {
+                row[0]: (to_epoch(row[1]), row[2], row[3], row[4])
+                for row in cur.fetchall()
+            }
+            print_debug(f"Reconciled price cache against LATEST_PRICES ({len(self.last)} coins)")
+        self._loaded = True
+
+    def should_write(self, coin_id, values, timestamp):
+        """Whether a coin's (price, market cap, volume) at `timestamp` is worth writing"""
+        previous = self._pending.get(coin_id) or self.last.get(coin_id)
+        if previous is not None:
+            if timestamp - previous[0] < self.min_interval:
+                return False
+            if all(relative_change(old, new) <= self.epsilon for old, new in zip(previous[1:], values)):
+                return False
+        self._pending[coin_id] = (timestamp,) + values
+        return True
+
+    def filter(self, prices, timestamp):
+        """Return the PriceBatch worth writing at `timestamp` and how many prices were suppressed"""
+        prices = as_price_batch(prices)
+        timestamp = to_epoch(timestamp)
+        kept = [
+            i for i, (coin_id, _, price, market_cap, volume, _) in enumerate(prices.rows())
+            if self.should_write(coin_id, (price, market_cap, volume), timestamp)
+        ]
+        suppressed = len(prices) - len(kept)
+        self.suppressed_total += suppressed
+        return (prices if not suppressed else prices.select(kept)), suppressed
+
+    def commit(self):
+        """Promote rows written in the committed transaction and persist the cache"""
+        self.last.update(self._pending)
+        self._pending = {}
+        if self.cache_path:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.last, f)
+            os.replace(tmp_path, self.cache_path)
+
+def get_price_deduplicator():
+    """Build a deduplicator from env vars, or return None when dedup is not configured"""
+    epsilon = os.getenv('SNOWFLAKE_SYNC_PRICE_EPSILON')
+    min_interval = os.getenv('SNOWFLAKE_SYNC_PRICE_MIN_INTERVAL')
+    if epsilon is None and min_interval is None:
+        return None
+    cache_path = os.getenv(
+        'SNOWFLAKE_SYNC_PRICE_CACHE',
+        os.path.join(get_state_dir(), 'last_prices.json')
+    )
+    return PriceDeduplicator(float(epsilon or 0), float(min_interval or 0), cache_path)
@@ -0,0 +1,258 @@
+"""Concurrent CoinGecko price fetcher.
+
+Coin ids are split into batches that keep the /simple/price URL under
+MAX_URL_LENGTH. The batches are fetched concurrently over one pooled
+aiohttp session. A token bucket paces requests to the configured API
+tier, and 429/5xx responses, non-JSON bodies and network errors are
+retried with jittered exponential backoff. Results come back as price
+records in the shape sync_data expects.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from urllib.parse import quote
+
+import aiohttp
+
+DEFAULT_API_URL = 'https://api.coingecko.com/api/v3'
+# Paid-plan keys are only accepted on the pro host
+PRO_API_URL = 'https://pro-api.coingecko.com/api/v3'
+PAID_TIERS = ('analyst', 'lite', 'pro')
+
+# Requests per minute for each CoinGecko plan
+TIER_RATE_LIMITS = {
+    'public': 10,
+    'demo': 30,
+    'analyst': 500,
+    'lite': 500,
+    'pro': 1000,
+}
+
+# Conservative limit for the full request URL; many proxies reject longer ones
+MAX_URL_LENGTH = 2000
+MAX_IDS_PER_REQUEST = 250
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 10
+DEFAULT_RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+PRICE_PARAMS = {
+    'vs_currencies': 'usd',
+    'include_market_cap': 'true',
+    'include_24hr_vol': 'true',
+    'include_24hr_change': 'true'
+}
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Push the next token back, e.g. to honour a Retry-After header"""
+        self.tokens = min(self.tokens, 0)
+        self.updated = max(self.updated, time.monotonic() + seconds)
+
+class FetchError(Exception):
+    pass
+
+def chunk_ids(coin_ids, base_url, max_url_length=MAX_URL_LENGTH, max_ids=MAX_IDS_PER_REQUEST):
+    """Split ids into batches whose /simple/price URL stays under max_url_length"""
+    query = '&'.join(f'{key}={value}' for key, value in PRICE_PARAMS.items())
+    budget = max_url_length - len(f'{base_url}/simple/price?{query}&ids=')
+    batch = []
+    length = 0
+    for coin_id in dict.fromkeys(coin_ids):
+        encoded = len(quote(coin_id, safe=''))
+        # Each id after the first also costs an encoded comma (%2C)
+        cost = encoded + (3 if batch else 0)
+        if encoded > budget:
+            raise ValueError(f"Coin id too long for a single request: {coin_id}")
+        if batch and (length + cost > budget or len(batch) >= max_ids):
+            yield batch
+            batch = []
+            length = 0
+            cost = encoded
+        batch.append(coin_id)
+        length += cost
+    if batch:
+        yield batch
+
+def price_records(payload):
+    """Convert a /simple/price response into sync_data price records"""
+    records = []
+    for coin_id, values in payload.items():
+        if values.get('usd') is None:
+            continue
+        records.append({
+            'coin_id': coin_id,
+            'price_usd': values['usd'],
+            'market_cap_usd': values.get('usd_market_cap') or 0,
+            'volume_24h_usd': values.get('usd_24h_vol') or 0,
+            'price_change_24h_pct': values.get('usd_24h_change') or 0
+        })
+    return records
+
+def retry_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than a server-provided Retry-After"""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+class PriceFetcher:
+    def __init__(self, base_url=None, api_key=None, tier=None, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, rate_per_minute=None):
+        self.api_key = api_key if api_key is not None else os.getenv('COINGECKO_API_KEY')
+        self.tier = (tier or os.getenv('COINGECKO_TIER', 'demo' if self.api_key else 'public')).lower()
+        default_url = PRO_API_URL if self.tier in PAID_TIERS else DEFAULT_API_URL
+        self.base_url = (base_url or os.getenv('COINGECKO_API_URL') or default_url).rstrip('/')
+        if rate_per_minute is None:
+            if self.tier not in TIER_RATE_LIMITS:
+                raise ValueError(f"Unknown COINGECKO_TIER: {self.tier}")
+            rate_per_minute = TIER_RATE_LIMITS[self.tier]
+        self.rate_per_minute = rate_per_minute
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = {'requests': 0, 'retries': 0, 'failed_batches': 0}
+
+    def headers(self):
+        headers = {'Accept': 'application/json'}
+        if self.api_key:
+            key_header = 'x-cg-pro-api-key' if self.tier in PAID_TIERS else 'x-cg-demo-api-key'
+            headers[key_header] = self.api_key
+        return headers
+
+    async def get_json(self, session, bucket, path, params, description):
+        """GET a JSON document, pacing with the token bucket.
+
+        429/5xx responses, network errors and 200 responses whose body is not
+        JSON (e.g. a proxy's HTML error page) are retried.
+        """
+        url = f'{self.base_url}{path}'
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            self.stats['requests'] += 1
+            retry_after = None
+            try:
+                async with session.get(url, params=params) as response:
+                    if response.status == 200:
+                        try:
+                            return await response.json(content_type=None)
+                        except ValueError as e:
+                            error = FetchError(f"Invalid JSON: {e}")
+                    elif response.status not in RETRY_STATUSES:
+                        raise FetchError(f"HTTP {response.status} for {description}: {await response.text()}")
+                    else:
+                        retry_after = response.headers.get('Retry-After')
+                        error = FetchError(f"HTTP {response.status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if attempt == self.retries:
+                raise FetchError(f"Giving up on {description} after {attempt + 1} attempts: {error}")
+            self.stats['retries'] += 1
+            delay = retry_delay(attempt, retry_after)
+            if retry_after:
+                bucket.pause(delay)
+            await asyncio.sleep(delay)
+
+    async def fetch_batch(self, session, bucket, batch):
+        params = dict(PRICE_PARAMS, ids=','.join(batch))
+        return await self.get_json(session, bucket, '/simple/price', params, f"{len(batch)} ids")
+
+    async def fetch_market_chart(self, session, bucket, coin_id, start, end):
+        """Historical /market_chart/range payload for one coin between two epoch seconds"""
+        path = f"/coins/{quote(coin_id, safe='')}/market_chart/range"
+        params = {'vs_currency': 'usd', 'from': int(start), 'to': int(end)}
+        return await self.get_json(session, bucket, path, params, f"{coin_id} market chart")
+
+    def token_bucket(self):
+        return TokenBucket(self.rate_per_minute / 60, capacity=min(self.concurrency, max(1, self.rate_per_minute // 60)))
+
+    def session(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers())
+
+    async def fetch(self, coin_ids):
+        """Fetch all ids; returns (records, missing ids, failed ids)"""
+        coin_ids = list(dict.fromkeys(coin_ids))
+        batches = list(chunk_ids(coin_ids, self.base_url))
+        bucket = self.token_bucket()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with self.session() as session:
+            async def run(batch):
+                async with semaphore:
+                    try:
+                        return batch, await self.fetch_batch(session, bucket, batch)
+                    except FetchError as e:
+                        print_debug(f"❌ {e}")
+                        self.stats['failed_batches'] += 1
+                        return batch, None
+
+            results = await asyncio.gather(*(run(batch) for batch in batches))
+
+        records = []
+        failed = []
+        for batch, payload in results:
+            if payload is None:
+                failed.extend(batch)
+            else:
+                records.extend(price_records(payload))
+        returned = {record['coin_id'] for record in records}
+        failed_ids = set(failed)
+        missing = [coin_id for coin_id in coin_ids if coin_id not in returned and coin_id not in failed_ids]
+        return records, missing, failed
+
+def fetch_prices(coin_ids, **kwargs):
+    """Synchronous wrapper: price records for every id CoinGecko returned"""
+    records, missing, failed = asyncio.run(PriceFetcher(**kwargs).fetch(coin_ids))
+    if missing:
+        print_debug(f"⚠️ No price returned for {len(missing)} ids")
+    if failed:
+        print_debug(f"⚠️ Failed to fetch {len(failed)} ids")
+    return records
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Fetch CoinGecko prices as NDJSON price records (pipe into snowflake_sync.py --stdin)'
+    )
+    parser.add_argument('coins', nargs='*', help='coin ids; read one per line from stdin when omitted')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args()
+
+    coin_ids = args.coins or [line.strip() for line in sys.stdin if line.strip()]
+    for record in fetch_prices(coin_ids, concurrency=args.concurrency):
+        print(json.dumps(dict(record, type='price')))
@@ -0,0 +1,346 @@
+"""Local append-only columnar store for price history.
+
+Every write lands as an immutable segment file:
+
+    header   magic, version, seq, row count, index length (32 bytes)
+    index    JSON {coin_id: [first_row, row_count]}, padded to 8 bytes
+    columns  timestamp (int64 microseconds, UTC), price, market cap,
+             volume and 24h change (float64), each contiguous
+
+Rows are sorted by coin and then timestamp, so a coin's history is a
+contiguous slice of each column and can be memory mapped without parsing.
+Append segments (appends/<seq>.seg) hold many coins; compaction folds
+them into one segment per coin (coins/<coin>.seg) whose seq records the
+last append it covers, so readers skip appends that are already merged.
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from collections.abc import Mapping
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from local_analytics import CoinSeries
+from price_dedup import to_micros
+
+MAGIC = b'PXST'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQQ')
+COLUMNS = ['timestamp', 'price', 'market_cap', 'volume', 'change_24h']
+DTYPES = ['<i8', '<f8', '<f8', '<f8', '<f8']
+DEFAULT_COMPACT_AFTER = 64
+
+_SEGMENT_NAME = re.compile(r'^(\d+)\.seg$')
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def write_segment(path, seq, index, columns):
+    """Write a segment to `path` (the caller renames it into place)"""
+    index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+    index_bytes += b' ' * (-len(index_bytes) % 8)
+    rows = len(columns[0])
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, seq, rows, len(index_bytes)))
+        f.write(index_bytes)
+        for values, dtype in zip(columns, DTYPES):
+            f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+def build_segment_columns(coin_ids, columns):
+    """Sort rows by (coin, timestamp) and build the coin index"""
+    coins, inverse = np.unique(np.asarray(coin_ids, dtype=object).astype(str), return_inverse=True)
+    order = np.lexsort((columns[0], inverse))
+    counts = np.bincount(inverse, minlength=len(coins))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    index = {coin: [int(start), int(count)] for coin, start, count in zip(coins.tolist(), starts, counts)}
+    return index, [values[order] for values in columns]
+
+class Segment:
+    """Read-only memory-mapped view of one segment file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if self._mmap is None or size < HEADER.size:
+            raise ValueError(f"Truncated price store segment: {path}")
+
+        magic, version, self.seq, self.rows, index_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a price store segment: {path}")
+        offset = HEADER.size
+        self.index = json.loads(bytes(self._mmap[offset:offset + index_length]))
+        offset += index_length
+        self.columns = []
+        for dtype in DTYPES:
+            self.columns.append(np.frombuffer(self._mmap, dtype=dtype, count=self.rows, offset=offset))
+            offset += 8 * self.rows
+
+    def coin_columns(self, coin_id, start=None, end=None):
+        """Column views for one coin, optionally limited to start <= timestamp < end (microseconds)"""
+        first, count = self.index.get(coin_id, (0, 0))
+        timestamps = self.columns[0][first:first + count]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, 'left'))
+        hi = count if end is None else int(np.searchsorted(timestamps, end, 'left'))
+        return [values[first + lo:first + hi] for values in self.columns]
+
+def as_series(columns):
+    return CoinSeries(columns[0].view('datetime64[us]'), *columns[1:])
+
+class PriceStore(Mapping):
+    """coin_id -> CoinSeries over the on-disk store; usable wherever local_analytics expects history"""
+
+    def __init__(self, root):
+        self.root = root
+        self.appends_dir = os.path.join(root, 'appends')
+        self.coins_dir = os.path.join(root, 'coins')
+        os.makedirs(self.appends_dir, exist_ok=True)
+        os.makedirs(self.coins_dir, exist_ok=True)
+        self._segments = {}
+
+    # Reading
+
+    def _open(self, path):
+        """Segments are immutable and replaced by rename, so cache them by inode"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (path, stat.st_ino, stat.st_size)
+        segment = self._segments.get(key)
+        if segment is None:
+            try:
+                segment = Segment(path)
+            except FileNotFoundError:
+                return None
+            self._segments = {k: v for k, v in self._segments.items() if k[0] != path}
+            self._segments[key] = segment
+        return segment
+
+    def _coin_path(self, coin_id):
+        return os.path.join(self.coins_dir, quote(coin_id, safe='') + '.seg')
+
+    def _append_seqs(self):
+        seqs = []
+        for name in os.listdir(self.appends_dir):
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                seqs.append(int(match.group(1)))
+        return sorted(seqs)
+
+    def _append_path(self, seq):
+        return os.path.join(self.appends_dir, f'{seq:012d}.seg')
+
+    def _append_segments(self, after_seq=-1):
+        for seq in self._append_seqs():
+            if seq > after_seq:
+                segment = self._open(self._append_path(seq))
+                if segment is not None:
+                    # Appends are numbered by file name when they are published
+                    segment.seq = seq
+                    yield segment
+
+    def read(self, coin_id, start=None, end=None):
+        """Columns for start <= timestamp < end; a single-segment read is a zero-copy view"""
+        start = None if start is None else to_micros(start)
+        end = None if end is None else to_micros(end)
+        base = self._open(self._coin_path(coin_id))
+        parts = [base.coin_columns(coin_id, start, end)] if base is not None else []
+        for segment in self._append_segments(base.seq if base is not None else -1):
+            if coin_id in segment.index:
+                parts.append(segment.coin_columns(coin_id, start, end))
+
+        parts = [part for part in parts if len(part[0])] or parts[:1]
+        if not parts:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        columns = [np.concatenate(values) for values in zip(*parts)]
+        if np.any(np.diff(columns[0]) < 0):
+            order = np.argsort(columns[0], kind='stable')
+            columns = [values[order] for values in columns]
+        return columns
+
+    def series(self, coin_id, start=None, end=None):
+        columns = self.read(coin_id, start, end)
+        return None if columns is None else as_series(columns)
+
+    def coin_ids(self):
+        coins = {unquote(name[:-4]) for name in os.listdir(self.coins_dir) if name.endswith('.seg')}
+        for segment in self._append_segments():
+            coins.update(segment.index)
+        return sorted(coins)
+
+    def __getitem__(self, coin_id):
+        series = self.series(coin_id)
+        if series is None:
+            raise KeyError(coin_id)
+        return series
+
+    def __iter__(self):
+        return iter(self.coin_ids())
+
+    def __len__(self):
+        return len(self.coin_ids())
+
+    # Writing
+
+    def _publish(self, tmp_path):
+        """Link a finished segment to the next free sequence number"""
+        seqs = self._append_seqs()
+        seq = (seqs[-1] if seqs else self._max_coin_seq()) + 1
+        while True:
+            path = self._append_path(seq)
+            try:
+                os.link(tmp_path, path)
+                break
+            except FileExistsError:
+                seq += 1
+        os.remove(tmp_path)
+        return seq, path
+
+    def _max_coin_seq(self):
+        max_seq = 0
+        for name in os.listdir(self.coins_dir):
+            if name.endswith('.seg'):
+                segment = self._open(os.path.join(self.coins_dir, name))
+                if segment is not None:
+                    max_seq = max(max_seq, segment.seq)
+        return max_seq
+
+    def writer(self):
+        return PriceStoreWriter(self)
+
+    def append(self, rows):
+        """Append (coin_id, timestamp, price, market_cap, volume, change_24h) rows as one segment"""
+        writer = self.writer()
+        writer.add(rows)
+        return writer.commit()
+
+    def compact(self):
+        """Fold every append segment into the per-coin segments, then drop the appends"""
+        seqs = self._append_seqs()
+        if not seqs:
+            return 0
+        through = seqs[-1]
+        segments = [segment for segment in self._append_segments() if segment.seq <= through]
+        coins = set()
+        for segment in segments:
+            coins.update(segment.index)
+
+        for coin_id in coins:
+            base = self._open(self._coin_path(coin_id))
+            if base is not None and base.seq >= through:
+                continue
+            parts = [base.coin_columns(coin_id)] if base is not None else []
+            for segment in segments:
+                if coin_id in segment.index and (base is None or segment.seq > base.seq):
+                    parts.append(segment.coin_columns(coin_id))
+            columns = [np.concatenate(values) for values in zip(*parts)]
+            order = np.argsort(columns[0], kind='stable')
+
+            path = self._coin_path(coin_id)
+            tmp_path = f'{path}.tmp'
+            write_segment(tmp_path, through, {coin_id: [0, len(order)]}, [values[order] for values in columns])
+            os.replace(tmp_path, path)
+
+        # Only remove appends once every coin they touch has a covering base segment
+        for segment in segments:
+            os.remove(segment.path)
+        self._segments = {}
+        print_debug(f"Compacted {len(segments)} price store segments for {len(coins)} coins")
+        return len(segments)
+
+    def maybe_compact(self, threshold=None):
+        if threshold is None:
+            threshold = int(os.getenv('PRICE_STORE_COMPACT_AFTER', DEFAULT_COMPACT_AFTER))
+        if threshold and len(self._append_seqs()) >= threshold:
+            return self.compact()
+        return 0
+
+class PriceStoreWriter:
+    """Writes segments to temporary files and publishes them only on commit"""
+
+    def __init__(self, store):
+        self.store = store
+        self._pending = []
+
+    def add(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        coin_ids = [row[0] for row in rows]
+        columns = [np.array([to_micros(row[1]) for row in rows], dtype=np.int64)]
+        for i in range(2, 6):
+            columns.append(np.array([np.nan if row[i] is None else row[i] for row in rows], dtype=float))
+        self._write(coin_ids, columns)
+
+    def add_batch(self, batch, timestamp):
+        """Stage a PriceBatch sharing one timestamp, reading its columns without per-row conversion"""
+        if not len(batch):
+            return
+        columns = [np.full(len(batch), to_micros(timestamp), dtype=np.int64)]
+        for name in ('price_usd', 'market_cap_usd', 'volume_24h_usd', 'price_change_24h_pct'):
+            columns.append(batch.column(name))
+        self._write(batch.coin_ids, columns)
+
+    def _write(self, coin_ids, columns):
+        index, columns = build_segment_columns(coin_ids, columns)
+        tmp_path = os.path.join(self.store.appends_dir, f'.{os.getpid()}-{id(self)}-{len(self._pending)}.tmp')
+        write_segment(tmp_path, 0, index, columns)
+        self._pending.append(tmp_path)
+
+    def commit(self):
+        published = [self.store._publish(tmp_path)[0] for tmp_path in self._pending]
+        self._pending = []
+        return published
+
+    def abort(self):
+        for tmp_path in self._pending:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+        self._pending = []
+
+def get_price_store():
+    """Open the store named by PRICE_STORE_DIR, or return None when the local copy is disabled"""
+    root = os.getenv('PRICE_STORE_DIR')
+    if not root:
+        return None
+    return PriceStore(root)
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Inspect or compact the local price store')
+    parser.add_argument('command', choices=['info', 'compact', 'bench'])
+    parser.add_argument('--root', default=os.getenv('PRICE_STORE_DIR'), required=not os.getenv('PRICE_STORE_DIR'))
+    args = parser.parse_args()
+
+    store = PriceStore(args.root)
+    if args.command == 'compact':
+        store.compact()
+    elif args.command == 'info':
+        coins = store.coin_ids()
+        rows = sum(len(store.read(coin_id)[0]) for coin_id in coins)
+        print(f"{len(coins)} coins, {rows:,} rows, {len(store._append_seqs())} append segments")
+    else:
+        # Time a one-day range read per coin against the warm segment cache
+        coins = store.coin_ids()
+        for coin_id in coins:
+            store.read(coin_id)
+        start = time.perf_counter()
+        for coin_id in coins:
+            end = store.read(coin_id)[0][-1]
+            store.read(coin_id, end - 86_400_000_000, end + 1)
+        elapsed = time.perf_counter() - start
+        print(f"{len(coins)} range reads in {elapsed * 1000:.1f} ms ({elapsed / max(len(coins), 1) * 1e6:.1f} µs per read)")
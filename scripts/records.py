@@ -0,0 +1,249 @@
+"""Compact record types for sync payloads.
+
+Holdings become Holding tuples in HOLDINGS column order, so they are
+inserted as they are. Prices become a PriceBatch: coin ids in a list and
+each numeric field in an array('d'). A payload of 100k prices is then a
+handful of objects rather than 100k dicts, and every row of a sync is
+written from the same columns.
+
+Payloads are validated in one pass that reports every bad record rather
+than stopping at the first. The common all-valid case is checked with
+bulk conversions in C; only a payload that fails them is walked row by
+row to find and describe the bad records.
+
+NumPy is optional: PriceBatch.column() wraps a field as an ndarray without
+copying, for callers that already use it.
+
+Holdings belong to a portfolio (HOLDINGS.PORTFOLIO_ID); prices are shared by
+all of them.
+"""
+import math
+import os
+from array import array
+from collections import namedtuple
+from itertools import repeat
+
+REQUIRED_HOLDING_FIELDS = ('coin_id', 'symbol', 'name', 'amount')
+REQUIRED_PRICE_FIELDS = ('coin_id', 'price_usd')
+# Numeric price fields in PRICES column order; missing optional ones default to 0
+PRICE_FIELDS = ('price_usd', 'market_cap_usd', 'volume_24h_usd', 'price_change_24h_pct')
+MAX_REPORTED_ERRORS = 20
+DEFAULT_PORTFOLIO_ID = 'default'
+
+Holding = namedtuple('Holding', ['coin_id', 'symbol', 'name', 'amount', 'category'])
+
+class ValidationError(ValueError):
+    """Every invalid record of a payload; `errors` holds (kind, index, message) tuples"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        shown = '; '.join(f"{kind} {index}: {message}" for kind, index, message in errors[:MAX_REPORTED_ERRORS])
+        more = len(errors) - MAX_REPORTED_ERRORS
+        super().__init__(f"{len(errors)} invalid records: {shown}" + (f" (and {more} more)" if more > 0 else ""))
+
+def get_portfolio_id():
+    """The portfolio synced or analysed when none is given"""
+    return os.getenv('PORTFOLIO_ID') or DEFAULT_PORTFOLIO_ID
+
+def check_portfolio_id(portfolio_id):
+    if not isinstance(portfolio_id, str) or not portfolio_id.strip():
+        raise ValueError(f"Invalid portfolio_id: {portfolio_id!r}")
+    return portfolio_id
+
+def _number(value):
+    """float(value) for numbers and numeric strings, else None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+def holding_error(record):
+    """Why a holding record is invalid, or None"""
+    if isinstance(record, Holding):
+        return None
+    if not isinstance(record, dict):
+        return "not an object"
+    missing = [field for field in REQUIRED_HOLDING_FIELDS if field not in record]
+    if missing:
+        return f"missing required fields {missing}"
+    if not isinstance(record['coin_id'], str):
+        return "coin_id is not a string"
+    amount = _number(record['amount'])
+    if amount is None or not math.isfinite(amount):
+        return f"amount is not a number: {record['amount']!r}"
+    return None
+
+def price_error(record):
+    """Why a price record is invalid, or None. Optional fields may be null."""
+    if not isinstance(record, dict):
+        return "not an object"
+    missing = [field for field in REQUIRED_PRICE_FIELDS if field not in record]
+    if missing:
+        return f"missing required fields {missing}"
+    if not isinstance(record['coin_id'], str):
+        return "coin_id is not a string"
+    price = _number(record['price_usd'])
+    if price is None or not math.isfinite(price) or price < 0:
+        return f"price_usd is not a non-negative number: {record['price_usd']!r}"
+    for field in PRICE_FIELDS[1:]:
+        value = record.get(field)
+        if value is not None and _number(value) is None:
+            return f"{field} is not a number: {value!r}"
+    return None
+
+def to_holding(record):
+    if isinstance(record, Holding):
+        return record
+    return Holding(
+        record['coin_id'], record['symbol'], record['name'], _number(record['amount']),
+        record.get('category', 'Other')
+    )
+
+class PriceBatch:
+    """Prices sharing one sync timestamp, stored as columns.
+
+    Optional fields that were null are stored as NaN and come back as None
+    from rows(); `has_nulls` skips that translation when there are none.
+    """
+
+    __slots__ = ('coin_ids', 'price_usd', 'market_cap_usd', 'volume_24h_usd', 'price_change_24h_pct', 'has_nulls')
+
+    def __init__(self, coin_ids=(), price_usd=(), market_cap_usd=(), volume_24h_usd=(), price_change_24h_pct=(),
+                 has_nulls=False):
+        self.coin_ids = list(coin_ids)
+        self.price_usd = array('d', price_usd)
+        self.market_cap_usd = array('d', market_cap_usd)
+        self.volume_24h_usd = array('d', volume_24h_usd)
+        self.price_change_24h_pct = array('d', price_change_24h_pct)
+        self.has_nulls = has_nulls
+
+    def __len__(self):
+        return len(self.coin_ids)
+
+    @classmethod
+    def from_records(cls, records):
+        """Build from sync-style price dicts; raises ValidationError listing every bad record"""
+        records = records if isinstance(records, list) else list(records)
+        try:
+            coin_ids = [record['coin_id'] for record in records]
+            columns = [array('d', [record['price_usd'] for record in records])]
+            for field in PRICE_FIELDS[1:]:
+                columns.append(array('d', [record.get(field, 0) for record in records]))
+        except (KeyError, TypeError, AttributeError):
+            # A missing field, a null or a string somewhere: check row by row
+            return cls._from_checked_records(records)
+        prices = columns[0]
+        if records and not (set(map(type, coin_ids)) == {str} and min(prices) >= 0 and math.isfinite(sum(prices))):
+            return cls._from_checked_records(records)
+        # NaN in an optional field is a null; the finite-sum test above already excludes NaN prices
+        has_nulls = any(not math.isfinite(sum(column)) for column in columns[1:])
+        return cls(coin_ids, *columns, has_nulls=has_nulls)
+
+    @classmethod
+    def _from_checked_records(cls, records):
+        errors = [('price', index, message) for index, message in enumerate(map(price_error, records)) if message]
+        if errors:
+            raise ValidationError(errors)
+        batch = cls()
+        for record in records:
+            batch.append(record)
+        return batch
+
+    def append(self, record):
+        """Add one record that passed price_error()"""
+        self.coin_ids.append(record['coin_id'])
+        self.price_usd.append(_number(record['price_usd']))
+        for field in PRICE_FIELDS[1:]:
+            value = record.get(field, 0)
+            value = math.nan if value is None else _number(value)
+            if value != value:
+                self.has_nulls = True
+            getattr(self, field).append(value)
+
+    def rows(self, timestamp=None):
+        """Iterate (coin_id, timestamp, price, market_cap, volume, change) tuples in PRICES column order.
+
+        Rows are built as they are consumed, so a chunked insert holds one chunk of tuples at a time.
+        """
+        optional = (self.market_cap_usd, self.volume_24h_usd, self.price_change_24h_pct)
+        if self.has_nulls:
+            optional = [(None if value != value else value for value in column) for column in optional]
+        return zip(self.coin_ids, repeat(timestamp), self.price_usd, *optional)
+
+    def select(self, indices):
+        """A new batch of the rows at `indices`"""
+        return PriceBatch(
+            [self.coin_ids[i] for i in indices],
+            *([column[i] for i in indices] for column in self._columns()),
+            has_nulls=self.has_nulls
+        )
+
+    @classmethod
+    def merge(cls, batches):
+        """One batch with each coin of `batches` once; a coin's last row wins"""
+        latest = {}
+        for batch in batches:
+            for index, coin_id in enumerate(batch.coin_ids):
+                latest[coin_id] = (batch, index)
+        merged = cls(latest, has_nulls=any(batch.has_nulls for batch in batches))
+        for field in PRICE_FIELDS:
+            getattr(merged, field).extend(getattr(batch, field)[index] for batch, index in latest.values())
+        return merged
+
+    def _columns(self):
+        return self.price_usd, self.market_cap_usd, self.volume_24h_usd, self.price_change_24h_pct
+
+    def column(self, name):
+        """A numeric field as a float64 ndarray sharing the batch's memory"""
+        import numpy as np
+
+        return np.frombuffer(getattr(self, name), dtype=np.float64)
+
+def as_price_batch(prices):
+    """Pass a PriceBatch through; build one from an iterable of price dicts"""
+    return prices if isinstance(prices, PriceBatch) else PriceBatch.from_records(prices)
+
+def parse_holdings(records):
+    """Holding tuples from holding dicts; raises ValidationError listing every bad record"""
+    try:
+        holdings = [
+            Holding(record['coin_id'], record['symbol'], record['name'], float(record['amount']),
+                    record.get('category', 'Other'))
+            for record in records
+        ]
+    except (KeyError, TypeError, AttributeError, ValueError):
+        holdings = None
+    if holdings is not None and (not holdings or (
+        set(map(type, (holding.coin_id for holding in holdings))) == {str}
+        and math.isfinite(sum(holding.amount for holding in holdings))
+    )):
+        return holdings
+
+    errors = [('holding', index, message) for index, message in enumerate(map(holding_error, records)) if message]
+    if errors:
+        raise ValidationError(errors)
+    return [to_holding(record) for record in records]
+
+def parse_payload(data):
+    """(holdings, PriceBatch) from a sync payload, reporting the bad records of both lists together.
+
+    "prices" may already be a PriceBatch.
+    """
+    holdings = data.get('holdings', [])
+    prices = data.get('prices', [])
+    errors = []
+    try:
+        holdings = parse_holdings(holdings)
+    except ValidationError as e:
+        errors.extend(e.errors)
+    try:
+        prices = as_price_batch(prices)
+    except ValidationError as e:
+        errors.extend(e.errors)
+    if errors:
+        raise ValidationError(errors)
+    return holdings, prices
@@ -0,0 +1,81 @@
+"""Retention for raw price ticks.
+
+PRICES keeps the last PRICE_RETENTION_DAYS days of raw ticks (default 90).
+Older ticks are archived into the compacted history tables, and then
+deleted:
+- HOURLY_OHLC and DAILY_OHLC hold one row per coin and bucket
+- LATEST_PRICES keeps the last price of coins with no recent ticks
+
+The cutoff is a UTC day boundary, so no rollup bucket is split between
+raw and archived ticks. The longest analytics window over raw PRICES is 31
+days, so retention below MIN_RETENTION_DAYS is refused.
+
+    python scripts/retention.py [--days N] [--dry-run]
+"""
+import os
+from datetime import datetime, timedelta
+
+from latest_prices import backfill_latest_prices
+from rollups import ROLLUPS, backfill_rollups
+
+DEFAULT_RETENTION_DAYS = 90
+MIN_RETENTION_DAYS = 32
+
+def get_retention_days():
+    return int(os.getenv('PRICE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+
+def retention_cutoff(days, now=None):
+    if days < MIN_RETENTION_DAYS:
+        raise ValueError(f"Retention of {days} days is shorter than the {MIN_RETENTION_DAYS} days the views read")
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return cutoff.isoformat()
+
+def archive_prices(cur, cutoff, dry_run=False):
+    """Compact PRICES rows older than `cutoff` into the history tables and delete them"""
+    cur.execute("SELECT COUNT(*) FROM PRICES WHERE TIMESTAMP < %s", [cutoff])
+    count = cur.fetchone()[0]
+    result = {'cutoff': cutoff, 'rows_archived': count, 'rollup_rows': {}, 'latest_prices': None}
+    if not count or dry_run:
+        return result
+
+    result['latest_prices'] = backfill_latest_prices(cur, before=cutoff)
+    result['rollup_rows'] = backfill_rollups(cur, before=cutoff)
+    cur.execute("DELETE FROM PRICES WHERE TIMESTAMP < %s", [cutoff])
+    return result
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from analytics_cache import get_data_versions
+    from connection_pool import get_pool
+
+    parser = argparse.ArgumentParser(description='Archive raw price ticks older than the retention window')
+    parser.add_argument('--days', type=int, default=None, help='days of raw ticks to keep (default PRICE_RETENTION_DAYS)')
+    parser.add_argument('--dry-run', action='store_true', help='only count the rows that would be archived')
+    args = parser.parse_args()
+
+    cutoff = retention_cutoff(args.days if args.days is not None else get_retention_days())
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN")
+            result = archive_prices(cur, cutoff, args.dry_run)
+            cur.execute("COMMIT")
+        except Exception as e:
+            cur.execute("ROLLBACK")
+            print(f"❌ Error archiving prices: {str(e)}")
+            raise
+        finally:
+            cur.close()
+
+    if result['rows_archived'] and not args.dry_run:
+        versions = get_data_versions()
+        versions.begin()
+        # Archiving folds the rows into LATEST_PRICES and the rollups before deleting them
+        versions.touch('PRICES', 'LATEST_PRICES', *(rollup.table for rollup in ROLLUPS))
+        versions.commit()
+    verb = 'Would archive' if args.dry_run else 'Archived'
+    print(f"✅ {verb} {result['rows_archived']} price rows older than {cutoff}")
+    print(json.dumps(result, indent=2, default=str))
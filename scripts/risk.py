@@ -0,0 +1,358 @@
+"""Portfolio risk over daily closes, computed with NumPy.
+
+Daily closes (from DAILY_OHLC, or a PriceHistory) are scattered into one
+dates x coins matrix. Prices are carried forward over missing days after
+each coin's first close, so a gap day counts as a zero return and a coin
+has no returns before it first traded. From the returns matrix, in one set
+of array operations:
+- pairwise-complete covariance and correlation: each pair uses only the
+  days on which both coins have a return
+- position-weighted portfolio volatility and each coin's contribution to it
+- historical and parametric (normal) VaR and CVaR, per coin and for the
+  portfolio, as positive loss fractions
+- peak-to-trough drawdown curves and maximum drawdowns
+
+The portfolio series applies today's position weights to every historical
+day, which is the usual basis for VaR of the current portfolio.
+"""
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+from local_analytics import daily_ohlc, normalize_holdings
+
+PERIODS_PER_YEAR = 365
+DEFAULT_CONFIDENCES = (0.95, 0.99)
+
+DAILY_CLOSES_SQL = """
+SELECT COIN_ID, DATE, CLOSE_PRICE
+FROM DAILY_OHLC
+{where}
+ORDER BY COIN_ID, DATE
+"""
+
+ReturnsMatrix = namedtuple('ReturnsMatrix', ['coins', 'dates', 'prices', 'returns', 'valid'])
+Covariance = namedtuple('Covariance', ['cov', 'corr', 'counts'])
+
+def _factorize(values):
+    """(sorted unique values, index of each value) without sorting every value.
+
+    Warehouse rows arrive ordered by coin, so only the first value of each
+    run of equal values is looked up.
+    """
+    if len(values) == 0:
+        return np.array([], dtype=str), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+    uniques, run_index = np.unique(values[starts].astype(str), return_inverse=True)
+    return uniques, np.repeat(run_index, np.diff(np.append(starts, len(values))))
+
+def _day_index(dates):
+    """(sorted distinct days, index of each date) by marking days on the calendar span"""
+    if len(dates) == 0:
+        return dates, np.zeros(0, dtype=np.int64)
+    first = dates.min()
+    offsets = (dates - first).astype(np.int64)
+    present = np.zeros(offsets.max() + 1, dtype=bool)
+    present[offsets] = True
+    return first + np.flatnonzero(present), np.cumsum(present)[offsets] - 1
+
+def returns_matrix(coin_ids, dates, closes):
+    """Align (coin_id, date, close) columns into a ReturnsMatrix.
+
+    prices is dates x coins with closes carried forward; returns[t] is the
+    simple return from t-1 to t and valid marks where it is defined.
+    """
+    coin_ids = np.asarray(coin_ids, dtype=object)
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    closes = np.asarray(closes, dtype=float)
+    keep = ~np.isnan(closes)
+    coins, coin_index = _factorize(coin_ids[keep])
+    days, day_index = _day_index(dates[keep])
+
+    raw = np.full((len(days), len(coins)), np.nan)
+    raw[day_index, coin_index] = closes[keep]
+
+    # Carry the last close forward: index of the latest observed row at or before each row
+    observed = ~np.isnan(raw)
+    rows = np.where(observed, np.arange(len(days))[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    prices = raw[rows, np.arange(len(coins))]
+    prices[~np.maximum.accumulate(observed, axis=0)] = np.nan
+
+    returns = np.full_like(prices, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns[1:] = prices[1:] / prices[:-1] - 1
+    valid = np.isfinite(returns)
+    returns[~valid] = np.nan
+    return ReturnsMatrix(coins, days, prices, returns, valid)
+
+def returns_from_history(history):
+    """ReturnsMatrix from a local_analytics.PriceHistory, using the last price of each day"""
+    coin_ids, dates, closes = [], [], []
+    for coin_id, series in history.items():
+        days, _, _, _, close, _, _ = daily_ohlc(series)
+        coin_ids.append(np.full(len(days), coin_id, dtype=object))
+        dates.append(days)
+        closes.append(close)
+    if not coin_ids:
+        return returns_matrix([], [], [])
+    return returns_matrix(np.concatenate(coin_ids), np.concatenate(dates), np.concatenate(closes))
+
+def load_returns(cur, days=None):
+    """ReturnsMatrix from DAILY_OHLC, optionally limited to the last `days` days"""
+    where = f"WHERE DATE >= DATEADD(day, -{int(days)}, CURRENT_DATE())" if days else ""
+    cur.execute(DAILY_CLOSES_SQL.format(where=where))
+    rows = cur.fetchall()
+    if not rows:
+        return returns_matrix([], [], [])
+    coin_ids, dates, closes = zip(*rows)
+    dates = [str(date)[:10] for date in dates]
+    closes = [np.nan if close is None else close for close in closes]
+    return returns_matrix(coin_ids, dates, closes)
+
+def covariance(matrix):
+    """Pairwise-complete sample covariance and correlation of the returns (NaN below two shared days)"""
+    valid = matrix.valid
+    x = np.where(valid, matrix.returns, 0.0)
+
+    # Entry [i, j] of counts, sums and squares covers coin i over the days coin j has a return.
+    # For a coin j with a return on every day any coin has one, that is all of coin i's days,
+    # so only the columns of coins listed later (or with undefined returns) need a matrix product.
+    partial = ~valid[valid.any(axis=1)].all(axis=0)
+    mask = valid[:, partial].astype(float)
+    # Day counts are small integers, exact in float32 and twice as fast to multiply
+    mask32 = mask.astype(np.float32)
+    counts = np.repeat(np.count_nonzero(valid, axis=0).astype(float)[:, None], len(partial), axis=1)
+    sums = np.repeat(x.sum(axis=0)[:, None], len(partial), axis=1)
+    squares = np.repeat((x * x).sum(axis=0)[:, None], len(partial), axis=1)
+    if partial.any():
+        counts[:, partial] = valid.T.astype(np.float32) @ mask32
+        sums[:, partial] = x.T @ mask
+        squares[:, partial] = (x * x).T @ mask
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centered = sums * sums.T
+        centered /= counts
+        np.subtract(x.T @ x, centered, out=centered)
+        cov = centered / (counts - 1)
+        sums *= sums
+        sums /= counts
+        squares -= sums
+        scale = squares * squares.T
+        np.sqrt(scale, out=scale)
+        corr = np.divide(centered, scale, out=scale)
+    too_few = counts < 2
+    cov[too_few] = np.nan
+    corr[too_few] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    return Covariance(cov, corr, counts.astype(np.int64))
+
+def _sorted_returns(returns):
+    """Returns sorted down each column (NaN last), with the count and running sum of the defined ones"""
+    ordered = np.sort(returns, axis=0)
+    counts = np.count_nonzero(~np.isnan(ordered), axis=0)
+    return ordered, counts, np.cumsum(np.nan_to_num(ordered), axis=0)
+
+def _tail_losses(ordered, counts, running, confidence):
+    # Linear interpolation between order statistics, as np.quantile does by default
+    columns = np.arange(ordered.shape[1])
+    position = np.maximum(counts - 1, 0) * (1 - confidence)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, np.maximum(counts - 1, 0))
+    quantile = ordered[low, columns] + (ordered[high, columns] - ordered[low, columns]) * (position - low)
+    in_tail = np.count_nonzero(ordered <= quantile, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cvar = -running[np.maximum(in_tail - 1, 0), columns] / in_tail
+    empty = counts == 0
+    quantile[empty] = np.nan
+    cvar[empty] = np.nan
+    return -quantile, cvar
+
+def historical_var(returns, confidence):
+    """(VaR, CVaR) as positive losses from the empirical return distribution, per column"""
+    returns = np.asarray(returns, dtype=float)
+    column = returns.ndim == 1
+    if column:
+        returns = returns[:, None]
+    if not len(returns):
+        var = cvar = np.full(returns.shape[1], np.nan)
+    else:
+        var, cvar = _tail_losses(*_sorted_returns(returns), confidence)
+    return (var[0], cvar[0]) if column else (var, cvar)
+
+def parametric_var(mean, std, confidence):
+    """(VaR, CVaR) as positive losses for normally distributed returns"""
+    normal = NormalDist()
+    z = normal.inv_cdf(1 - confidence)
+    var = -(mean + z * std)
+    cvar = -(mean - std * normal.pdf(z) / (1 - confidence))
+    return var, cvar
+
+def drawdowns(values):
+    """Drawdown from the running peak (<= 0) for each column, and the maximum drawdown per column"""
+    if not len(values):
+        return values, np.full(values.shape[1:], np.nan)
+    peaks = np.fmax.accumulate(values, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        curve = values / peaks - 1
+    # Columns without a single value have no drawdown
+    worst = np.fmin.reduce(curve, axis=0)
+    return curve, np.abs(worst)
+
+def portfolio_weights(matrix, holdings):
+    """Position weights by current value, aligned to matrix.coins; returns (weights, values, missing coin_ids)"""
+    index = {coin: i for i, coin in enumerate(matrix.coins)}
+    last_prices = matrix.prices[-1] if len(matrix.dates) else np.zeros(len(matrix.coins))
+    values = np.zeros(len(matrix.coins))
+    missing = []
+    for holding in normalize_holdings(holdings):
+        i = index.get(holding.coin_id)
+        if i is None or np.isnan(last_prices[i]):
+            missing.append(holding.coin_id)
+            continue
+        values[i] += float(holding.amount) * last_prices[i]
+    total = values.sum()
+    weights = values / total if total else values
+    return weights, values, missing
+
+def _nan_stats(returns):
+    """Per-column mean and sample standard deviation of the defined returns"""
+    counts = np.count_nonzero(~np.isnan(returns), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(returns, axis=0) / counts
+        std = np.sqrt(np.nansum((returns - mean) ** 2, axis=0) / (counts - 1))
+    std[counts < 2] = np.nan
+    return mean, std
+
+def portfolio_risk(matrix, holdings, confidences=DEFAULT_CONFIDENCES, periods_per_year=PERIODS_PER_YEAR,
+                   risk_free_rate=0.0):
+    """Risk of the held portfolio and its coins; see the module docstring for the conventions"""
+    holdings = normalize_holdings(holdings)
+    weights, values, missing = portfolio_weights(matrix, holdings)
+    stats = covariance(matrix)
+
+    # Held coins only; a pair without two shared days contributes no covariance
+    held = weights > 0
+    cov_held = np.nan_to_num(stats.cov[np.ix_(held, held)])
+    w = weights[held]
+    marginal = cov_held @ w
+    variance = float(w @ marginal)
+    volatility = float(np.sqrt(variance)) if variance > 0 else 0.0
+    contributions = np.zeros(len(weights))
+    if volatility:
+        contributions[held] = w * marginal / volatility
+
+    portfolio_returns = np.where(matrix.valid, matrix.returns, 0.0) @ weights
+    any_held = matrix.valid[:, held].any(axis=1) if held.any() else np.zeros(len(matrix.dates), dtype=bool)
+    portfolio_returns = portfolio_returns[any_held]
+    wealth = np.cumprod(1 + portfolio_returns)
+    portfolio_curve, portfolio_drawdown = drawdowns(np.concatenate(([1.0], wealth))[:, None])
+
+    coin_mean, coin_std = _nan_stats(matrix.returns)
+    coin_curves, coin_drawdowns = drawdowns(matrix.prices)
+    portfolio_mean = float(portfolio_returns.mean()) if len(portfolio_returns) else np.nan
+
+    # Sort each coin's returns once for every confidence level
+    coin_sorted = _sorted_returns(matrix.returns)
+    var = {}
+    for confidence in confidences:
+        coin_hist = _tail_losses(*coin_sorted, confidence) if len(matrix.dates) else historical_var(matrix.returns, confidence)
+        var[confidence] = {
+            'historical': tuple(float(v) for v in historical_var(portfolio_returns, confidence)),
+            'parametric': tuple(float(v) for v in parametric_var(portfolio_mean, volatility, confidence)),
+            'coin_historical': coin_hist,
+            'coin_parametric': parametric_var(coin_mean, coin_std, confidence),
+        }
+
+    sharpe = np.nan
+    if volatility:
+        sharpe = (portfolio_mean * periods_per_year - risk_free_rate) / (volatility * np.sqrt(periods_per_year))
+
+    categories = sorted({h.category for h in holdings if h.coin_id not in missing})
+    category_index = {h.coin_id: categories.index(h.category) for h in holdings if h.coin_id not in missing}
+    by_category = np.zeros((len(weights), len(categories)))
+    for i, coin in enumerate(matrix.coins):
+        if coin in category_index and weights[i] > 0:
+            by_category[i, category_index[coin]] = weights[i]
+    # Volatility of each category's slice of the portfolio, as a fraction of that slice
+    category_weight = by_category.sum(axis=0)
+    category_variance = np.einsum('ik,ik->k', np.nan_to_num(stats.cov) @ by_category, by_category)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        category_volatility = np.sqrt(np.maximum(category_variance, 0)) / category_weight
+
+    return {
+        'coins': matrix.coins,
+        'dates': matrix.dates,
+        'weights': weights,
+        'position_values': values,
+        'missing': missing,
+        'covariance': stats.cov,
+        'correlation': stats.corr,
+        'volatility': volatility,
+        'annualized_volatility': volatility * np.sqrt(periods_per_year),
+        'risk_contributions': contributions,
+        'sharpe_ratio': float(sharpe),
+        'var': var,
+        'portfolio_returns': portfolio_returns,
+        'portfolio_drawdown_curve': portfolio_curve[:, 0],
+        'max_drawdown': float(portfolio_drawdown[0]),
+        'coin_volatility': coin_std,
+        'coin_drawdown_curves': coin_curves,
+        'coin_max_drawdowns': coin_drawdowns,
+        'categories': categories,
+        'category_weights': category_weight,
+        'category_volatility': category_volatility,
+    }
+
+def summary(report, top=10):
+    """JSON-friendly subset of a portfolio_risk() report"""
+    order = np.argsort(-report['risk_contributions'])[:top]
+    return {
+        'coins': len(report['coins']),
+        'days': len(report['dates']),
+        'missing': report['missing'],
+        'daily_volatility': report['volatility'],
+        'annualized_volatility': report['annualized_volatility'],
+        'sharpe_ratio': report['sharpe_ratio'],
+        'max_drawdown': report['max_drawdown'],
+        'var': {
+            f"{confidence:.0%}": {
+                'historical_var': values['historical'][0],
+                'historical_cvar': values['historical'][1],
+                'parametric_var': values['parametric'][0],
+                'parametric_cvar': values['parametric'][1],
+            }
+            for confidence, values in report['var'].items()
+        },
+        'categories': {
+            category: {'weight': float(weight), 'volatility': float(volatility)}
+            for category, weight, volatility in zip(
+                report['categories'], report['category_weights'], report['category_volatility'])
+        },
+        'top_risk_contributors': {
+            str(report['coins'][i]): float(report['risk_contributions'][i])
+            for i in order if report['risk_contributions'][i] > 0
+        },
+    }
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from connection_pool import get_pool
+    from local_analytics import load_holdings
+
+    parser = argparse.ArgumentParser(description='Portfolio risk from DAILY_OHLC closes and current holdings')
+    parser.add_argument('--portfolio', help='portfolio to analyse (default PORTFOLIO_ID)')
+    parser.add_argument('--days', type=int, default=365, help='days of daily closes to use (0 for all)')
+    args = parser.parse_args()
+
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        try:
+            matrix = load_returns(cur, args.days)
+            holdings = load_holdings(cur, args.portfolio)
+        finally:
+            cur.close()
+    print(json.dumps(summary(portfolio_risk(matrix, holdings)), indent=2, default=float))
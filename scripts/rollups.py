@@ -0,0 +1,299 @@
+"""Daily and hourly OHLC rollups of PRICES.
+
+DAILY_OHLC and HOURLY_OHLC hold one row per coin and bucket with the
+open/high/low/close price and the sums needed for averages. The sync
+path folds each batch of new price rows into the rollups for the
+coin-buckets it touched. The DAILY_PRICE_ANALYSIS and VOLATILITY_ANALYSIS
+views read DAILY_OHLC instead of re-deriving days from raw PRICES.
+`python scripts/rollups.py backfill` rebuilds both tables from PRICES,
+keeping buckets whose raw ticks were archived by the retention job.
+"""
+import os
+from collections import namedtuple
+from datetime import datetime
+
+from price_dedup import to_micros
+
+ROLLUP_COLUMNS = (
+    'COIN_ID', '{bucket}', 'OPEN_PRICE', 'HIGH_PRICE', 'LOW_PRICE', 'CLOSE_PRICE',
+    'OPEN_TIMESTAMP', 'CLOSE_TIMESTAMP', 'PRICE_SUM', 'PRICE_COUNT', 'VOLUME_SUM', 'VOLUME_COUNT'
+)
+
+ROLLUP_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    COIN_ID STRING NOT NULL,
+    {bucket} TIMESTAMP_NTZ NOT NULL,
+    OPEN_PRICE FLOAT,
+    HIGH_PRICE FLOAT,
+    LOW_PRICE FLOAT,
+    CLOSE_PRICE FLOAT,
+    OPEN_TIMESTAMP TIMESTAMP_NTZ,
+    CLOSE_TIMESTAMP TIMESTAMP_NTZ,
+    PRICE_SUM FLOAT,
+    PRICE_COUNT NUMBER,
+    VOLUME_SUM FLOAT,
+    VOLUME_COUNT NUMBER,
+    PRIMARY KEY (COIN_ID, {bucket})
+)
+"""
+
+ROLLUP_BACKFILL_SQL = """
+INSERT INTO {table} ({columns})
+SELECT
+    COIN_ID,
+    BUCKET,
+    MAX(CASE WHEN row_num_asc = 1 THEN PRICE_USD END),
+    MAX(PRICE_USD),
+    MIN(PRICE_USD),
+    MAX(CASE WHEN row_num_desc = 1 THEN PRICE_USD END),
+    MIN(TIMESTAMP),
+    MAX(TIMESTAMP),
+    SUM(PRICE_USD),
+    COUNT(PRICE_USD),
+    SUM(VOLUME_24H_USD),
+    COUNT(VOLUME_24H_USD)
+FROM (
+    SELECT
+        COIN_ID,
+        DATE_TRUNC('{unit}', TIMESTAMP) as BUCKET,
+        TIMESTAMP,
+        PRICE_USD,
+        VOLUME_24H_USD,
+        ROW_NUMBER() OVER (PARTITION BY COIN_ID, DATE_TRUNC('{unit}', TIMESTAMP) ORDER BY TIMESTAMP) as row_num_asc,
+        ROW_NUMBER() OVER (PARTITION BY COIN_ID, DATE_TRUNC('{unit}', TIMESTAMP) ORDER BY TIMESTAMP DESC) as row_num_desc
+    FROM PRICES
+    {where}
+)
+GROUP BY COIN_ID, BUCKET
+"""
+
+# Folds a batch of aggregated rows into a rollup table in one statement, so
+# concurrent writers touching the same coin-bucket each add their rows. The
+# COALESCEs keep one side's extreme or sum when the other is NULL, like SUM()
+ROLLUP_MERGE_SQL = """
+MERGE INTO {table} t
+USING ({source}) s
+ON t.COIN_ID = s.COIN_ID AND t.{bucket} = s.{bucket}
+WHEN MATCHED THEN UPDATE SET
+    OPEN_PRICE = CASE WHEN s.OPEN_TIMESTAMP < t.OPEN_TIMESTAMP THEN s.OPEN_PRICE ELSE t.OPEN_PRICE END,
+    HIGH_PRICE = GREATEST(COALESCE(t.HIGH_PRICE, s.HIGH_PRICE), COALESCE(s.HIGH_PRICE, t.HIGH_PRICE)),
+    LOW_PRICE = LEAST(COALESCE(t.LOW_PRICE, s.LOW_PRICE), COALESCE(s.LOW_PRICE, t.LOW_PRICE)),
+    CLOSE_PRICE = CASE WHEN s.CLOSE_TIMESTAMP >= t.CLOSE_TIMESTAMP THEN s.CLOSE_PRICE ELSE t.CLOSE_PRICE END,
+    OPEN_TIMESTAMP = LEAST(t.OPEN_TIMESTAMP, s.OPEN_TIMESTAMP),
+    CLOSE_TIMESTAMP = GREATEST(t.CLOSE_TIMESTAMP, s.CLOSE_TIMESTAMP),
+    PRICE_SUM = COALESCE(t.PRICE_SUM + s.PRICE_SUM, t.PRICE_SUM, s.PRICE_SUM),
+    PRICE_COUNT = t.PRICE_COUNT + s.PRICE_COUNT,
+    VOLUME_SUM = COALESCE(t.VOLUME_SUM + s.VOLUME_SUM, t.VOLUME_SUM, s.VOLUME_SUM),
+    VOLUME_COUNT = t.VOLUME_COUNT + s.VOLUME_COUNT
+WHEN NOT MATCHED THEN INSERT ({columns}) VALUES ({values})
+"""
+
+# Source rows in ROLLUP_COLUMNS order; the timestamps are bound as ISO strings
+ROLLUP_SOURCE_SQL = """
+    SELECT
+        column1 AS COIN_ID,
+        TO_TIMESTAMP_NTZ(column2) AS {bucket},
+        column3 AS OPEN_PRICE,
+        column4 AS HIGH_PRICE,
+        column5 AS LOW_PRICE,
+        column6 AS CLOSE_PRICE,
+        TO_TIMESTAMP_NTZ(column7) AS OPEN_TIMESTAMP,
+        TO_TIMESTAMP_NTZ(column8) AS CLOSE_TIMESTAMP,
+        column9 AS PRICE_SUM,
+        column10 AS PRICE_COUNT,
+        column11 AS VOLUME_SUM,
+        column12 AS VOLUME_COUNT
+    FROM (VALUES {values})
+"""
+
+Rollup = namedtuple('Rollup', ['table', 'bucket', 'unit'])
+
+ROLLUPS = (
+    Rollup('DAILY_OHLC', 'DATE', 'day'),
+    Rollup('HOURLY_OHLC', 'HOUR', 'hour'),
+)
+
+def rollup_columns(rollup):
+    return ', '.join(column.format(bucket=rollup.bucket) for column in ROLLUP_COLUMNS)
+
+def rollup_tables_sql():
+    return [ROLLUP_TABLE_SQL.format(table=rollup.table, bucket=rollup.bucket) for rollup in ROLLUPS]
+
+def get_rollups_enabled():
+    # The analytics views read DAILY_OHLC, so the rollups are maintained unless explicitly disabled
+    return os.getenv('SNOWFLAKE_SYNC_ROLLUPS', '1').lower() not in ('0', 'false', 'no')
+
+def bucket_start(timestamp, unit):
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp))
+    if unit == 'day':
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+    return timestamp.replace(minute=0, second=0, microsecond=0).isoformat()
+
+def extreme(pick, a, b):
+    if a is None or b is None:
+        return b if a is None else a
+    return pick(a, b)
+
+def add(a, b):
+    return b if a is None else a if b is None else a + b
+
+def combine(current, incoming):
+    """Merge two rollup rows (without COIN_ID and bucket) for the same coin-bucket"""
+    open_price, high, low, close, open_ts, close_ts, price_sum, price_count, volume_sum, volume_count = current
+    if to_micros(incoming[4]) < to_micros(open_ts):
+        open_price, open_ts = incoming[0], incoming[4]
+    if to_micros(incoming[5]) >= to_micros(close_ts):
+        close, close_ts = incoming[3], incoming[5]
+    return (
+        open_price,
+        extreme(max, high, incoming[1]),
+        extreme(min, low, incoming[2]),
+        close,
+        open_ts,
+        close_ts,
+        add(price_sum, incoming[6]),
+        price_count + incoming[7],
+        add(volume_sum, incoming[8]),
+        volume_count + incoming[9]
+    )
+
+def aggregate(rows, unit):
+    """Fold price rows (coin_id, timestamp, price, market_cap, volume, change) into {(coin_id, bucket): rollup}"""
+    buckets = {}
+    for coin_id, timestamp, price, _, volume, _ in rows:
+        key = (coin_id, bucket_start(timestamp, unit))
+        row = (
+            price, price, price, price, timestamp, timestamp,
+            price, int(price is not None), volume, int(volume is not None)
+        )
+        buckets[key] = combine(buckets[key], row) if key in buckets else row
+    return buckets
+
+def aggregate_batch(batch, timestamp, unit):
+    """aggregate() for a PriceBatch whose prices share `timestamp`, so the bucket is computed once"""
+    bucket = bucket_start(timestamp, unit)
+    buckets = {}
+    for coin_id, price, volume in zip(batch.coin_ids, batch.price_usd, batch.volume_24h_usd):
+        if volume != volume:
+            volume = None
+        row = (price, price, price, price, timestamp, timestamp, price, 1, volume, int(volume is not None))
+        key = (coin_id, bucket)
+        buckets[key] = combine(buckets[key], row) if key in buckets else row
+    return buckets
+
+def chunked_list(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def update_rollup(cur, rollup, buckets, batch_size):
+    """MERGE aggregated rows into the table, combining them with the coin-buckets already there"""
+    columns = rollup_columns(rollup)
+    rows = [key + values for key, values in buckets.items()]
+    row_values = '(' + ', '.join(['%s'] * len(ROLLUP_COLUMNS)) + ')'
+    for batch in chunked_list(rows, batch_size):
+        source = ROLLUP_SOURCE_SQL.format(bucket=rollup.bucket, values=', '.join([row_values] * len(batch)))
+        cur.execute(
+            ROLLUP_MERGE_SQL.format(
+                table=rollup.table, source=source, bucket=rollup.bucket, columns=columns,
+                values=', '.join(f's.{column.format(bucket=rollup.bucket)}' for column in ROLLUP_COLUMNS)
+            ),
+            [value for row in batch for value in row]
+        )
+    return len(rows)
+
+def fold_rollups(cur, aggregated, batch_size):
+    touched = {}
+    for rollup in ROLLUPS:
+        touched[rollup.table] = update_rollup(cur, rollup, aggregated(rollup.unit), batch_size)
+    return touched['DAILY_OHLC']
+
+def update_rollups(cur, rows, batch_size):
+    """Fold newly written price rows into every rollup; returns the DAILY_OHLC rows touched"""
+    rows = list(rows)
+    if not rows:
+        return 0
+    return fold_rollups(cur, lambda unit: aggregate(rows, unit), batch_size)
+
+def update_batch_rollups(cur, batch, timestamp, batch_size):
+    """update_rollups() for a PriceBatch written at `timestamp`, without building its rows"""
+    if not len(batch):
+        return 0
+    return fold_rollups(cur, lambda unit: aggregate_batch(batch, timestamp, unit), batch_size)
+
+def backfill_rollups(cur, before=None):
+    """Rebuild rollup buckets from PRICES; returns {table: row count}.
+
+    Buckets older than the earliest raw price are kept, since the retention
+    job may have archived their ticks. `before`, a day boundary, limits the
+    rebuild to buckets ending by then.
+    """
+    where = "WHERE TIMESTAMP < %s" if before else ""
+    params = [before] if before else []
+    counts = {}
+    for rollup in ROLLUPS:
+        cur.execute(f"SELECT MIN(DATE_TRUNC('{rollup.unit}', TIMESTAMP)) FROM PRICES {where}", params)
+        start = cur.fetchone()[0]
+        if start is not None:
+            bounds = f"{rollup.bucket} >= %s" + (f" AND {rollup.bucket} < %s" if before else "")
+            cur.execute(f"DELETE FROM {rollup.table} WHERE {bounds}", [start] + params)
+            cur.execute(
+                ROLLUP_BACKFILL_SQL.format(
+                    table=rollup.table, columns=rollup_columns(rollup), unit=rollup.unit, where=where
+                ),
+                params
+            )
+        cur.execute(f"SELECT COUNT(*) FROM {rollup.table}")
+        counts[rollup.table] = cur.fetchone()[0]
+    return counts
+
+def rebuild_coin_rollups(cur, coin_id, start, end):
+    """Rebuild one coin's buckets in [start, end) that have raw ticks in PRICES.
+
+    `start` and `end` are day boundaries, so every bucket in the range is
+    complete. Buckets without raw ticks, e.g. archived ones, are kept.
+    Folding rows in with update_rollups() MERGEs them bucket by bucket, so
+    bulk loads of history use this instead.
+    """
+    raw = "COIN_ID = %s AND TIMESTAMP >= %s AND TIMESTAMP < %s"
+    params = [coin_id, start, end]
+    for rollup in ROLLUPS:
+        cur.execute(
+            f"""DELETE FROM {rollup.table}
+            WHERE COIN_ID = %s
+            AND {rollup.bucket} IN (SELECT DATE_TRUNC('{rollup.unit}', TIMESTAMP) FROM PRICES WHERE {raw})""",
+            [coin_id] + params
+        )
+        cur.execute(
+            ROLLUP_BACKFILL_SQL.format(
+                table=rollup.table, columns=rollup_columns(rollup), unit=rollup.unit, where=f"WHERE {raw}"
+            ),
+            params
+        )
+
+if __name__ == '__main__':
+    import sys
+
+    from analytics_cache import get_data_versions
+    from connection_pool import get_pool
+
+    if sys.argv[1:] != ['backfill']:
+        raise SystemExit("usage: python scripts/rollups.py backfill")
+
+    with get_pool().checkout() as conn:
+        cur = conn.cursor()
+        try:
+            for sql in rollup_tables_sql():
+                cur.execute(sql)
+            cur.execute("BEGIN")
+            counts = backfill_rollups(cur)
+            cur.execute("COMMIT")
+            get_data_versions().bump(*(rollup.table for rollup in ROLLUPS))
+            for table, count in counts.items():
+                print(f"✅ {table}: {count} rows")
+        except Exception as e:
+            cur.execute("ROLLBACK")
+            print(f"❌ Error backfilling rollups: {str(e)}")
+            raise
+        finally:
+            cur.close()
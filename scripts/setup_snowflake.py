@@ -1,102 +1,132 @@
-import snowflake.connector
-import os
-from dotenv import load_dotenv
-from pathlib import Path
+from alerts import ALERT_RULES_TABLE_SQL, ALERTS_TABLE_SQL
+from connection_pool import get_pool
+from latest_prices import LATEST_PRICES_TABLE_SQL
+from migrations import alter, deploy, print_report, table, view
+from rollups import ROLLUPS, rollup_tables_sql
+from sync_spool import SYNC_BATCHES_TABLE_SQL
 
-def get_snowflake_connection():
-    load_dotenv()
-    
-    account = os.getenv('SNOWFLAKE_ACCOUNT')
-    region = os.getenv('SNOWFLAKE_REGION')
-    account_identifier = f"{account}.{region}"
-    
-    return snowflake.connector.connect(
-        user=os.getenv('SNOWFLAKE_USERNAME'),
-        password=os.getenv('SNOWFLAKE_PASSWORD'),
-        account=account_identifier,
-        warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-        database=os.getenv('SNOWFLAKE_DATABASE'),
-        schema=os.getenv('SNOWFLAKE_SCHEMA'),
-        insecure_mode=True,
-        client_session_keep_alive=True
-    )
+HOLDINGS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS HOLDINGS (
+    ID NUMBER AUTOINCREMENT,
+    COIN_ID STRING NOT NULL,
+    SYMBOL STRING NOT NULL,
+    NAME STRING NOT NULL,
+    AMOUNT FLOAT NOT NULL,
+    CATEGORY STRING,
+    CREATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    UPDATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (ID)
+)
+"""
 
-def setup_database():
-    conn = get_snowflake_connection()
-    cur = conn.cursor()
-    
-    try:
-        # Create holdings table
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS HOLDINGS (
-            ID NUMBER AUTOINCREMENT,
-            COIN_ID STRING NOT NULL,
-            SYMBOL STRING NOT NULL,
-            NAME STRING NOT NULL,
-            AMOUNT FLOAT NOT NULL,
-            CATEGORY STRING,
-            CREATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
-            UPDATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
-            PRIMARY KEY (ID)
-        )
-        """)
+# Holdings are kept per portfolio, one row per (PORTFOLIO_ID, COIN_ID). Added
+# as a column so existing tables are upgraded in place, their rows becoming
+# the default portfolio
+HOLDINGS_PORTFOLIO_SQL = """
+ALTER TABLE HOLDINGS ADD COLUMN IF NOT EXISTS PORTFOLIO_ID STRING DEFAULT 'default'
+"""
+
+PRICES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS PRICES (
+    ID NUMBER AUTOINCREMENT,
+    COIN_ID STRING NOT NULL,
+    PRICE_USD FLOAT,
+    MARKET_CAP_USD FLOAT,
+    VOLUME_24H_USD FLOAT,
+    PRICE_CHANGE_24H_PCT FLOAT,
+    TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (ID)
+)
+"""
+
+# One row per backfill window committed with its prices, so an interrupted backfill resumes
+BACKFILL_PROGRESS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS BACKFILL_PROGRESS (
+    COIN_ID STRING NOT NULL,
+    WINDOW_START TIMESTAMP_NTZ NOT NULL,
+    WINDOW_END TIMESTAMP_NTZ NOT NULL,
+    ROWS_FETCHED NUMBER,
+    ROWS_WRITTEN NUMBER,
+    COMPLETED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (COIN_ID, WINDOW_START, WINDOW_END)
+)
+"""
+
+PORTFOLIO_ANALYSIS_SQL = """
+CREATE OR REPLACE VIEW PORTFOLIO_ANALYSIS AS
+SELECT 
+    h.PORTFOLIO_ID,
+    h.COIN_ID,
+    h.SYMBOL,
+    h.NAME,
+    h.AMOUNT,
+    h.CATEGORY,
+    p.PRICE_USD,
+    h.AMOUNT * p.PRICE_USD as TOTAL_VALUE_USD,
+    p.PRICE_CHANGE_24H_PCT,
+    p.MARKET_CAP_USD,
+    p.TIMESTAMP as PRICE_TIMESTAMP
+FROM HOLDINGS h
+LEFT JOIN LATEST_PRICES p ON h.COIN_ID = p.COIN_ID
+"""
+
+# Daily time buckets first so range filters on TIMESTAMP prune micro-partitions,
+# then COIN_ID so per-coin windows read adjacent rows
+PRICES_CLUSTER_SQL = """
+ALTER TABLE PRICES CLUSTER BY (TO_DATE(TIMESTAMP), COIN_ID)
+"""
 
-        # Create prices table
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS PRICES (
-            ID NUMBER AUTOINCREMENT,
-            COIN_ID STRING NOT NULL,
-            PRICE_USD FLOAT,
-            MARKET_CAP_USD FLOAT,
-            VOLUME_24H_USD FLOAT,
-            PRICE_CHANGE_24H_PCT FLOAT,
-            TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
-            PRIMARY KEY (ID)
-        )
-        """)
+SCHEMA_OBJECTS = [
+    table('HOLDINGS', HOLDINGS_TABLE_SQL),
+    alter('HOLDINGS_PORTFOLIO_ID', HOLDINGS_PORTFOLIO_SQL, depends=['HOLDINGS']),
+    table('PRICES', PRICES_TABLE_SQL),
+    alter('PRICES_CLUSTERING', PRICES_CLUSTER_SQL),
+    table('LATEST_PRICES', LATEST_PRICES_TABLE_SQL),
+    # The daily and hourly OHLC rollup tables maintained by the sync
+    *[table(rollup.table, sql) for rollup, sql in zip(ROLLUPS, rollup_tables_sql())],
+    table('BACKFILL_PROGRESS', BACKFILL_PROGRESS_TABLE_SQL),
+    table('ALERT_RULES', ALERT_RULES_TABLE_SQL),
+    table('ALERTS', ALERTS_TABLE_SQL),
+    # Ids of the spooled syncs already applied, written in the same transaction as their rows
+    table('SYNC_BATCHES', SYNC_BATCHES_TABLE_SQL),
+    view('PORTFOLIO_ANALYSIS', PORTFOLIO_ANALYSIS_SQL, depends=['HOLDINGS_PORTFOLIO_ID']),
+]
 
-        # Create portfolio analysis view
-        cur.execute("""
-        CREATE OR REPLACE VIEW PORTFOLIO_ANALYSIS AS
-        SELECT 
-            h.COIN_ID,
-            h.SYMBOL,
-            h.NAME,
-            h.AMOUNT,
-            h.CATEGORY,
-            p.PRICE_USD,
-            h.AMOUNT * p.PRICE_USD as TOTAL_VALUE_USD,
-            p.PRICE_CHANGE_24H_PCT,
-            p.MARKET_CAP_USD,
-            p.TIMESTAMP as PRICE_TIMESTAMP
-        FROM HOLDINGS h
-        LEFT JOIN (
-            SELECT DISTINCT FIRST_VALUE(ID) OVER (PARTITION BY COIN_ID ORDER BY TIMESTAMP DESC) as LATEST_ID,
-            COIN_ID
-            FROM PRICES
-        ) latest ON h.COIN_ID = latest.COIN_ID
-        LEFT JOIN PRICES p ON latest.LATEST_ID = p.ID
-        """)
+def create_tables(cur):
+    """Create every object in order on one cursor, for fresh in-memory databases"""
+    for obj in SCHEMA_OBJECTS:
+        cur.execute(obj.sql)
 
+def setup_database(force=False):
+    try:
+        report = deploy(SCHEMA_OBJECTS, force=force)
+        print_report(report)
         print("✅ Database setup completed successfully!")
-        
-        # Verify tables were created
-        cur.execute("SHOW TABLES")
-        print("\nCreated Tables:")
-        for table in cur.fetchall():
-            print(f"- {table[1]}")
-            
-        cur.execute("SHOW VIEWS")
-        print("\nCreated Views:")
-        for view in cur.fetchall():
-            print(f"- {view[1]}")
+
+        with get_pool().checkout() as conn:
+            cur = conn.cursor()
+            try:
+                # Verify tables were created
+                cur.execute("SHOW TABLES")
+                print("\nCreated Tables:")
+                for table_row in cur.fetchall():
+                    print(f"- {table_row[1]}")
+
+                cur.execute("SHOW VIEWS")
+                print("\nCreated Views:")
+                for view_row in cur.fetchall():
+                    print(f"- {view_row[1]}")
+            finally:
+                cur.close()
 
     except Exception as e:
         print(f"❌ Error setting up database: {str(e)}")
         raise
-    finally:
-        cur.close()
-        conn.close()
 
 if __name__ == "__main__":
-    setup_database() 
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Create the portfolio tables and base view, skipping unchanged objects')
+    parser.add_argument('--force', action='store_true', help='redeploy every object even if its hash is unchanged')
+    args = parser.parse_args()
+    setup_database(args.force) 
\ No newline at end of file
@@ -1,218 +1,1042 @@
 import os
 import sys
+import time
+
+_import_started = time.perf_counter()
+
+import contextlib
+import functools
+import itertools
+import json
+import traceback
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from backends import get_backend_name
+from connection_pool import get_pool, ping
+from price_dedup import get_price_deduplicator
+from records import (
+    PriceBatch, check_portfolio_id, get_portfolio_id, holding_error, parse_holdings, parse_payload, price_error,
+    to_holding
+)
+from rollups import ROLLUPS, get_rollups_enabled, update_batch_rollups, update_rollups
+from latest_prices import upsert_latest_batch, upsert_latest_prices
+from analytics_cache import get_data_versions
+from sync_metrics import StageTimer, profiled, write_metrics
+
+# Modules needing numpy (price store, indicators, alerts), the sync spool and
+# the Snowflake connector are imported only when a sync uses them, so the
+# embedded backends start without any of them
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
-# Print debug info to stderr so it doesn't interfere with JSON output
 def print_debug(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
-print_debug("=== Python Environment Debug ===")
-print_debug(f"Python version: {sys.version}")
-print_debug(f"Python executable: {sys.executable}")
-print_debug(f"Python path: {sys.path}")
-print_debug(f"Current working directory: {os.getcwd()}")
-print_debug(f"Environment variables:")
-for key, value in os.environ.items():
-    if key.startswith(('PYTHON', 'VIRTUAL', 'PATH')):
-        print_debug(f"  {key}: {value}")
-print_debug("===========================")
-
-try:
-    import snowflake.connector
-    print_debug("✅ Successfully imported snowflake.connector")
-except ImportError as e:
-    print_debug(f"❌ Failed to import snowflake.connector: {e}")
-    print_debug("Attempting pip install...")
-    import subprocess
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_COPY_THRESHOLD = 50000
+
+# executemany() with the connector's default pyformat binding rewrites a plain
+# INSERT ... VALUES into a single multi-row VALUES statement per batch
+HOLDINGS_INSERT_SQL = """
+INSERT INTO HOLDINGS (
+    COIN_ID,
+    SYMBOL,
+    NAME,
+    AMOUNT,
+    CATEGORY,
+    PORTFOLIO_ID
+) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+PRICES_INSERT_SQL = """
+INSERT INTO PRICES (
+    COIN_ID,
+    TIMESTAMP,
+    PRICE_USD,
+    MARKET_CAP_USD,
+    VOLUME_24H_USD,
+    PRICE_CHANGE_24H_PCT
+) VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+PRICES_COPY_SQL = """
+COPY INTO PRICES (
+    COIN_ID,
+    TIMESTAMP,
+    PRICE_USD,
+    MARKET_CAP_USD,
+    VOLUME_24H_USD,
+    PRICE_CHANGE_24H_PCT
+)
+FROM @%%PRICES/%s
+FILE_FORMAT = (TYPE = CSV FIELD_OPTIONALLY_ENCLOSED_BY = '"')
+PURGE = TRUE
+"""
+
+HOLDINGS_SELECT_SQL = "SELECT COIN_ID, SYMBOL, NAME, AMOUNT, CATEGORY FROM HOLDINGS WHERE PORTFOLIO_ID = %s"
+
+HOLDINGS_DELETE_SQL = "DELETE FROM HOLDINGS WHERE PORTFOLIO_ID = %s"
+
+# Applies a precomputed diff to one portfolio: OP is 'I' (insert), 'U' (update) or 'D' (delete)
+HOLDINGS_MERGE_SQL = """
+MERGE INTO HOLDINGS t
+USING (
+    SELECT
+        column1 AS OP,
+        column2 AS COIN_ID,
+        column3 AS SYMBOL,
+        column4 AS NAME,
+        column5 AS AMOUNT,
+        column6 AS CATEGORY,
+        column7 AS PORTFOLIO_ID
+    FROM (VALUES {values})
+) s
+ON t.PORTFOLIO_ID = s.PORTFOLIO_ID AND t.COIN_ID = s.COIN_ID
+WHEN MATCHED AND s.OP = 'D' THEN DELETE
+WHEN MATCHED THEN UPDATE SET
+    SYMBOL = s.SYMBOL,
+    NAME = s.NAME,
+    AMOUNT = s.AMOUNT,
+    CATEGORY = s.CATEGORY,
+    UPDATED_AT = CURRENT_TIMESTAMP()
+WHEN NOT MATCHED AND s.OP = 'I' THEN INSERT (
+    COIN_ID,
+    SYMBOL,
+    NAME,
+    AMOUNT,
+    CATEGORY,
+    PORTFOLIO_ID
+) VALUES (s.COIN_ID, s.SYMBOL, s.NAME, s.AMOUNT, s.CATEGORY, s.PORTFOLIO_ID)
+"""
+
+# 'keep' leaves holdings untouched, for prices-only syncs
+HOLDINGS_MODES = ('replace', 'delta', 'keep')
+
+SyncConfig = namedtuple('SyncConfig', [
+    'backend', 'batch_size', 'copy_threshold', 'holdings_mode', 'portfolio_id', 'rollups', 'price_store',
+    'indicators', 'alerts', 'spool'
+])
+
+def env_flag(name):
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+@functools.lru_cache(maxsize=1)
+def get_config():
+    """Sync settings parsed from the environment once per process.
+
+    Call get_config.cache_clear() after changing the environment.
+    """
+    backend = get_backend_name()
+    mode = os.getenv('SNOWFLAKE_SYNC_HOLDINGS_MODE', 'replace').lower()
+    if mode not in HOLDINGS_MODES:
+        raise ValueError(f"Invalid SNOWFLAKE_SYNC_HOLDINGS_MODE: {mode}")
+    return SyncConfig(
+        backend=backend,
+        batch_size=max(1, int(os.getenv('SNOWFLAKE_SYNC_BATCH_SIZE', DEFAULT_BATCH_SIZE))),
+        # 0 disables the staged COPY INTO path, which only Snowflake has
+        copy_threshold=int(os.getenv('SNOWFLAKE_SYNC_COPY_THRESHOLD', DEFAULT_COPY_THRESHOLD)) if backend == 'snowflake' else 0,
+        holdings_mode=mode,
+        portfolio_id=check_portfolio_id(get_portfolio_id()),
+        rollups=get_rollups_enabled(),
+        price_store=bool(os.getenv('PRICE_STORE_DIR')),
+        indicators=env_flag('SNOWFLAKE_SYNC_INDICATORS'),
+        alerts=env_flag('SNOWFLAKE_SYNC_ALERTS'),
+        spool=env_flag('SYNC_SPOOL')
+    )
+
+def get_batch_size():
+    return get_config().batch_size
+
+def get_copy_threshold():
+    return get_config().copy_threshold
+
+def get_holdings_mode():
+    return get_config().holdings_mode
+
+def resolve_portfolio_id(portfolio_id, data=None):
+    """`portfolio_id`, else the payload's "portfolio_id", else the configured PORTFOLIO_ID"""
+    if portfolio_id is None and isinstance(data, dict):
+        portfolio_id = data.get('portfolio_id')
+    return check_portfolio_id(get_config().portfolio_id if portfolio_id is None else portfolio_id)
+
+def chunked(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def insert_rows(cur, sql, rows, batch_size):
+    count = 0
+    for batch in chunked(rows, batch_size):
+        cur.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+def diff_holdings(current_rows, holdings):
+    """Compare incoming Holding tuples with (COIN_ID, SYMBOL, NAME, AMOUNT, CATEGORY) rows by COIN_ID"""
+    current = {row[0]: (row[1], row[2], float(row[3]), row[4]) for row in current_rows}
+    changes = []
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    seen = set()
+
+    for row in holdings:
+        coin_id = row[0]
+        if coin_id in seen:
+            raise ValueError(f"Duplicate coin_id in holdings: {coin_id}")
+        seen.add(coin_id)
+
+        values = (row[1], row[2], float(row[3]), row[4])
+        if coin_id not in current:
+            changes.append(('I',) + row)
+            counts['inserted'] += 1
+        elif current[coin_id] != values:
+            changes.append(('U',) + row)
+            counts['updated'] += 1
+        else:
+            counts['unchanged'] += 1
+
+    for coin_id in current.keys() - seen:
+        changes.append(('D', coin_id, None, None, None, None))
+        counts['deleted'] += 1
+
+    return changes, counts
+
+def holding_rows(holdings, portfolio_id):
+    """HOLDINGS_INSERT_SQL rows for Holding tuples"""
+    suffix = (portfolio_id,)
+    return (holding + suffix for holding in holdings)
+
+def merge_holdings(cur, holdings, portfolio_id, batch_size):
+    """Apply only the portfolio's holdings that changed since the last sync, one MERGE per batch"""
+    cur.execute(HOLDINGS_SELECT_SQL, (portfolio_id,))
+    changes, counts = diff_holdings(cur.fetchall(), holdings)
+    for batch in chunked(changes, batch_size):
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+        params = [value for change in batch for value in change + (portfolio_id,)]
+        cur.execute(HOLDINGS_MERGE_SQL.format(values=values), params)
+    return counts
+
+def replace_holdings(cur, holdings, portfolio_id, batch_size, timer=None):
+    timer = timer or StageTimer()
+    # Clear the portfolio's existing holdings
+    with timer.stage('delete_holdings'):
+        cur.execute(HOLDINGS_DELETE_SQL, (portfolio_id,))
+    deleted = timer.count('delete_holdings', cur.rowcount)
+    with timer.stage('insert_holdings'):
+        count = timer.count('insert_holdings', insert_rows(
+            cur, HOLDINGS_INSERT_SQL, holding_rows(holdings, portfolio_id), batch_size
+        ))
+    return {'inserted': count, 'updated': 0, 'deleted': deleted, 'unchanged': 0}
+
+def apply_holdings(cur, holdings, mode, portfolio_id, batch_size, timer=None):
+    timer = timer or StageTimer()
+    if mode == 'keep':
+        return {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    if mode == 'delta':
+        with timer.stage('merge_holdings'):
+            counts = merge_holdings(cur, holdings, portfolio_id, batch_size)
+        timer.count('merge_holdings', counts['inserted'] + counts['updated'] + counts['deleted'])
+        return counts
+    return replace_holdings(cur, holdings, portfolio_id, batch_size, timer)
+
+def copy_price_rows(cur, rows):
+    """Load price rows through the PRICES table stage with PUT + COPY INTO"""
+    import csv
+    import tempfile
+
+    fd, path = tempfile.mkstemp(prefix='prices_', suffix='.csv')
+    file_name = os.path.basename(path)
+    count = 0
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "snowflake-connector-python==3.6.0"])
-        import snowflake.connector
-        print_debug("✅ Successfully installed and imported snowflake.connector")
-    except Exception as e:
-        print_debug(f"❌ Failed to install snowflake.connector: {e}")
+        with os.fdopen(fd, 'w', newline='') as f:
+            writer = csv.writer(f)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+
+        cur.execute(f"PUT 'file://{path}' @%PRICES AUTO_COMPRESS=TRUE OVERWRITE=TRUE")
+        # COPY INTO is DML, so it commits or rolls back with the holdings writes
+        cur.execute(PRICES_COPY_SQL % f"{file_name}.gz")
+        return count
+    except Exception:
+        try:
+            cur.execute(f"REMOVE @%PRICES/{file_name}.gz")
+        except Exception:
+            pass
         raise
+    finally:
+        os.remove(path)
 
-import json
-import traceback
-from datetime import datetime
-from dotenv import load_dotenv
-
-def validate_env_vars():
-    required_vars = [
-        'SNOWFLAKE_ACCOUNT',
-        'SNOWFLAKE_USERNAME',
-        'SNOWFLAKE_PASSWORD',
-        'SNOWFLAKE_DATABASE',
-        'SNOWFLAKE_WAREHOUSE',
-        'SNOWFLAKE_ROLE',
-        'SNOWFLAKE_REGION'
-    ]
-    
-    missing_vars = [var for var in required_vars if not os.getenv(var)]
-    if missing_vars:
-        error_msg = f"Missing required environment variables: {', '.join(missing_vars)}"
-        print(f"❌ {error_msg}")
-        raise ValueError(error_msg)
-    
-    print("✅ All required environment variables are set")
-
-def get_snowflake_connection():
-    load_dotenv()
-    validate_env_vars()
-    
-    try:
-        account = os.getenv('SNOWFLAKE_ACCOUNT')
-        region = os.getenv('SNOWFLAKE_REGION')
+def run_callbacks(callbacks):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print_debug(f"⚠️ Post-sync step failed: {e}")
+
+def run_sync(load, conn=None, after_commit=(), after_rollback=(), timer=None, pool=None):
+    """Run load(cur) inside one transaction and wrap the outcome in the sync result shape.
+
+    Callables in after_commit run only once the transaction has committed,
+    so local state (caches, stores) never gets ahead of the warehouse;
+    after_rollback runs when the sync fails so that state can be discarded.
+    Without `conn`, a connection is borrowed from `pool` (default the shared
+    pool). Stage timings from `timer` are reported in the details either way.
+    """
+    timer = timer or StageTimer()
+    pool = (pool or get_pool()) if conn is None else None
+    with profiled() as profile, contextlib.ExitStack() as stack:
+        try:
+            with timer.stage('connect'):
+                if pool is not None:
+                    conn = stack.enter_context(pool.checkout())
+                cur = conn.cursor()
         
-        # Format account identifier correctly for Snowflake
-        account_identifier = f"{account}.{region}.snowflakecomputing.com"
+            # Begin transaction
+            with timer.stage('begin'):
+                cur.execute("BEGIN")
         
-        print(f"Connecting to Snowflake account: {account_identifier}")
-        print(f"Using warehouse: {os.getenv('SNOWFLAKE_WAREHOUSE')}")
-        print(f"Using database: {os.getenv('SNOWFLAKE_DATABASE')}")
-        print(f"Using role: {os.getenv('SNOWFLAKE_ROLE')}")
+            try:
+                details = load(cur)
+            
+                # Commit transaction
+                with timer.stage('commit'):
+                    cur.execute("COMMIT")
+                print_debug("✅ Sync completed successfully!")
+            
+            except Exception as e:
+                # Rollback on error
+                with timer.stage('rollback'):
+                    cur.execute("ROLLBACK")
+                raise e
         
-        conn = snowflake.connector.connect(
-            user=os.getenv('SNOWFLAKE_USERNAME'),
-            password=os.getenv('SNOWFLAKE_PASSWORD'),
-            account=account,  # Use just the account name, not the full URL
-            region=region,    # Specify region separately
-            warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-            database=os.getenv('SNOWFLAKE_DATABASE'),
-            schema=os.getenv('SNOWFLAKE_SCHEMA', 'PUBLIC'),
-            role=os.getenv('SNOWFLAKE_ROLE')
-        )
+            with timer.stage('after_commit'):
+                run_callbacks(after_commit)
         
-        print("✅ Successfully connected to Snowflake")
-        return conn
-    except Exception as e:
-        error_msg = f"Error connecting to Snowflake: {str(e)}"
-        print(f"❌ {error_msg}")
-        print(f"Connection details (sanitized):")
-        print(f"- Account: {account}")
-        print(f"- Region: {region}")
-        print(f"- Username: {os.getenv('SNOWFLAKE_USERNAME')}")
-        print(f"- Database: {os.getenv('SNOWFLAKE_DATABASE')}")
-        print(f"- Warehouse: {os.getenv('SNOWFLAKE_WAREHOUSE')}")
-        print(f"- Role: {os.getenv('SNOWFLAKE_ROLE')}")
-        raise
+            result = {
+                'status': 'success',
+                'message': 'Data synced successfully',
+                'details': dict(details, timings=timer.report())
+            }
+            
+        except Exception as e:
+            run_callbacks(after_rollback)
+            if pool is not None and conn is not None and not ping(conn):
+                pool.discard(conn)
+            error_msg = f"Error syncing data: {str(e)}"
+            print_debug(f"❌ {error_msg}")
+            print_debug("Stack trace:")
+            traceback.print_exc()
+            result = {
+                'status': 'error',
+                'message': error_msg,
+                'details': {
+                    'type': type(e).__name__,
+                    'trace': traceback.format_exc(),
+                    'timings': timer.report()
+                }
+            }
+        finally:
+            if 'cur' in locals():
+                cur.close()
+    if profile is not None:
+        result['details']['profile'] = profile
+    write_metrics(result)
+    return result
 
-def sync_data(data):
-    try:
-        conn = get_snowflake_connection()
-        cur = conn.cursor()
+_import_reported = False
+
+def new_timer():
+    """A stage timer; the first one in a process also reports the time spent importing this module"""
+    global _import_reported
+    timer = StageTimer()
+    if not _import_reported:
+        timer.add('import', IMPORT_SECONDS)
+        _import_reported = True
+    return timer
+
+_price_dedup = None
+
+def get_default_price_dedup():
+    # Kept per process so a long-lived worker reconciles against PRICES only once
+    global _price_dedup
+    if _price_dedup is None:
+        _price_dedup = get_price_deduplicator()
+    return _price_dedup
+
+_price_store = None
+
+def get_default_price_store():
+    global _price_store
+    if _price_store is None and get_config().price_store:
+        from price_store import get_price_store
+
+        _price_store = get_price_store()
+    return _price_store
+
+_indicator_engine = None
+
+def get_default_indicator_engine():
+    global _indicator_engine
+    if _indicator_engine is None and get_config().indicators:
+        from indicators import get_indicator_engine
+
+        _indicator_engine = get_indicator_engine()
+    return _indicator_engine
+
+_alert_engine = None
+
+def get_default_alert_engine():
+    global _alert_engine
+    if _alert_engine is None and get_config().alerts:
+        from alerts import get_alert_engine
+
+        _alert_engine = get_alert_engine()
+    return _alert_engine
+
+_data_versions = None
+
+def get_default_data_versions():
+    global _data_versions
+    if _data_versions is None:
+        _data_versions = get_data_versions()
+    return _data_versions
+
+def sync_hooks(price_dedup, store_writer, indicator_engine=None, data_versions=None, alert_engine=None):
+    """Callbacks that advance or discard local state once the transaction outcome is known"""
+    after_commit = []
+    after_rollback = []
+    if price_dedup is not None:
+        after_commit.append(price_dedup.commit)
+    if indicator_engine is not None:
+        after_commit.append(indicator_engine.commit)
+        after_rollback.append(indicator_engine.rollback)
+    if alert_engine is not None:
+        after_commit.append(alert_engine.commit)
+        after_rollback.append(alert_engine.rollback)
+    if store_writer is not None:
+        after_commit.append(store_writer.commit)
+        after_commit.append(store_writer.store.maybe_compact)
+        after_rollback.append(store_writer.abort)
+    if data_versions is not None:
+        # Last, so cached analytics are invalidated only once everything else reflects the sync
+        after_commit.append(data_versions.commit)
+        after_rollback.append(data_versions.rollback)
+    return after_commit, after_rollback
+
+def dedup_prices(prices, timestamp, price_dedup):
+    if price_dedup is None:
+        return prices, 0
+    return price_dedup.filter(prices, timestamp)
+
+def touch_data_versions(data_versions, holdings_changes, prices_written, rollup_rows=0):
+    """Mark the tables this sync changed so cached analytics over them are invalidated on commit"""
+    if data_versions is None:
+        return
+    if prices_written:
+        # Written prices are also upserted into LATEST_PRICES
+        data_versions.touch('PRICES', 'LATEST_PRICES')
+    if rollup_rows:
+        data_versions.touch(*(rollup.table for rollup in ROLLUPS))
+    if any(holdings_changes[kind] for kind in ('inserted', 'updated', 'deleted')):
+        data_versions.touch('HOLDINGS')
+
+def update_indicators(prices, timestamp, indicator_engine):
+    if indicator_engine is None:
+        return 0
+    return indicator_engine.update_prices(prices, timestamp)
+
+def evaluate_alerts(cur, prices, timestamp, alert_engine, indicator_engine, batch_size):
+    if alert_engine is None:
+        return 0
+    return alert_engine.process(cur, prices, timestamp, indicator_engine, batch_size)
+
+def sync_data(data, conn=None, batch_size=None, copy_threshold=None, holdings_mode=None, price_dedup=None,
+              price_store=None, indicator_engine=None, rollups=None, data_versions=None, alert_engine=None,
+              portfolio_id=None, pool=None, spool=None):
+    """Sync a payload's holdings into one portfolio and its prices into the shared price tables.
+
+    The portfolio is `portfolio_id`, else the payload's "portfolio_id", else PORTFOLIO_ID.
+    With `spool` (default SYNC_SPOOL, unless `conn` is given) the payload is
+    only validated and queued in the local spool; see queue_sync().
+    """
+    if batch_size is None:
+        batch_size = get_batch_size()
+    if copy_threshold is None:
+        copy_threshold = get_copy_threshold()
+    if holdings_mode is None:
+        holdings_mode = get_holdings_mode()
+    if spool is None:
+        spool = get_config().spool and conn is None
+    if spool:
+        return queue_sync(data, holdings_mode, portfolio_id)
+    if price_dedup is None:
+        price_dedup = get_default_price_dedup()
+    if price_store is None:
+        price_store = get_default_price_store()
+    if indicator_engine is None:
+        indicator_engine = get_default_indicator_engine()
+    if alert_engine is None:
+        alert_engine = get_default_alert_engine()
+    if rollups is None:
+        rollups = get_config().rollups
+    if data_versions is None:
+        data_versions = get_default_data_versions()
+    store_writer = price_store.writer() if price_store is not None else None
+    timer = new_timer()
+
+    def load(cur):
+        # Holding tuples and a columnar price batch; every invalid record is reported at once
+        with timer.stage('validate'):
+            holdings, prices = parse_payload(data)
+            portfolio = resolve_portfolio_id(portfolio_id, data)
+        timer.count('validate', len(holdings) + len(prices))
         
-        # Extract holdings and prices from input data
-        holdings = data.get('holdings', [])
-        prices = data.get('prices', [])
+        print_debug(f"Processing {len(holdings)} holdings for portfolio {portfolio} and {len(prices)} prices")
         
-        print(f"Processing {len(holdings)} holdings and {len(prices)} prices")
+        # Replace the portfolio's holdings, or apply only what changed in delta mode
+        holdings_changes = apply_holdings(cur, holdings, holdings_mode, portfolio, batch_size, timer)
         
-        # Validate holdings data
-        required_holding_fields = ['coin_id', 'symbol', 'name', 'amount']
-        for holding in holdings:
-            missing_fields = [field for field in required_holding_fields if field not in holding]
-            if missing_fields:
-                raise ValueError(f"Missing required fields in holding: {missing_fields}")
+        # Drop prices that have not moved since the last write
+        timestamp = datetime.utcnow().isoformat()
+        with timer.stage('dedup_prices'):
+            if price_dedup is not None:
+                price_dedup.begin(cur)
+            new_prices, suppressed = dedup_prices(prices, timestamp, price_dedup)
+        timer.count('dedup_prices', len(prices))
         
-        # Validate prices data
-        required_price_fields = ['coin_id', 'price_usd']
-        for price in prices:
-            missing_fields = [field for field in required_price_fields if field not in price]
-            if missing_fields:
-                raise ValueError(f"Missing required fields in price: {missing_fields}")
+        # Insert new prices, staging very large payloads as a file
+        with timer.stage('insert_prices'):
+            if copy_threshold and len(new_prices) >= copy_threshold:
+                load_method = 'copy'
+                copy_price_rows(cur, new_prices.rows(timestamp))
+            else:
+                load_method = 'insert'
+                insert_rows(cur, PRICES_INSERT_SQL, new_prices.rows(timestamp), batch_size)
+        timer.count('insert_prices', len(new_prices))
         
-        # Begin transaction
-        cur.execute("BEGIN")
+        # Keep the one-row-per-coin LATEST_PRICES table current
+        with timer.stage('latest_prices'):
+            latest_prices = timer.count(
+                'latest_prices', upsert_latest_batch(cur, new_prices, timestamp, batch_size)
+            )
         
-        try:
-            # Clear existing holdings
-            cur.execute("DELETE FROM HOLDINGS")
-            
-            # Insert new holdings
-            for holding in holdings:
-                cur.execute("""
-                INSERT INTO HOLDINGS (
-                    COIN_ID,
-                    SYMBOL,
-                    NAME,
-                    AMOUNT,
-                    CATEGORY
-                ) VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    holding['coin_id'],
-                    holding['symbol'],
-                    holding['name'],
-                    holding['amount'],
-                    holding.get('category', 'Other')
-                ))
-            
-            # Insert new prices
-            timestamp = datetime.utcnow().isoformat()
-            for price in prices:
-                cur.execute("""
-                INSERT INTO PRICES (
-                    COIN_ID,
-                    TIMESTAMP,
-                    PRICE_USD,
-                    MARKET_CAP_USD,
-                    VOLUME_24H_USD,
-                    PRICE_CHANGE_24H_PCT
-                ) VALUES (%s, %s, %s, %s, %s, %s)
-                """, (
-                    price['coin_id'],
-                    timestamp,
-                    price['price_usd'],
-                    price.get('market_cap_usd', 0),
-                    price.get('volume_24h_usd', 0),
-                    price.get('price_change_24h_pct', 0)
+        # Fold the new rows into the daily and hourly OHLC rollups
+        if rollups:
+            with timer.stage('rollups'):
+                rollup_rows = timer.count('rollups', update_batch_rollups(cur, new_prices, timestamp, batch_size))
+        else:
+            rollup_rows = 0
+        
+        # Stage the same prices for the local price store; published after commit
+        if store_writer is not None:
+            with timer.stage('price_store'):
+                store_writer.add_batch(new_prices, timestamp)
+        
+        # Advance the running indicators; the new state is kept only if the sync commits
+        indicators_updated = 0
+        if indicator_engine is not None:
+            with timer.stage('indicators'):
+                indicator_engine.begin()
+                indicators_updated = timer.count('indicators', update_indicators(new_prices, timestamp, indicator_engine))
+        
+        # Check the alert rules of the coins just written; fired alerts go to the ALERTS outbox
+        alerts_fired = 0
+        if alert_engine is not None:
+            with timer.stage('alerts'):
+                alert_engine.begin(cur)
+                alerts_fired = timer.count('alerts', evaluate_alerts(
+                    cur, new_prices, timestamp, alert_engine, indicator_engine, batch_size
                 ))
-            
-            # Commit transaction
-            cur.execute("COMMIT")
-            print("✅ Sync completed successfully!")
-            
-            return {
-                'status': 'success',
-                'message': 'Data synced successfully',
-                'details': {
-                    'holdings_count': len(holdings),
-                    'prices_count': len(prices),
-                    'timestamp': timestamp
-                }
+        
+        data_versions.begin()
+        touch_data_versions(data_versions, holdings_changes, len(new_prices), rollup_rows)
+        
+        return {
+            'portfolio_id': portfolio,
+            'holdings_count': len(holdings),
+            'prices_count': len(prices),
+            'prices_written': len(new_prices),
+            'prices_suppressed': suppressed,
+            'timestamp': timestamp,
+            'batch_size': batch_size,
+            'load_method': load_method,
+            'holdings_mode': holdings_mode,
+            'holdings_changes': holdings_changes,
+            'indicators_updated': indicators_updated,
+            'alerts_fired': alerts_fired,
+            'rollup_rows': rollup_rows,
+            'latest_prices': latest_prices
+        }
+
+    return run_sync(load, conn, *sync_hooks(
+        price_dedup, store_writer, indicator_engine, data_versions, alert_engine
+    ), timer=timer, pool=pool)
+
+def queue_sync(data, holdings_mode=None, portfolio_id=None):
+    """Validate a payload and append it to the sync spool, returning as soon as it is on disk.
+
+    A SpoolFlusher applies it later with sync_queued(). The result reports
+    the batch id and `queued` instead of what was written.
+    """
+    from sync_spool import get_spool, new_batch
+
+    if holdings_mode is None:
+        holdings_mode = get_holdings_mode()
+    timer = new_timer()
+    try:
+        with timer.stage('validate'):
+            holdings, prices = parse_payload(data)
+            portfolio = resolve_portfolio_id(portfolio_id, data)
+            if holdings_mode == 'delta':
+                # Checked now, as a sync that fails when flushed would hold up everything queued after it
+                diff_holdings((), holdings)
+        timer.count('validate', len(holdings) + len(prices))
+        with timer.stage('spool'):
+            batch = new_batch(portfolio, holdings_mode, holdings, prices)
+            get_spool().append(batch)
+        timer.count('spool', 1)
+        return {
+            'status': 'success',
+            'message': 'Data queued for sync',
+            'details': {
+                'queued': True,
+                'batch_id': batch.batch_id,
+                'portfolio_id': portfolio,
+                'holdings_count': len(holdings),
+                'prices_count': len(prices),
+                'timestamp': batch.timestamp,
+                'holdings_mode': holdings_mode,
+                'timings': timer.report()
             }
-            
-        except Exception as e:
-            # Rollback on error
-            cur.execute("ROLLBACK")
-            raise e
-            
+        }
     except Exception as e:
-        error_msg = f"Error syncing data: {str(e)}"
-        print(f"❌ {error_msg}")
-        print("Stack trace:")
-        traceback.print_exc()
+        error_msg = f"Error queueing sync: {str(e)}"
+        print_debug(f"❌ {error_msg}")
         return {
             'status': 'error',
             'message': error_msg,
             'details': {
                 'type': type(e).__name__,
-                'trace': traceback.format_exc()
+                'trace': traceback.format_exc(),
+                'timings': timer.report()
             }
         }
-    finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
-            conn.close()
+
+def sync_queued(syncs, conn=None, batch_size=None, copy_threshold=None, price_dedup=None, price_store=None,
+                indicator_engine=None, rollups=None, data_versions=None, alert_engine=None, pool=None):
+    """Apply QueuedSyncs from the spool in one transaction, skipping any already recorded in SYNC_BATCHES.
+
+    Each sync's prices are written with the timestamp it was queued at. A
+    portfolio's holdings are applied once, from its last sync that carries
+    holdings, which leaves HOLDINGS as applying each sync in turn would.
+    """
+    from sync_spool import applied_batch_ids, record_batches
+
+    if batch_size is None:
+        batch_size = get_batch_size()
+    if copy_threshold is None:
+        copy_threshold = get_copy_threshold()
+    if price_dedup is None:
+        price_dedup = get_default_price_dedup()
+    if price_store is None:
+        price_store = get_default_price_store()
+    if indicator_engine is None:
+        indicator_engine = get_default_indicator_engine()
+    if alert_engine is None:
+        alert_engine = get_default_alert_engine()
+    if rollups is None:
+        rollups = get_config().rollups
+    if data_versions is None:
+        data_versions = get_default_data_versions()
+    store_writer = price_store.writer() if price_store is not None else None
+    timer = new_timer()
+
+    def load(cur):
+        # Syncs committed by an earlier flush whose checkpoint was never written
+        with timer.stage('applied_batches'):
+            applied = applied_batch_ids(cur, [sync.batch_id for sync in syncs], batch_size)
+        timer.count('applied_batches', len(syncs))
+        pending = [sync for sync in syncs if sync.batch_id not in applied]
+        print_debug(f"Applying {len(pending)} queued syncs ({len(applied)} already applied)")
+
+        last_holdings = {}
+        for sync in pending:
+            if sync.holdings_mode != 'keep':
+                last_holdings[sync.portfolio_id] = sync
+        holdings_changes = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        for portfolio, sync in last_holdings.items():
+            changes = apply_holdings(cur, sync.holdings, sync.holdings_mode, portfolio, batch_size, timer)
+            for kind, count in changes.items():
+                holdings_changes[kind] += count
+
+        # Dedup in queue order, so each sync is compared with the prices queued before it
+        with timer.stage('dedup_prices'):
+            if price_dedup is not None:
+                price_dedup.begin(cur)
+            written = []
+            suppressed = 0
+            for sync in pending:
+                new_prices, count = dedup_prices(sync.prices, sync.timestamp, price_dedup)
+                written.append((new_prices, sync.timestamp))
+                suppressed += count
+        timer.count('dedup_prices', sum(len(sync.prices) for sync in pending))
+        prices_written = sum(len(prices) for prices, _ in written)
+
+        def rows():
+            return itertools.chain.from_iterable(prices.rows(timestamp) for prices, timestamp in written)
+
+        # The rows of every sync go out as one load
+        with timer.stage('insert_prices'):
+            if copy_threshold and prices_written >= copy_threshold:
+                load_method = 'copy'
+                copy_price_rows(cur, rows())
+            else:
+                load_method = 'insert'
+                insert_rows(cur, PRICES_INSERT_SQL, rows(), batch_size)
+        timer.count('insert_prices', prices_written)
+
+        with timer.stage('latest_prices'):
+            latest_prices = timer.count('latest_prices', upsert_latest_prices(cur, rows(), batch_size))
+
+        rollup_rows = 0
+        if rollups:
+            with timer.stage('rollups'):
+                rollup_rows = timer.count('rollups', update_rollups(cur, rows(), batch_size))
+
+        indicators_updated = 0
+        alerts_fired = 0
+        if indicator_engine is not None:
+            indicator_engine.begin()
+        if alert_engine is not None:
+            with timer.stage('alerts'):
+                alert_engine.begin(cur)
+        for prices, timestamp in written:
+            if store_writer is not None:
+                with timer.stage('price_store'):
+                    store_writer.add_batch(prices, timestamp)
+            if indicator_engine is not None:
+                with timer.stage('indicators'):
+                    indicators_updated += timer.count('indicators', update_indicators(
+                        prices, timestamp, indicator_engine
+                    ))
+            if alert_engine is not None:
+                with timer.stage('alerts'):
+                    alerts_fired += timer.count('alerts', evaluate_alerts(
+                        cur, prices, timestamp, alert_engine, indicator_engine, batch_size
+                    ))
+
+        with timer.stage('record_batches'):
+            timer.count('record_batches', record_batches(cur, pending, batch_size))
+        data_versions.begin()
+        touch_data_versions(data_versions, holdings_changes, prices_written, rollup_rows)
+
+        return {
+            'batches': len(syncs),
+            'batches_applied': len(pending),
+            'batches_duplicate': len(applied),
+            'portfolios': sorted(last_holdings),
+            'holdings_changes': holdings_changes,
+            'prices_count': sum(len(sync.prices) for sync in pending),
+            'prices_written': prices_written,
+            'prices_suppressed': suppressed,
+            'first_queued_at': syncs[0].timestamp,
+            'last_queued_at': syncs[-1].timestamp,
+            'batch_size': batch_size,
+            'load_method': load_method,
+            'indicators_updated': indicators_updated,
+            'alerts_fired': alerts_fired,
+            'rollup_rows': rollup_rows,
+            'latest_prices': latest_prices
+        }
+
+    return run_sync(load, conn, *sync_hooks(
+        price_dedup, store_writer, indicator_engine, data_versions, alert_engine
+    ), timer=timer, pool=pool)
+
+def sync_holdings(holdings, portfolio_id=None, conn=None, batch_size=None, holdings_mode=None, data_versions=None,
+                  pool=None):
+    """Sync one portfolio's holdings in their own transaction, leaving prices and their state alone.
+
+    Portfolios own disjoint HOLDINGS rows, so syncs of different portfolios
+    can run at the same time on separate connections.
+    """
+    if batch_size is None:
+        batch_size = get_batch_size()
+    if holdings_mode is None:
+        holdings_mode = get_holdings_mode()
+    if data_versions is None:
+        data_versions = get_default_data_versions()
+    timer = new_timer()
+    changed = []
+
+    def load(cur):
+        with timer.stage('validate'):
+            parsed = parse_holdings(holdings)
+            portfolio = resolve_portfolio_id(portfolio_id)
+        timer.count('validate', len(parsed))
+        holdings_changes = apply_holdings(cur, parsed, holdings_mode, portfolio, batch_size, timer)
+        if any(holdings_changes[kind] for kind in ('inserted', 'updated', 'deleted')):
+            changed.append('HOLDINGS')
+        return {
+            'portfolio_id': portfolio,
+            'holdings_count': len(parsed),
+            'batch_size': batch_size,
+            'holdings_mode': holdings_mode,
+            'holdings_changes': holdings_changes
+        }
+
+    # Bumped directly rather than through begin/touch/commit, which a concurrent price sync may be using
+    return run_sync(load, conn, after_commit=[lambda: data_versions.bump(*changed)], timer=timer, pool=pool)
+
+def check_record(error, where):
+    if error:
+        raise ValueError(f"Invalid {where}: {error}")
+
+def stream_timestamp(value):
+    """A price record's ISO 8601 "timestamp" as naive UTC, the form the sync writes"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"timestamp is not an ISO 8601 string: {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+def check_price(record, where):
+    check_record(price_error(record), where)
+    if record.get('timestamp') is None:
+        record.pop('timestamp', None)
+    else:
+        try:
+            record['timestamp'] = stream_timestamp(record['timestamp'])
+        except ValueError as e:
+            raise ValueError(f"Invalid {where}: {e}")
+    return record
+
+def iter_ndjson_records(stream):
+    """Yield ('holding' | 'price', record) pairs from newline-delimited JSON.
+
+    Each line is either a single record tagged with "type": "holding" or
+    "type": "price", or a {"holdings": [...], "prices": [...]} document.
+    A price may carry its own ISO 8601 "timestamp", normalized to naive UTC.
+    Records are validated as they are read, so a bad line fails the sync
+    before anything after it is parsed. Holdings are yielded as Holding tuples.
+    """
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+        if not isinstance(record, dict):
+            raise ValueError(f"Expected a JSON object on line {line_number}")
+
+        if 'type' not in record and ('holdings' in record or 'prices' in record):
+            for index, holding in enumerate(record.get('holdings', [])):
+                check_record(holding_error(holding), f"holding {index} on line {line_number}")
+                yield 'holding', to_holding(holding)
+            for index, price in enumerate(record.get('prices', [])):
+                yield 'price', check_price(price, f"price {index} on line {line_number}")
+            continue
+
+        kind = record.pop('type', None)
+        if kind == 'holding':
+            check_record(holding_error(record), f"holding on line {line_number}")
+            record = to_holding(record)
+        elif kind == 'price':
+            check_price(record, f"price on line {line_number}")
+        else:
+            raise ValueError(f"Unknown record type {kind!r} on line {line_number}")
+        yield kind, record
+
+def sync_stream(stream, conn=None, batch_size=None, holdings_mode=None, price_dedup=None, price_store=None,
+                indicator_engine=None, rollups=None, data_versions=None, alert_engine=None, portfolio_id=None,
+                pool=None):
+    """Sync NDJSON records from a file-like object, holding at most one batch of each kind in memory.
+
+    Holdings go to `portfolio_id` (default PORTFOLIO_ID). In delta mode they
+    are collected and merged once the stream ends; prices are always
+    flushed in batches as they arrive.
+
+    Prices without a "timestamp" get the sync's. Each flushed batch is
+    written one timestamp at a time, oldest first, so a stream of several
+    ticks per coin should be in time order: the indicators and alerts skip
+    a coin's ticks older than one they have already seen. A coin repeating
+    a timestamp within the stream fails the sync, since PRICES holds one row
+    per coin and timestamp.
+    """
+    if batch_size is None:
+        batch_size = get_batch_size()
+    if holdings_mode is None:
+        holdings_mode = get_holdings_mode()
+    if price_dedup is None:
+        price_dedup = get_default_price_dedup()
+    if price_store is None:
+        price_store = get_default_price_store()
+    if indicator_engine is None:
+        indicator_engine = get_default_indicator_engine()
+    if alert_engine is None:
+        alert_engine = get_default_alert_engine()
+    if rollups is None:
+        rollups = get_config().rollups
+    if data_versions is None:
+        data_versions = get_default_data_versions()
+    store_writer = price_store.writer() if price_store is not None else None
+    timer = new_timer()
+
+    def load(cur):
+        timestamp = datetime.utcnow().isoformat()
+        portfolio = resolve_portfolio_id(portfolio_id)
+        holdings_batch = []
+        prices_batch = []
+        holdings_count = 0
+        prices_count = 0
+        prices_written = 0
+        prices_suppressed = 0
+        indicators_updated = 0
+        alerts_fired = 0
+        rollup_rows = 0
+        latest_prices = 0
+        replace = holdings_mode == 'replace'
+        price_keys = set()
+
+        if price_dedup is not None:
+            with timer.stage('dedup_prices'):
+                price_dedup.begin(cur)
+        if indicator_engine is not None:
+            indicator_engine.begin()
+        if alert_engine is not None:
+            with timer.stage('alerts'):
+                alert_engine.begin(cur)
+
+        def flush_prices(records):
+            ticks = {}
+            for record in records:
+                ticks.setdefault(record.get('timestamp', timestamp), []).append(record)
+            for tick in sorted(ticks):
+                flush_tick(ticks[tick], tick)
+
+        def flush_tick(records, timestamp):
+            nonlocal prices_count, prices_written, prices_suppressed, indicators_updated, alerts_fired
+            nonlocal rollup_rows, latest_prices
+            # Records were validated as they were parsed
+            batch = PriceBatch.from_records(records)
+            with timer.stage('dedup_prices'):
+                new_prices, suppressed = dedup_prices(batch, timestamp, price_dedup)
+            prices_count += timer.count('dedup_prices', len(batch))
+            with timer.stage('insert_prices'):
+                prices_written += timer.count('insert_prices', insert_rows(
+                    cur, PRICES_INSERT_SQL, new_prices.rows(timestamp), batch_size
+                ))
+            with timer.stage('latest_prices'):
+                latest_prices += timer.count('latest_prices', upsert_latest_batch(
+                    cur, new_prices, timestamp, batch_size
+                ))
+            if rollups:
+                with timer.stage('rollups'):
+                    rollup_rows += timer.count('rollups', update_batch_rollups(
+                        cur, new_prices, timestamp, batch_size
+                    ))
+            prices_suppressed += suppressed
+            if store_writer is not None:
+                with timer.stage('price_store'):
+                    store_writer.add_batch(new_prices, timestamp)
+            if indicator_engine is not None:
+                with timer.stage('indicators'):
+                    indicators_updated += timer.count('indicators', update_indicators(
+                        new_prices, timestamp, indicator_engine
+                    ))
+            if alert_engine is not None:
+                with timer.stage('alerts'):
+                    alerts_fired += timer.count('alerts', evaluate_alerts(
+                        cur, new_prices, timestamp, alert_engine, indicator_engine, batch_size
+                    ))
+
+        if replace:
+            # Clear the portfolio's existing holdings
+            with timer.stage('delete_holdings'):
+                cur.execute(HOLDINGS_DELETE_SQL, (portfolio,))
+            deleted = timer.count('delete_holdings', cur.rowcount)
+
+        # Reading and validating the stream is timed as 'parse'
+        for kind, record in timer.iterate('parse', iter_ndjson_records(stream)):
+            if kind == 'holding':
+                if holdings_mode == 'keep':
+                    continue
+                holdings_batch.append(record)
+                if replace and len(holdings_batch) >= batch_size:
+                    with timer.stage('insert_holdings'):
+                        holdings_count += timer.count('insert_holdings', insert_rows(
+                            cur, HOLDINGS_INSERT_SQL, holding_rows(holdings_batch, portfolio), batch_size
+                        ))
+                    holdings_batch = []
+            else:
+                key = (record['coin_id'], record.get('timestamp', timestamp))
+                if key in price_keys:
+                    raise ValueError(f"Price for {key[0]} at {key[1]} repeats in the stream")
+                price_keys.add(key)
+                prices_batch.append(record)
+                if len(prices_batch) >= batch_size:
+                    flush_prices(prices_batch)
+                    prices_batch = []
+
+        if replace:
+            with timer.stage('insert_holdings'):
+                holdings_count += timer.count('insert_holdings', insert_rows(
+                    cur, HOLDINGS_INSERT_SQL, holding_rows(holdings_batch, portfolio), batch_size
+                ))
+            holdings_changes = {'inserted': holdings_count, 'updated': 0, 'deleted': deleted, 'unchanged': 0}
+        else:
+            holdings_changes = apply_holdings(cur, holdings_batch, holdings_mode, portfolio, batch_size, timer)
+            holdings_count = len(holdings_batch)
+        flush_prices(prices_batch)
+        print_debug(f"Processed {holdings_count} holdings and {prices_count} prices")
+        data_versions.begin()
+        touch_data_versions(data_versions, holdings_changes, prices_written, rollup_rows)
+
+        return {
+            'portfolio_id': portfolio,
+            'holdings_count': holdings_count,
+            'prices_count': prices_count,
+            'prices_written': prices_written,
+            'prices_suppressed': prices_suppressed,
+            'timestamp': timestamp,
+            'batch_size': batch_size,
+            'load_method': 'stream',
+            'holdings_mode': holdings_mode,
+            'holdings_changes': holdings_changes,
+            'indicators_updated': indicators_updated,
+            'alerts_fired': alerts_fired,
+            'rollup_rows': rollup_rows,
+            'latest_prices': latest_prices
+        }
+
+    return run_sync(load, conn, *sync_hooks(
+        price_dedup, store_writer, indicator_engine, data_versions, alert_engine
+    ), timer=timer, pool=pool)
 
 if __name__ == '__main__':
     try:
-        # Read input data from command line argument
+        # Read input data from a command line argument, stdin or a file
         if len(sys.argv) < 2:
             raise ValueError("No input data provided")
-            
-        input_data = json.loads(sys.argv[1])
-        result = sync_data(input_data)
+
+        if sys.argv[1] == '--stdin':
+            result = sync_stream(sys.stdin)
+        elif sys.argv[1] == '--file':
+            if len(sys.argv) < 3:
+                raise ValueError("No input file provided")
+            with open(sys.argv[2]) as f:
+                result = sync_stream(f)
+        else:
+            input_data = json.loads(sys.argv[1])
+            result = sync_data(input_data)
         print(json.dumps(result))
     except Exception as e:
         error_result = {
@@ -224,4 +1048,4 @@ if __name__ == '__main__':
             }
         }
         print(json.dumps(error_result))
-        sys.exit(1) 
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,241 @@
+import calendar
+import math
+import re
+from datetime import date, datetime, timedelta
+
+# Snowflake functions used by the setup scripts, rewritten to SF_* user
+# functions that register_functions() installs on a sqlite3 connection.
+# Timestamps are stored and returned as ISO 8601 strings, which sqlite
+# compares in chronological order.
+_REWRITES = [
+    (re.compile(r'CURRENT_TIMESTAMP\(\)', re.I), 'SF_NOW()'),
+    (re.compile(r'CURRENT_DATE\(\)', re.I), 'SF_TODAY()'),
+    (re.compile(r'\bDATEADD\(\s*(\w+)\s*,', re.I), r"SF_DATEADD('\1',"),
+    (re.compile(r'\bDATE_TRUNC\(', re.I), 'SF_DATE_TRUNC('),
+    # Timestamps are already ISO strings
+    (re.compile(r'\bTO_TIMESTAMP_NTZ\(', re.I), '('),
+    # sqlite's multi-argument MAX/MIN are scalar and, like Snowflake's, NULL if any argument is
+    (re.compile(r'\bGREATEST\(', re.I), 'MAX('),
+    (re.compile(r'\bLEAST\(', re.I), 'MIN('),
+]
+
+_CREATE_OR_REPLACE_VIEW = re.compile(r'^\s*CREATE\s+OR\s+REPLACE\s+VIEW\s+(\w+)\s+AS\b', re.I)
+_CREATE_TABLE = re.compile(r'^\s*CREATE\s+TABLE\b', re.I)
+_SHOW = re.compile(r'^\s*SHOW\s+(TABLES|VIEWS)\s*;?\s*$', re.I)
+_CLUSTER_BY = re.compile(r'^\s*ALTER\s+TABLE\s+(\w+)\s+CLUSTER\s+BY\s*\((.*)\)\s*;?\s*$', re.I | re.S)
+# sqlite has no ADD COLUMN IF NOT EXISTS; the clause is dropped and SQLiteCursor
+# ignores the duplicate column error instead
+ADD_COLUMN_IF_NOT_EXISTS = re.compile(r'^(\s*ALTER\s+TABLE\s+\w+\s+ADD\s+COLUMN\s+)IF\s+NOT\s+EXISTS\s+', re.I)
+
+# Column types and defaults in the setup DDL. Text-like Snowflake types map
+# to TEXT so sqlite does not give them numeric affinity.
+_DDL_REWRITES = [
+    (re.compile(r'\bNUMBER\s+AUTOINCREMENT\b', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r',\s*PRIMARY\s+KEY\s*\(\s*ID\s*\)', re.I), ''),
+    (re.compile(r'\bDEFAULT\s+CURRENT_TIMESTAMP\(\)', re.I), "DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))"),
+    (re.compile(r'\b(STRING|TIMESTAMP_NTZ)\b', re.I), 'TEXT'),
+    (re.compile(r'\bNUMBER\b', re.I), 'INTEGER'),
+    (re.compile(r'\bFLOAT\b', re.I), 'REAL'),
+]
+
+_MERGE = re.compile(
+    r'^\s*MERGE\s+INTO\s+(\w+)\s+(\w+)\s+USING\s+\((.*)\)\s+(\w+)\s+ON\s+(.*?)\s+(WHEN\s.*?)\s*;?\s*$',
+    re.I | re.S
+)
+_MERGE_CLAUSE = re.compile(
+    r'WHEN\s+(NOT\s+MATCHED|MATCHED)(?:\s+AND\s+(.+?))?\s+THEN\s+(.+?)(?=\s+WHEN\s+(?:NOT\s+)?MATCHED\b|\s*$)',
+    re.I | re.S
+)
+_MERGE_INSERT = re.compile(r'^INSERT\s*(\(.*?\))\s*VALUES\s*\((.*)\)$', re.I | re.S)
+_MERGE_SOURCE = '_merge_source'
+
+def translate_merge(match):
+    """Rewrite MERGE as statements over a temp copy of the source.
+
+    Each source row is flagged as matched or not before any clause runs.
+    Later clauses exclude rows that an earlier clause of the same kind
+    already took, so every row gets its first applicable action, as in
+    Snowflake.
+    """
+    target, t, source, s, on, clauses = match.groups()
+    statements = [
+        f"DROP TABLE IF EXISTS temp.{_MERGE_SOURCE}",
+        f"CREATE TEMP TABLE {_MERGE_SOURCE} AS SELECT {s}.*, "
+        f"EXISTS (SELECT 1 FROM {target} AS {t} WHERE {on}) AS _MERGE_MATCHED FROM ({source}) AS {s}",
+    ]
+    taken = {'MATCHED': [], 'NOT MATCHED': []}
+    for kind, condition, action in _MERGE_CLAUSE.findall(clauses):
+        kind = ' '.join(kind.upper().split())
+        condition = condition or '1'
+        flag = f"{s}._MERGE_MATCHED" if kind == 'MATCHED' else f"NOT {s}._MERGE_MATCHED"
+        where = ' AND '.join([flag, f"({condition})"] + [f"NOT COALESCE(({c}), 0)" for c in taken[kind]])
+        taken[kind].append(condition)
+        action = action.strip()
+
+        if kind == 'NOT MATCHED':
+            insert = _MERGE_INSERT.match(action)
+            if not insert:
+                raise ValueError(f"Unsupported MERGE action: {action}")
+            columns, values = insert.groups()
+            statements.append(f"INSERT INTO {target} {columns} SELECT {values} FROM {_MERGE_SOURCE} AS {s} WHERE {where}")
+        elif action.upper() == 'DELETE':
+            statements.append(
+                f"DELETE FROM {target} AS {t} WHERE EXISTS "
+                f"(SELECT 1 FROM {_MERGE_SOURCE} AS {s} WHERE {where} AND ({on}))"
+            )
+        elif action.upper().startswith('UPDATE'):
+            assignments = re.sub(r'^UPDATE\s+SET\s+', '', action, flags=re.I)
+            statements.append(
+                f"UPDATE {target} AS {t} SET {assignments} FROM {_MERGE_SOURCE} AS {s} WHERE {where} AND ({on})"
+            )
+        else:
+            raise ValueError(f"Unsupported MERGE action: {action}")
+    statements.append(f"DROP TABLE temp.{_MERGE_SOURCE}")
+    return statements
+
+def split_top_level(expressions):
+    """Split a comma-separated list, ignoring commas inside parentheses"""
+    parts, depth, current = [], 0, ''
+    for char in expressions:
+        if char == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+        depth += (char == '(') - (char == ')')
+        current += char
+    parts.append(current.strip())
+    return parts
+
+def translate_cluster_by(match):
+    """Stand in for a clustering key with an index on the columns it orders by"""
+    table, expressions = match.groups()
+    # TO_DATE(TIMESTAMP) clusters on TIMESTAMP; the column is the last identifier of each key
+    columns = [re.findall(r'\w+', expression)[-1] for expression in split_top_level(expressions)]
+    return [f"CREATE INDEX IF NOT EXISTS {table}_CLUSTER_IDX ON {table} ({', '.join(columns)})"]
+
+def translate(sql):
+    """Translate one Snowflake statement into a list of sqlite statements"""
+    cluster_by = _CLUSTER_BY.match(sql)
+    if cluster_by:
+        return translate_cluster_by(cluster_by)
+
+    show = _SHOW.match(sql)
+    if show:
+        kind = 'table' if show.group(1).upper() == 'TABLES' else 'view'
+        # Name in the second column, like Snowflake's SHOW output
+        return [f"SELECT type, name FROM sqlite_master WHERE type = '{kind}' AND name NOT LIKE 'sqlite_%' ORDER BY name"]
+
+    add_column = ADD_COLUMN_IF_NOT_EXISTS.match(sql)
+    if add_column:
+        sql = add_column.group(1) + sql[add_column.end():]
+
+    if _CREATE_TABLE.match(sql) or add_column:
+        for pattern, replacement in _DDL_REWRITES:
+            sql = pattern.sub(replacement, sql)
+
+    for pattern, replacement in _REWRITES:
+        sql = pattern.sub(replacement, sql)
+
+    match = _CREATE_OR_REPLACE_VIEW.match(sql)
+    if match:
+        view = match.group(1)
+        return [
+            f"DROP VIEW IF EXISTS {view}",
+            f"CREATE VIEW {view} AS" + sql[match.end():]
+        ]
+
+    merge = _MERGE.match(sql)
+    if merge:
+        return translate_merge(merge)
+    return [sql]
+
+def parse_timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    value = str(value)
+    if len(value) == 10:
+        return datetime.strptime(value, '%Y-%m-%d')
+    return datetime.fromisoformat(value)
+
+def add_months(value, months):
+    """Shift by calendar months, clamping to the end of shorter months like Snowflake"""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+def dateadd(unit, amount, value):
+    unit = unit.lower()
+    amount = int(amount)
+    if unit in ('year', 'years', 'y'):
+        return add_months(value, 12 * amount)
+    if unit in ('month', 'months', 'mon', 'mm'):
+        return add_months(value, amount)
+    if unit in ('week', 'weeks', 'w'):
+        return value + timedelta(weeks=amount)
+    if unit in ('day', 'days', 'd'):
+        return value + timedelta(days=amount)
+    if unit in ('hour', 'hours', 'h'):
+        return value + timedelta(hours=amount)
+    if unit in ('minute', 'minutes', 'm'):
+        return value + timedelta(minutes=amount)
+    if unit in ('second', 'seconds', 's'):
+        return value + timedelta(seconds=amount)
+    raise ValueError(f"Unsupported DATEADD unit: {unit}")
+
+def date_trunc(unit, value):
+    unit = unit.lower()
+    if unit == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    if unit == 'month':
+        return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unsupported DATE_TRUNC unit: {unit}")
+
+class _StdDev:
+    """Sample standard deviation, matching Snowflake's STDDEV"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def finalize(self):
+        if self.count < 2:
+            return None
+        return math.sqrt(self.m2 / (self.count - 1))
+
+def register_functions(conn, now=None):
+    """Install the SF_* functions on a sqlite3 connection; `now` pins CURRENT_TIMESTAMP()"""
+    def current_timestamp():
+        return now or datetime.utcnow()
+
+    def sf_dateadd(unit, amount, value):
+        if value is None:
+            return None
+        is_date = isinstance(value, str) and len(value) == 10
+        result = dateadd(unit, amount, parse_timestamp(value))
+        return result.date().isoformat() if is_date else result.isoformat()
+
+    def sf_date_trunc(unit, value):
+        if value is None:
+            return None
+        return date_trunc(unit, parse_timestamp(value)).isoformat()
+
+    conn.create_function('SF_NOW', 0, lambda: current_timestamp().isoformat())
+    conn.create_function('SF_TODAY', 0, lambda: current_timestamp().date().isoformat())
+    conn.create_function('SF_DATEADD', 3, sf_dateadd, deterministic=True)
+    conn.create_function('SF_DATE_TRUNC', 2, sf_date_trunc, deterministic=True)
+    conn.create_aggregate('STDDEV', 1, _StdDev)
@@ -0,0 +1,203 @@
+"""Per-stage timing, metrics files and opt-in profiling for the sync.
+
+Every sync result carries `details.timings`: wall seconds and row counts
+per stage (connect, validate, delete_holdings, insert_prices, commit, ...).
+The first sync in a process also reports the time spent importing the
+sync module.
+
+- SNOWFLAKE_SYNC_METRICS_PATH: after each sync, write the last run's
+  timings to this file in Prometheus text format, e.g. for the
+  node_exporter textfile collector. SNOWFLAKE_SYNC_METRICS_FORMAT=openmetrics
+  writes OpenMetrics instead.
+- SNOWFLAKE_SYNC_PROFILE: `cpu` dumps a cProfile of each sync, `memory`
+  writes its top allocation sites from tracemalloc, or both as `cpu,memory`.
+  Files go to SNOWFLAKE_SYNC_PROFILE_DIR (default `profiles/` in the state
+  directory) and are listed in `details.profile`.
+"""
+import contextlib
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from price_dedup import get_state_dir
+
+METRICS_FORMATS = ('prometheus', 'openmetrics')
+PROFILE_MODES = ('cpu', 'memory')
+TOP_ALLOCATIONS = 25
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+class StageTimer:
+    """Accumulates wall time and row counts per named stage; repeated stages add up"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, name, seconds=0.0, rows=None):
+        stage = self.stages.setdefault(name, {'seconds': 0.0})
+        stage['seconds'] += seconds
+        if rows is not None:
+            stage['rows'] = stage.get('rows', 0) + rows
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def count(self, name, rows):
+        self.add(name, rows=rows)
+        return rows
+
+    def iterate(self, name, iterable):
+        """Yield from `iterable`, timing each step and counting the items under `name`"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start, 1)
+            yield item
+
+    def report(self):
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = dict(stage, seconds=round(stage['seconds'], 6))
+        return {'total_seconds': round(time.perf_counter() - self.started, 6), 'stages': stages}
+
+def get_metrics_path():
+    return os.getenv('SNOWFLAKE_SYNC_METRICS_PATH') or None
+
+def get_metrics_format():
+    metrics_format = os.getenv('SNOWFLAKE_SYNC_METRICS_FORMAT', 'prometheus').lower()
+    if metrics_format not in METRICS_FORMATS:
+        raise ValueError(f"Invalid SNOWFLAKE_SYNC_METRICS_FORMAT: {metrics_format}")
+    return metrics_format
+
+def get_profile_modes():
+    modes = {mode.strip().lower() for mode in os.getenv('SNOWFLAKE_SYNC_PROFILE', '').split(',') if mode.strip()}
+    unknown = modes - set(PROFILE_MODES)
+    if unknown:
+        raise ValueError(f"Invalid SNOWFLAKE_SYNC_PROFILE: {', '.join(sorted(unknown))}")
+    return modes
+
+def get_profile_dir():
+    return os.getenv('SNOWFLAKE_SYNC_PROFILE_DIR', os.path.join(get_state_dir(), 'profiles'))
+
+def render_metrics(result, now=None, metrics_format='prometheus'):
+    """The last sync's outcome and stage timings as Prometheus or OpenMetrics text"""
+    details = result.get('details') or {}
+    timings = details.get('timings') or {'total_seconds': 0.0, 'stages': {}}
+    openmetrics = metrics_format == 'openmetrics'
+    lines = []
+
+    def metric(name, help_text, unit, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        if openmetrics and unit:
+            lines.append(f"# UNIT {name} {unit}")
+        for labels, value in samples:
+            label_text = ','.join(f'{key}="{value_}"' for key, value_ in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value!r}" if label_text else f"{name} {value!r}")
+
+    stages = timings['stages']
+    metric('portfolio_sync_success', 'Whether the last sync committed', None,
+           [({}, 1 if result.get('status') == 'success' else 0)])
+    metric('portfolio_sync_last_run_timestamp_seconds', 'When the last sync finished', 'seconds',
+           [({}, float(now if now is not None else time.time()))])
+    metric('portfolio_sync_duration_seconds', 'Wall time of the last sync', 'seconds',
+           [({}, float(timings['total_seconds']))])
+    metric('portfolio_sync_stage_seconds', 'Wall time of each stage of the last sync', 'seconds',
+           [({'stage': name}, float(stage['seconds'])) for name, stage in stages.items()])
+    metric('portfolio_sync_stage_rows', 'Rows handled by each stage of the last sync', None,
+           [({'stage': name}, int(stage['rows'])) for name, stage in stages.items() if 'rows' in stage])
+    if openmetrics:
+        lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+def write_metrics(result, path=None, metrics_format=None):
+    """Write the metrics file if one is configured; a failure here never fails the sync"""
+    path = path or get_metrics_path()
+    if not path:
+        return None
+    try:
+        text = render_metrics(result, metrics_format=metrics_format or get_metrics_format())
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Written aside and renamed so a scraper never reads half a file; the temp
+        # name is per thread so concurrent syncs do not write over each other's
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        return path
+    except (OSError, ValueError) as e:
+        print_debug(f"⚠️ Could not write sync metrics to {path}: {e}")
+        return None
+
+@contextlib.contextmanager
+def profiled(modes=None, directory=None):
+    """Profile the block per SNOWFLAKE_SYNC_PROFILE; yields a dict of the files written, or None when off"""
+    modes = get_profile_modes() if modes is None else set(modes)
+    if not modes:
+        yield None
+        return
+
+    import cProfile
+    import tracemalloc
+
+    directory = directory or get_profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f"sync-{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}")
+    info = {}
+    profiler = None
+    started_tracing = False
+    if 'memory' in modes:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        tracemalloc.reset_peak()
+    if 'cpu' in modes:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler is already active in this thread
+            print_debug(f"⚠️ CPU profiling skipped: {e}")
+            profiler = None
+    try:
+        yield info
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            info['cpu'] = f"{prefix}.prof"
+            profiler.dump_stats(info['cpu'])
+        if 'memory' in modes:
+            snapshot = tracemalloc.take_snapshot()
+            info['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            info['memory'] = f"{prefix}-allocations.txt"
+            with open(info['memory'], 'w') as f:
+                f.write(f"Peak traced memory: {info['peak_bytes']:,} bytes\n")
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                    f.write(f"{stat}\n")
+
+if __name__ == '__main__':
+    import argparse
+    import pstats
+
+    parser = argparse.ArgumentParser(description='Summarise a cProfile dump written by SNOWFLAKE_SYNC_PROFILE=cpu')
+    parser.add_argument('path')
+    parser.add_argument('--sort', default='cumulative')
+    parser.add_argument('--limit', type=int, default=30)
+    args = parser.parse_args()
+    pstats.Stats(args.path).sort_stats(args.sort).print_stats(args.limit)
@@ -0,0 +1,431 @@
+"""Write-ahead spool, so syncs neither wait for nor are lost to a slow or unavailable warehouse.
+
+With SYNC_SPOOL=1, sync_data validates a payload, appends it to the spool
+and returns at once with `details.queued` set. A SpoolFlusher drains the
+spool in the background: it applies the oldest queued syncs together in
+one transaction, retries with backoff while the warehouse is failing, and
+moves its checkpoint past them only once they are committed.
+
+The spool directory holds numbered segment files that are only ever
+appended to (segments/<seq>.seg). Each record is framed as
+
+    header   magic, payload length, CRC-32 of the payload (12 bytes)
+    payload  the validated sync as compact JSON
+
+and fsynced before the sync returns. A torn or corrupt record is skipped
+by scanning forward to the next frame whose checksum matches.
+checkpoint.json holds the segment and offset up to which records have
+been applied; segments wholly before it are deleted.
+
+Every queued sync has a batch id. The flusher records applied ids in
+SYNC_BATCHES in the same transaction as their rows and skips ids that are
+already there, so a sync is applied once even if the flusher stops between
+the commit and writing its checkpoint.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+from price_dedup import get_state_dir
+from records import PRICE_FIELDS, Holding, PriceBatch
+
+MAGIC = b'SPL1'
+FRAME = struct.Struct('<4sII')
+SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_BATCHES = 500
+DEFAULT_MAX_ROWS = 100000
+POLL_SECONDS = 1.0
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+SYNC_BATCHES_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS SYNC_BATCHES (
+    BATCH_ID STRING NOT NULL,
+    QUEUED_AT TIMESTAMP_NTZ NOT NULL,
+    APPLIED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+    PRIMARY KEY (BATCH_ID)
+)
+"""
+
+SYNC_BATCHES_INSERT_SQL = "INSERT INTO SYNC_BATCHES (BATCH_ID, QUEUED_AT) VALUES (%s, %s)"
+
+_SEGMENT_NAME = re.compile(r'^(\d+)\.seg$')
+
+# A validated sync as queued; its prices are written with `timestamp`, the time it was queued
+QueuedSync = namedtuple('QueuedSync', ['batch_id', 'timestamp', 'portfolio_id', 'holdings_mode', 'holdings', 'prices'])
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+class SpoolFull(Exception):
+    pass
+
+def new_batch(portfolio_id, holdings_mode, holdings, prices):
+    return QueuedSync(uuid.uuid4().hex, datetime.utcnow().isoformat(), portfolio_id, holdings_mode, holdings, prices)
+
+def encode(sync):
+    # Nulls in optional price fields are NaN, which json writes and reads back as NaN
+    return json.dumps({
+        'id': sync.batch_id,
+        'timestamp': sync.timestamp,
+        'portfolio_id': sync.portfolio_id,
+        'holdings_mode': sync.holdings_mode,
+        'holdings': [list(holding) for holding in sync.holdings],
+        'coin_ids': sync.prices.coin_ids,
+        'prices': {field: getattr(sync.prices, field).tolist() for field in PRICE_FIELDS},
+        'has_nulls': sync.prices.has_nulls
+    }, separators=(',', ':')).encode('utf-8')
+
+def decode(payload):
+    record = json.loads(payload)
+    prices = PriceBatch(
+        record['coin_ids'], *(record['prices'][field] for field in PRICE_FIELDS), has_nulls=record['has_nulls']
+    )
+    return QueuedSync(
+        record['id'], record['timestamp'], record['portfolio_id'], record['holdings_mode'],
+        [Holding(*holding) for holding in record['holdings']], prices
+    )
+
+def frame_at(data, pos):
+    """The payload of a valid frame starting at `pos`, or None"""
+    if len(data) - pos < FRAME.size:
+        return None
+    magic, length, crc = FRAME.unpack_from(data, pos)
+    start = pos + FRAME.size
+    if magic != MAGIC or start + length > len(data):
+        return None
+    payload = data[start:start + length]
+    return payload if zlib.crc32(payload) == crc else None
+
+def next_frame(data, pos):
+    """Offset of the next valid frame after a bad one at `pos`, or None"""
+    pos = data.find(MAGIC, pos + 1)
+    while pos != -1:
+        if frame_at(data, pos) is not None:
+            return pos
+        pos = data.find(MAGIC, pos + 1)
+    return None
+
+def fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def retry_delay(attempt):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+class Spool:
+    """Append-only segment files of queued syncs plus the checkpoint of what has been applied.
+
+    Appends from any number of threads and processes are serialized by a
+    lock file; positions are (segment seq, byte offset) pairs.
+    """
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, segment_bytes=SEGMENT_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.segments_dir = os.path.join(root, 'segments')
+        self.checkpoint_path = os.path.join(root, 'checkpoint.json')
+        self.flush_lock_path = os.path.join(root, 'flush.lock')
+        self._lock_path = os.path.join(root, 'append.lock')
+        os.makedirs(self.segments_dir, exist_ok=True)
+        # Set by appends in this process, so an in-process flusher wakes without waiting for its poll
+        self.queued = threading.Event()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with open(self._lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _path(self, seq):
+        return os.path.join(self.segments_dir, f'{seq:012d}.seg')
+
+    def seqs(self):
+        matches = (_SEGMENT_NAME.match(name) for name in os.listdir(self.segments_dir))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def size(self):
+        return sum(os.path.getsize(self._path(seq)) for seq in self.seqs())
+
+    def checkpoint(self):
+        """Position up to which queued syncs have been applied"""
+        try:
+            with open(self.checkpoint_path) as f:
+                values = json.load(f)
+        except FileNotFoundError:
+            return 0, 0
+        return values['seq'], values['offset']
+
+    def append(self, sync):
+        """Durably queue a sync; returns its position. Raises SpoolFull past `max_bytes`."""
+        payload = encode(sync)
+        frame = FRAME.pack(MAGIC, len(payload), zlib.crc32(payload)) + payload
+        with self._locked():
+            seqs = self.seqs()
+            if self.max_bytes and sum(os.path.getsize(self._path(seq)) for seq in seqs) + len(frame) > self.max_bytes:
+                raise SpoolFull(f"Sync spool {self.root} is over {self.max_bytes} bytes")
+            if not seqs:
+                # After the checkpoint, in case the segments were removed by hand
+                seq, new = self.checkpoint()[0] + 1, True
+            else:
+                seq = seqs[-1]
+                new = os.path.getsize(self._path(seq)) >= self.segment_bytes
+                seq += new
+            with open(self._path(seq), 'ab') as f:
+                offset = f.tell()
+                try:
+                    f.write(frame)
+                    f.flush()
+                    os.fsync(f.fileno())
+                except BaseException:
+                    f.truncate(offset)
+                    raise
+            if new:
+                fsync_dir(self.segments_dir)
+        self.queued.set()
+        return seq, offset
+
+    def read(self, position=None, max_batches=DEFAULT_MAX_BATCHES, max_rows=DEFAULT_MAX_ROWS):
+        """([QueuedSync], end position, corrupt bytes skipped) for the syncs queued after `position`.
+
+        Stops after `max_batches` syncs or once `max_rows` holdings and prices
+        are read. An incomplete frame at the end of the newest segment may
+        still be being written, so it ends the read rather than being skipped.
+        """
+        seq, offset = position or self.checkpoint()
+        syncs = []
+        rows = 0
+        skipped = 0
+        end = (seq, offset)
+        seqs = [s for s in self.seqs() if s >= seq]
+        for i, current in enumerate(seqs):
+            start = offset if current == seq else 0
+            with open(self._path(current), 'rb') as f:
+                f.seek(start)
+                data = f.read()
+            pos = 0
+            while pos < len(data):
+                if len(syncs) >= max_batches or rows >= max_rows:
+                    return syncs, end, skipped
+                payload = frame_at(data, pos)
+                if payload is None:
+                    resume = next_frame(data, pos)
+                    if resume is None and i == len(seqs) - 1:
+                        return syncs, end, skipped
+                    resume = len(data) if resume is None else resume
+                    skipped += resume - pos
+                    pos = resume
+                else:
+                    sync = decode(payload)
+                    syncs.append(sync)
+                    rows += len(sync.holdings) + len(sync.prices)
+                    pos += FRAME.size + len(payload)
+                end = (current, start + pos)
+        return syncs, end, skipped
+
+    def ack(self, position):
+        """Move the checkpoint to `position` and delete the segments before it, keeping the newest"""
+        tmp_path = f"{self.checkpoint_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'seq': position[0], 'offset': position[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        with self._locked():
+            for seq in self.seqs()[:-1]:
+                if seq < position[0]:
+                    os.remove(self._path(seq))
+
+    def info(self):
+        syncs, _, skipped = self.read(max_batches=float('inf'), max_rows=float('inf'))
+        return {
+            'root': self.root,
+            'segments': len(self.seqs()),
+            'bytes': self.size(),
+            'checkpoint': list(self.checkpoint()),
+            'queued': len(syncs),
+            'queued_prices': sum(len(sync.prices) for sync in syncs),
+            'oldest_queued_at': syncs[0].timestamp if syncs else None,
+            'corrupt_bytes': skipped
+        }
+
+def get_spool_dir():
+    return os.getenv('SYNC_SPOOL_DIR', os.path.join(get_state_dir(), 'spool'))
+
+_spool = None
+
+def get_spool():
+    global _spool
+    if _spool is None:
+        _spool = Spool(get_spool_dir(), max_bytes=int(os.getenv('SYNC_SPOOL_MAX_BYTES', DEFAULT_MAX_BYTES)))
+    return _spool
+
+def applied_batch_ids(cur, batch_ids, batch_size):
+    """The ids among `batch_ids` that SYNC_BATCHES records as already applied"""
+    applied = set()
+    for start in range(0, len(batch_ids), batch_size):
+        batch = batch_ids[start:start + batch_size]
+        cur.execute(f"SELECT BATCH_ID FROM SYNC_BATCHES WHERE BATCH_ID IN ({', '.join(['%s'] * len(batch))})", batch)
+        applied.update(row[0] for row in cur.fetchall())
+    return applied
+
+def record_batches(cur, syncs, batch_size):
+    rows = [(sync.batch_id, sync.timestamp) for sync in syncs]
+    for start in range(0, len(rows), batch_size):
+        cur.executemany(SYNC_BATCHES_INSERT_SQL, rows[start:start + batch_size])
+    return len(rows)
+
+class SpoolFlusher:
+    """Drains a spool into the warehouse, applying up to `max_batches` queued syncs per transaction.
+
+    Only one flusher per spool directory applies syncs at a time; others
+    wait on the flush lock, so one can stand by for another process.
+    """
+
+    def __init__(self, spool=None, pool=None, max_batches=None, max_rows=None, poll_seconds=POLL_SECONDS):
+        self.spool = spool or get_spool()
+        self.pool = pool
+        self.max_batches = max_batches or int(os.getenv('SYNC_SPOOL_MAX_BATCHES', DEFAULT_MAX_BATCHES))
+        self.max_rows = max_rows or int(os.getenv('SYNC_SPOOL_MAX_ROWS', DEFAULT_MAX_ROWS))
+        self.poll_seconds = poll_seconds
+        self.stats = {'flushes': 0, 'applied': 0, 'duplicates': 0, 'failures': 0, 'corrupt_bytes': 0}
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @contextlib.contextmanager
+    def flush_lock(self, wait=True):
+        """Hold the spool's flush lock; yields False if `wait` is off and another flusher has it"""
+        with open(self.spool.flush_lock_path, 'a') as f:
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if not wait or self._stop.wait(self.poll_seconds):
+                        yield False
+                        return
+            yield True
+
+    def flush_once(self):
+        """Apply the next group of queued syncs. Returns the sync result, or None if nothing was queued.
+
+        Call with the flush lock held.
+        """
+        from snowflake_sync import sync_queued
+
+        position = self.spool.checkpoint()
+        syncs, end, skipped = self.spool.read(position, self.max_batches, self.max_rows)
+        if skipped:
+            self.stats['corrupt_bytes'] += skipped
+            print_debug(f"⚠️ Skipped {skipped} corrupt bytes in the sync spool")
+        if not syncs:
+            if end != position:
+                self.spool.ack(end)
+            return None
+
+        result = sync_queued(syncs, pool=self.pool)
+        if result['status'] != 'success':
+            self.stats['failures'] += 1
+            self.last_error = result['message']
+            return result
+        self.spool.ack(end)
+        self.stats['flushes'] += 1
+        self.stats['applied'] += result['details']['batches_applied']
+        self.stats['duplicates'] += result['details']['batches_duplicate']
+        self.last_error = None
+        return result
+
+    def drain(self):
+        """Flush until the spool is empty; returns the failed result that stopped it, or None"""
+        while True:
+            result = self.flush_once()
+            if result is None:
+                return None
+            if result['status'] != 'success':
+                return result
+
+    def run(self):
+        """Flush until stop(): poll when the spool is empty, back off while flushes fail"""
+        with self.flush_lock() as locked:
+            if not locked:
+                return
+            attempt = 0
+            while not self._stop.is_set():
+                self.spool.queued.clear()
+                try:
+                    result = self.flush_once()
+                except Exception as e:
+                    print_debug(f"❌ Spool flush failed: {e}")
+                    self.stats['failures'] += 1
+                    self.last_error = str(e)
+                    result = {'status': 'error'}
+                if result is None:
+                    attempt = 0
+                    self.spool.queued.wait(self.poll_seconds)
+                elif result['status'] == 'success':
+                    attempt = 0
+                else:
+                    delay = retry_delay(attempt)
+                    attempt += 1
+                    print_debug(f"⚠️ Retrying spool flush in {delay:.1f}s (attempt {attempt})")
+                    self._stop.wait(delay)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='spool-flusher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop after the current flush; queued syncs stay in the spool for the next flusher"""
+        self._stop.set()
+        self.spool.queued.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect or drain the local sync spool')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('info', help='print the queued syncs and spool size as JSON')
+    subcommands.add_parser('flush', help='apply everything queued, then exit')
+    subcommands.add_parser('run', help='keep flushing in the foreground until interrupted')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        print(json.dumps(get_spool().info(), indent=2))
+        sys.exit(0)
+
+    flusher = SpoolFlusher()
+    if args.command == 'flush':
+        with flusher.flush_lock(wait=False) as locked:
+            if not locked:
+                print_debug("❌ Another flusher is draining this spool")
+                sys.exit(1)
+            failed = flusher.drain()
+        print(json.dumps(dict(flusher.stats, last_error=flusher.last_error)))
+        sys.exit(1 if failed else 0)
+
+    print_debug(f"✅ Flushing {flusher.spool.root}")
+    try:
+        flusher.run()
+    except KeyboardInterrupt:
+        pass
+    print_debug(f"Spool flusher stats: {flusher.stats}")
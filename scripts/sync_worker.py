@@ -0,0 +1,134 @@
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import socketserver
+import sys
+import traceback
+
+from connection_pool import DEFAULT_HEALTH_CHECK_INTERVAL, ConnectionPool, ping
+from snowflake_sync import get_config, sync_data
+
+def print_debug(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+def load_connector(spec):
+    """Resolve a 'module:callable' connection factory, e.g. benchmark_sync:LocalConnection"""
+    module_name, _, attr = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attr or 'connect')
+
+def error_result(e):
+    return {
+        'status': 'error',
+        'message': str(e),
+        'details': {
+            'type': type(e).__name__,
+            'trace': traceback.format_exc()
+        }
+    }
+
+class SyncWorker:
+    """Runs sync jobs over a single warm pooled connection, reconnecting only when it goes bad.
+
+    With SYNC_SPOOL set, jobs are queued in the spool and answered at once,
+    and a background SpoolFlusher applies them over the connection instead.
+    """
+
+    def __init__(self, connect=None, health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        # Jobs are serialized, so one connection is enough; idle eviction is left to the server's own timeout
+        self.pool = ConnectionPool(connect, max_size=1, health_check_interval=health_check_interval,
+                                   max_idle=0, max_lifetime=0)
+        self.jobs_handled = 0
+        self.flusher = None
+        if get_config().spool:
+            from sync_spool import SpoolFlusher
+
+            self.flusher = SpoolFlusher(pool=self.pool).start()
+
+    @property
+    def connects(self):
+        return self.pool.metrics()['connects']
+
+    def handle(self, job):
+        if self.flusher is not None:
+            result = sync_data(job, spool=True)
+            self.jobs_handled += 1
+            return result
+        try:
+            with self.pool.checkout() as conn:
+                result = sync_data(job, conn=conn)
+                if result['status'] != 'success' and not ping(conn):
+                    self.pool.discard(conn)
+                self.jobs_handled += 1
+        except Exception as e:
+            return error_result(e)
+        return result
+
+    def handle_line(self, line):
+        try:
+            job = json.loads(line)
+        except Exception as e:
+            return json.dumps(error_result(e))
+
+        result = self.handle(job)
+        if isinstance(job, dict) and 'id' in job:
+            result['id'] = job['id']
+        return json.dumps(result)
+
+    def close(self):
+        if self.flusher is not None:
+            self.flusher.stop()
+        self.pool.close()
+
+def serve_stream(worker, infile, outfile):
+    """Answer each newline-delimited JSON job with one result line"""
+    for line in infile:
+        if not line.strip():
+            continue
+        outfile.write(worker.handle_line(line) + '\n')
+        outfile.flush()
+
+def serve_socket(worker, path):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode('utf-8')
+                if not line.strip():
+                    continue
+                self.wfile.write((worker.handle_line(line) + '\n').encode('utf-8'))
+                self.wfile.flush()
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = socketserver.ThreadingUnixStreamServer(path, Handler)
+    server.daemon_threads = True
+    print_debug(f"✅ Sync worker listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Long-lived sync worker reading newline-delimited JSON jobs')
+    parser.add_argument('--socket', help='listen on this Unix socket path instead of stdin')
+    parser.add_argument('--connector', help="connection factory as 'module:callable' (defaults to Snowflake)")
+    parser.add_argument('--health-check-interval', type=float, default=DEFAULT_HEALTH_CHECK_INTERVAL,
+                        help='seconds of idle time after which the connection is pinged before reuse')
+    args = parser.parse_args()
+
+    connect = load_connector(args.connector) if args.connector else None
+    worker = SyncWorker(connect, args.health_check_interval)
+    try:
+        # Keep stdout for result lines only, even if a dependency prints
+        with contextlib.redirect_stdout(sys.stderr):
+            if args.socket:
+                serve_socket(worker, args.socket)
+            else:
+                serve_stream(worker, sys.stdin, sys.__stdout__)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+        print_debug(f"Sync worker handled {worker.jobs_handled} jobs over {worker.connects} connection(s)")
@@ -1,22 +1,13 @@
 import json
 import subprocess
-import requests
 from pathlib import Path
 
+from price_fetcher import fetch_prices
+
 def get_current_prices(coin_ids):
     """Fetch real-time prices from CoinGecko"""
     try:
-        response = requests.get(
-            'https://api.coingecko.com/api/v3/simple/price',
-            params={
-                'ids': ','.join(coin_ids),
-                'vs_currencies': 'usd',
-                'include_market_cap': 'true',
-                'include_24hr_vol': 'true',
-                'include_24hr_change': 'true'
-            }
-        )
-        return response.json()
+        return {record['coin_id']: record for record in fetch_prices(coin_ids)}
     except Exception as e:
         print(f"Error fetching prices: {e}")
         return {}
@@ -49,19 +40,11 @@ def run_sync_test():
     current_prices = get_current_prices(coin_ids)
     
     # Add real prices to test data
-    test_data["prices"] = {}
-    for coin_id in coin_ids:
-        if coin_id in current_prices:
-            test_data["prices"][coin_id] = {
-                "usd": current_prices[coin_id]["usd"],
-                "usd_market_cap": current_prices[coin_id]["usd_market_cap"],
-                "usd_24h_vol": current_prices[coin_id]["usd_24h_vol"],
-                "usd_24h_change": current_prices[coin_id]["usd_24h_change"]
-            }
+    test_data["prices"] = [current_prices[coin_id] for coin_id in coin_ids if coin_id in current_prices]
     
     print("\nCurrent Prices:")
-    for coin_id, price_data in test_data["prices"].items():
-        print(f"{coin_id.upper()}: ${price_data['usd']:,.2f}")
+    for price in test_data["prices"]:
+        print(f"{price['coin_id'].upper()}: ${price['price_usd']:,.2f}")
     
     # Convert test data to JSON string
     test_json = json.dumps(test_data)
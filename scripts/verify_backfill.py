@@ -0,0 +1,171 @@
+"""Crash-and-resume check for backfill.py on an embedded database.
+
+Saved market charts for a few coins are backfilled. A source fails partway
+through, and the run is then resumed. Checks:
+- every (coin, timestamp) lands in PRICES exactly once, including rows
+  the live sync had already written
+- resumed windows are not refetched
+- the incrementally rebuilt rollups match a full rebuild from PRICES
+- live ticks MERGEd into the rollups one transaction at a time, some
+  without a volume, also match a full rebuild
+- LATEST_PRICES holds each coin's newest row
+- a third run writes nothing
+"""
+import json
+import math
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from backends import DuckDBConnection, SQLiteConnection
+from backfill import DumpSource, backfill
+from connection_pool import ConnectionPool
+from rollups import ROLLUPS, backfill_rollups, rollup_columns, update_rollups
+from setup_snowflake import create_tables
+
+START = date(2024, 1, 1)
+DAYS = 200
+COINS = ['bitcoin', 'ethereum', 'solana', 'dogecoin']
+
+def write_dumps(directory, seed=3):
+    """Hourly market charts from a day before START to DAYS after it"""
+    rng = np.random.default_rng(seed)
+    first_ms = int(datetime(2023, 12, 31).timestamp() * 1000)
+    for coin in COINS:
+        hours = (DAYS + 1) * 24
+        times = first_ms + np.arange(hours, dtype=np.int64) * 3_600_000
+        prices = rng.uniform(1, 1000) * np.exp(np.cumsum(rng.normal(0, 0.01, hours)))
+        payload = {
+            'prices': [[int(t), float(p)] for t, p in zip(times, prices)],
+            'market_caps': [[int(t), float(p * 1e7)] for t, p in zip(times, prices)],
+            'total_volumes': [[int(t), float(v)] for t, v in zip(times, rng.uniform(1e6, 1e8, hours))],
+        }
+        with open(os.path.join(directory, f'{coin}.json'), 'w') as f:
+            json.dump(payload, f)
+
+class FailingSource:
+    """Fails every call after the first `calls` ones, like a crash partway through"""
+
+    def __init__(self, source, calls):
+        self.source = source
+        self.calls = calls
+        self.requested = []
+
+    def market_chart(self, coin_id, start, end):
+        self.requested.append((coin_id, start))
+        if len(self.requested) > self.calls:
+            raise RuntimeError("simulated crash")
+        return self.source.market_chart(coin_id, start, end)
+
+    def close(self):
+        pass
+
+def table_rows(cur, sql):
+    cur.execute(sql)
+    return sorted(tuple(round(v, 6) if isinstance(v, float) else str(v) for v in row) for row in cur.fetchall())
+
+def check(name, ok, failures):
+    print(f"{'✅' if ok else '❌'} {name}")
+    if not ok:
+        failures.append(name)
+
+def verify(backend='sqlite', workers=1):
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        write_dumps(directory)
+        path = os.path.join(directory, f'portfolio.{backend}')
+        connect = (lambda: SQLiteConnection(path)) if backend == 'sqlite' else (lambda: DuckDBConnection(path))
+        pool = ConnectionPool(connect, max_size=workers + 1)
+
+        with pool.checkout() as conn:
+            cur = conn.cursor()
+            create_tables(cur)
+            # Rows the live sync wrote at the same instants as the market chart
+            cur.executemany(
+                "INSERT INTO PRICES (COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD, PRICE_CHANGE_24H_PCT) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [('bitcoin', (datetime(2024, 2, 1) + timedelta(hours=h)).isoformat(), 1.0, 0, 0, 0) for h in range(48)]
+            )
+            cur.close()
+
+        options = dict(pool=pool, workers=workers, window_days=30, copy_threshold=0, rollups=True)
+        windows_per_coin = math.ceil(DAYS / 30)
+        end = START + timedelta(days=DAYS)
+
+        crashing = FailingSource(DumpSource(directory), calls=5)
+        first = backfill(COINS, START, end, crashing, **options)
+        check(f"interrupted run committed {first['windows_completed']} windows and reported "
+              f"{len(first['failed'])} failed coins", first['windows_completed'] == 5 - 0 and first['failed'], failures)
+
+        resumed = FailingSource(DumpSource(directory), calls=10 ** 6)
+        second = backfill(COINS, START, end, resumed, **options)
+        check(f"resumed run skipped the {second['windows_skipped']} finished windows and refetched none of them",
+              second['windows_skipped'] == first['windows_completed']
+              and len(resumed.requested) == len(COINS) * windows_per_coin - first['windows_completed']
+              and not second['failed'], failures)
+
+        with pool.checkout() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT COUNT(*), COUNT(DISTINCT COIN_ID || '|' || CAST(TIMESTAMP AS VARCHAR)) FROM PRICES")
+            total, distinct = cur.fetchone()
+            check(f"{total} price rows, none duplicated ({len(COINS) * DAYS * 24} hours backfilled)",
+                  total == distinct == len(COINS) * DAYS * 24, failures)
+
+            incremental = {r.table: table_rows(cur, f"SELECT {rollup_columns(r)} FROM {r.table}") for r in ROLLUPS}
+            cur.execute("BEGIN")
+            backfill_rollups(cur)
+            cur.execute("COMMIT")
+            rebuilt = {r.table: table_rows(cur, f"SELECT {rollup_columns(r)} FROM {r.table}") for r in ROLLUPS}
+            for table in incremental:
+                check(f"{table} matches a full rebuild ({len(rebuilt[table])} rows)",
+                      incremental[table] == rebuilt[table], failures)
+
+            latest = table_rows(cur, "SELECT COIN_ID, TIMESTAMP FROM LATEST_PRICES")
+            newest = table_rows(cur, "SELECT COIN_ID, MAX(TIMESTAMP) FROM PRICES GROUP BY COIN_ID")
+            check("LATEST_PRICES holds each coin's newest row", latest == newest, failures)
+            cur.close()
+
+        third = backfill(COINS, START, end, DumpSource(directory), **options)
+        check("a completed backfill reruns as a no-op",
+              third['rows_written'] == 0 and third['windows_skipped'] == third['windows'], failures)
+
+        # Live ticks after the backfilled range, several per coin-hour, folded like the sync does
+        rng = np.random.default_rng(11)
+        with pool.checkout() as conn:
+            cur = conn.cursor()
+            for minute in sorted(rng.choice(36 * 60, 120, replace=False)):
+                timestamp = (datetime.combine(end, datetime.min.time()) + timedelta(minutes=int(minute))).isoformat()
+                rows = [
+                    (coin_id, timestamp, float(rng.uniform(1, 100)), 0.0,
+                     None if rng.random() < 0.3 else float(rng.uniform(1, 10)), 0.0)
+                    for coin_id in COINS
+                ]
+                cur.execute("BEGIN")
+                cur.executemany(
+                    "INSERT INTO PRICES (COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD, "
+                    "PRICE_CHANGE_24H_PCT) VALUES (%s, %s, %s, %s, %s, %s)", rows
+                )
+                update_rollups(cur, rows, batch_size=3)
+                cur.execute("COMMIT")
+            merged = {r.table: table_rows(cur, f"SELECT {rollup_columns(r)} FROM {r.table}") for r in ROLLUPS}
+            cur.execute("BEGIN")
+            backfill_rollups(cur)
+            cur.execute("COMMIT")
+            for r in ROLLUPS:
+                rebuilt = table_rows(cur, f"SELECT {rollup_columns(r)} FROM {r.table}")
+                check(f"{r.table} after live ticks matches a full rebuild ({len(rebuilt)} rows)",
+                      merged[r.table] == rebuilt, failures)
+            cur.close()
+        pool.close()
+    return len(failures)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check that an interrupted backfill resumes without gaps or duplicates')
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite')
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+    raise SystemExit(1 if verify(args.backend, args.workers) else 0)
@@ -0,0 +1,161 @@
+import math
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from analytics_cache import DEFAULT_DEPENDENCIES, view_dependencies
+from backends import DuckDBConnection
+from benchmark_sync import LocalConnection
+from latest_prices import backfill_latest_prices
+from rollups import backfill_rollups
+from local_analytics import VIEWS, PriceHistory, compute_view, frame_rows, load_holdings
+from records import DEFAULT_PORTFOLIO_ID
+from setup_snowflake import PORTFOLIO_ANALYSIS_SQL, create_tables
+from setup_snowflake_analytics import ANALYTICS_VIEWS
+
+# March 31st makes DATEADD(month, -1, ...) clamp to February 29th
+NOW = datetime(2024, 3, 31, 12, 0, 0)
+
+HOLDINGS = [
+    ('bitcoin', 'BTC', 'Bitcoin', 0.5, 'Layer 1'),
+    ('ethereum', 'ETH', 'Ethereum', 4.0, 'Layer 1'),
+    ('chainlink', 'LINK', 'Chainlink', 250.0, 'Oracle'),
+    ('dogecoin', 'DOGE', 'Dogecoin', 10000.0, 'Meme'),
+    ('stale', 'STL', 'Stale Coin', 3.0, 'Other'),
+]
+
+# A second portfolio sharing coins with the first, so a view that mixes portfolios shows up
+OTHER_PORTFOLIO_ID = 'treasury'
+OTHER_HOLDINGS = [
+    ('bitcoin', 'BTC', 'Bitcoin', 2.0, 'Reserve'),
+    ('ethereum', 'ETH', 'Ethereum', 1.5, 'Layer 1'),
+    ('solana', 'SOL', 'Solana', 40.0, 'Layer 1'),
+]
+PORTFOLIOS = {DEFAULT_PORTFOLIO_ID: HOLDINGS, OTHER_PORTFOLIO_ID: OTHER_HOLDINGS}
+
+def make_fixture_rows(seed=7):
+    """Hourly random walks over 45 days with jittered timestamps and a few gaps"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    coins = {
+        'bitcoin': (62000.0, 12.0),
+        'ethereum': (3400.0, -7.5),
+        'chainlink': (18.0, 5.5),
+        'dogecoin': (0.17, -14.0),
+        'solana': (180.0, 2.0),
+    }
+    start = NOW - timedelta(days=45)
+    for coin_id, (price, last_change) in coins.items():
+        for hour in range(45 * 24):
+            if rng.random() < 0.05:
+                continue
+            price *= math.exp(rng.normal(0, 0.01))
+            timestamp = start + timedelta(hours=hour, seconds=int(rng.integers(0, 3600)))
+            change = float(rng.normal(0, 4))
+            rows.append((coin_id, timestamp, price, price * 1e7, float(rng.uniform(1e6, 1e9)), change))
+        # Pin the latest 24h change so every alert branch is exercised
+        rows[-1] = rows[-1][:5] + (last_change,)
+
+    # A held coin whose last price is older than the 24h performance window
+    for day in range(10):
+        timestamp = NOW - timedelta(days=40 - day)
+        rows.append(('stale', timestamp, 1.0 + day, 1e6, 1e5, 6.0))
+    return rows
+
+def load_fixture(conn, rows):
+    cur = conn.cursor()
+    cur.executemany(
+        "INSERT INTO HOLDINGS (COIN_ID, SYMBOL, NAME, AMOUNT, CATEGORY, PORTFOLIO_ID) VALUES (%s, %s, %s, %s, %s, %s)",
+        [holding + (portfolio_id,) for portfolio_id, holdings in PORTFOLIOS.items() for holding in holdings]
+    )
+    cur.executemany(
+        """INSERT INTO PRICES (
+            COIN_ID, TIMESTAMP, PRICE_USD, MARKET_CAP_USD, VOLUME_24H_USD, PRICE_CHANGE_24H_PCT
+        ) VALUES (%s, %s, %s, %s, %s, %s)""",
+        [(row[0], row[1].isoformat()) + row[2:] for row in rows]
+    )
+    backfill_rollups(cur)
+    backfill_latest_prices(cur)
+    for sql in ANALYTICS_VIEWS.values():
+        cur.execute(sql)
+    return cur
+
+def normalize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def values_match(expected, actual, tolerance=1e-9):
+    if isinstance(expected, float) or isinstance(actual, float):
+        if expected is None or actual is None:
+            return expected is None and actual is None
+        return math.isclose(expected, actual, rel_tol=tolerance, abs_tol=tolerance)
+    return expected == actual
+
+def sort_key(row):
+    return tuple((value is None, str(value) if not isinstance(value, float) else round(value, 6)) for value in row)
+
+def compare_view(cur, view, history, holdings, portfolio_id):
+    spec = VIEWS[view]
+    if spec.per_holding:
+        cur.execute(f"SELECT {', '.join(spec.columns)} FROM {view} WHERE PORTFOLIO_ID = %s", (portfolio_id,))
+    else:
+        cur.execute(f"SELECT * FROM {view}")
+    expected = sorted((tuple(normalize(value) for value in row) for row in cur.fetchall()), key=sort_key)
+    actual = sorted(
+        (tuple(normalize(value) for value in row) for row in frame_rows(compute_view(view, history, holdings, NOW))),
+        key=sort_key
+    )
+    if len(expected) != len(actual):
+        return f"{len(actual)} rows, SQL returned {len(expected)}"
+    for expected_row, actual_row in zip(expected, actual):
+        for column, expected_value, actual_value in zip(spec.columns, expected_row, actual_row):
+            if not values_match(expected_value, actual_value):
+                return f"{column}: expected {expected_value!r}, got {actual_value!r} in {actual_row}"
+    return None
+
+def connect(backend):
+    if backend == 'duckdb':
+        conn = DuckDBConnection(now=NOW)
+        create_tables(conn.cursor())
+        return conn
+    return LocalConnection(now=NOW)
+
+def verify(backend='sqlite'):
+    rows = make_fixture_rows()
+    conn = connect(backend)
+    cur = load_fixture(conn, rows)
+    history = PriceHistory.from_rows(rows)
+
+    failures = 0
+    for portfolio_id in PORTFOLIOS:
+        holdings = load_holdings(cur, portfolio_id)
+        for view, spec in VIEWS.items():
+            if not spec.per_holding and portfolio_id != DEFAULT_PORTFOLIO_ID:
+                continue
+            error = compare_view(cur, view, history, holdings, portfolio_id)
+            if error:
+                failures += 1
+                print(f"❌ {view} ({portfolio_id}): {error}")
+            else:
+                print(f"✅ {view} ({portfolio_id}) matches the SQL view")
+    conn.close()
+
+    # The result cache invalidates a view's entries when a table it reads changes
+    for view, sql in dict(ANALYTICS_VIEWS, PORTFOLIO_ANALYSIS=PORTFOLIO_ANALYSIS_SQL).items():
+        reads = {table for table in DEFAULT_DEPENDENCIES if re.search(rf'\b{table}\b', sql)}
+        if reads != set(view_dependencies(view)):
+            failures += 1
+            print(f"❌ {view}: cached under {sorted(view_dependencies(view))} but reads {sorted(reads)}")
+        else:
+            print(f"✅ {view} is cached under the tables it reads")
+    return failures
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Cross-check the NumPy views against the SQL views on an embedded database')
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite')
+    args = parser.parse_args()
+    raise SystemExit(1 if verify(args.backend) else 0)
@@ -0,0 +1,86 @@
+"""Schema deploy checks across connection pool sizes on an embedded database.
+
+For each pool size and parallelism, a fresh database is deployed and then
+deployed again. Checks:
+- the deploy finishes, including on a single-connection pool, where the
+  planning session must be released before the waves can run
+- every object is created, and SCHEMA_VERSIONS records each one
+- a rerun skips every object, and --force redeploys every object
+- objects are planned after the ones they list in `depends`, such as the
+  views selecting the PORTFOLIO_ID column added by HOLDINGS_PORTFOLIO_ID
+"""
+import os
+import tempfile
+import threading
+
+from backends import DuckDBConnection, SQLiteConnection
+from connection_pool import ConnectionPool
+from migrations import deploy, plan
+from setup_snowflake import SCHEMA_OBJECTS
+from setup_snowflake_analytics import ANALYTICS_OBJECTS
+
+OBJECTS = SCHEMA_OBJECTS + ANALYTICS_OBJECTS
+CASES = [(1, 1), (1, 4), (2, 4), (5, 4)]
+
+def check(name, ok, failures):
+    print(f"{'✅' if ok else '❌'} {name}")
+    if not ok:
+        failures.append(name)
+
+def timed_deploy(pool, parallelism, timeout, force=False):
+    """deploy() on a thread; the report, or None if it did not finish within `timeout` seconds"""
+    outcome = {}
+
+    def run():
+        outcome['report'] = deploy(OBJECTS, pool=pool, parallelism=parallelism, force=force)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return outcome.get('report')
+
+def verify(backend='sqlite', timeout=60):
+    failures = []
+    names = sorted(obj.name for obj in OBJECTS)
+    waves, _ = plan(OBJECTS, {}, set())
+    order = {obj.name: i for i, wave in enumerate(waves) for obj in wave}
+    listed = [(obj.name, name) for obj in OBJECTS for name in obj.depends]
+    check(f"{len(listed)} listed dependencies are deployed in an earlier wave",
+          listed and all(order[name] < order[dependent] for dependent, name in listed), failures)
+    connection = SQLiteConnection if backend == 'sqlite' else DuckDBConnection
+    with tempfile.TemporaryDirectory() as directory:
+        for pool_size, parallelism in CASES:
+            case = f"pool {pool_size}, parallelism {parallelism}"
+            path = os.path.join(directory, f'schema-{pool_size}-{parallelism}.{backend}')
+            pool = ConnectionPool(lambda: connection(path), max_size=pool_size)
+
+            first = timed_deploy(pool, parallelism, timeout)
+            check(f"{case}: deploy finished", first is not None, failures)
+            if first is None:
+                # The deploy thread is still blocked on the pool
+                continue
+            with pool.checkout() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT NAME FROM SCHEMA_VERSIONS")
+                recorded = sorted(row[0] for row in cur.fetchall())
+                cur.close()
+            check(f"{case}: {len(first['deployed'])} objects deployed and recorded",
+                  sorted(first['deployed']) == names == recorded, failures)
+
+            rerun = timed_deploy(pool, parallelism, timeout)
+            check(f"{case}: rerun skipped every object",
+                  rerun is not None and not rerun['deployed'] and sorted(rerun['skipped']) == names, failures)
+            forced = timed_deploy(pool, parallelism, timeout, force=True)
+            check(f"{case}: forced rerun redeployed every object",
+                  forced is not None and sorted(forced['deployed']) == names, failures)
+            pool.close()
+    return len(failures)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check schema deploys across connection pool sizes')
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds before a deploy counts as hung')
+    args = parser.parse_args()
+    raise SystemExit(1 if verify(args.backend, args.timeout) else 0)
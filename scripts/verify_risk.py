@@ -0,0 +1,216 @@
+"""Cross-check risk.py against straightforward per-coin and per-pair loops.
+
+Runs on the verify_local_analytics fixture, loaded both from DAILY_OHLC on
+an embedded database and from the raw ticks, and on a synthetic matrix
+with staggered listings and missing days.
+"""
+import math
+import statistics
+from datetime import date, timedelta
+
+import numpy as np
+
+from local_analytics import PriceHistory, daily_ohlc, normalize_holdings
+from risk import covariance, load_returns, portfolio_risk, returns_from_history, returns_matrix
+from verify_local_analytics import HOLDINGS, connect, load_fixture, make_fixture_rows
+
+CONFIDENCES = (0.95, 0.99)
+TOLERANCE = 1e-9
+
+def reference_returns(closes_by_coin, days):
+    """{coin: [return or None per day]} with closes carried forward after the first close"""
+    returns = {}
+    for coin, closes in closes_by_coin.items():
+        series, previous, last = [], None, None
+        for day in days:
+            last = closes.get(day, last)
+            series.append(last / previous - 1 if previous is not None and last is not None else None)
+            previous = last
+        returns[coin] = series
+    return returns
+
+def reference_quantile(values, q):
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = math.floor(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def reference_var(values, confidence):
+    cutoff = reference_quantile(values, 1 - confidence)
+    tail = [value for value in values if value <= cutoff]
+    return -cutoff, -sum(tail) / len(tail)
+
+def reference_max_drawdown(values):
+    peak, worst = None, 0.0
+    for value in values:
+        if value is None:
+            continue
+        peak = value if peak is None else max(peak, value)
+        worst = min(worst, value / peak - 1)
+    return -worst
+
+def close(expected, actual):
+    if expected is None or (isinstance(expected, float) and math.isnan(expected)):
+        return actual is None or math.isnan(actual)
+    return math.isclose(expected, actual, rel_tol=TOLERANCE, abs_tol=TOLERANCE)
+
+def check(name, failures, ok, detail=''):
+    if ok:
+        print(f"✅ {name}")
+    else:
+        failures.append(name)
+        print(f"❌ {name} {detail}")
+
+def verify_against_reference(label, closes_by_coin, holdings):
+    failures = []
+    coin_ids, dates, closes = [], [], []
+    for coin, by_day in closes_by_coin.items():
+        for day, price in by_day.items():
+            coin_ids.append(coin)
+            dates.append(day)
+            closes.append(price)
+    matrix = returns_matrix(coin_ids, dates, closes)
+    days = sorted({day for by_day in closes_by_coin.values() for day in by_day})
+    coins = sorted(closes_by_coin)
+    expected = reference_returns(closes_by_coin, days)
+    print(f"{label}: {len(coins)} coins x {len(days)} days")
+
+    actual = {coin: [None if np.isnan(v) else float(v) for v in matrix.returns[:, i]] for i, coin in enumerate(matrix.coins)}
+    check('returns matrix', failures, list(matrix.coins) == coins and all(
+        len(actual[coin]) == len(expected[coin]) and all(
+            (a is None and e is None) or (a is not None and e is not None and close(e, a))
+            for a, e in zip(actual[coin], expected[coin]))
+        for coin in coins))
+
+    stats = covariance(matrix)
+    bad = None
+    for i, a in enumerate(coins):
+        for j, b in enumerate(coins):
+            pairs = [(x, y) for x, y in zip(expected[a], expected[b]) if x is not None and y is not None]
+            if len(pairs) < 2:
+                if not np.isnan(stats.cov[i, j]):
+                    bad = (a, b, 'cov', None, stats.cov[i, j])
+                continue
+            xs, ys = zip(*pairs)
+            ref_cov = statistics.covariance(xs, ys)
+            ref_corr = statistics.correlation(xs, ys) if statistics.pstdev(xs) and statistics.pstdev(ys) else float('nan')
+            if stats.counts[i, j] != len(pairs) or not close(ref_cov, stats.cov[i, j]):
+                bad = (a, b, 'cov', ref_cov, stats.cov[i, j])
+            elif not close(ref_corr, stats.corr[i, j]) and not math.isclose(ref_corr, stats.corr[i, j], abs_tol=1e-7):
+                bad = (a, b, 'corr', ref_corr, stats.corr[i, j])
+    check('pairwise covariance and correlation', failures, bad is None, bad)
+
+    report = portfolio_risk(matrix, holdings, CONFIDENCES)
+    amounts = {h.coin_id: float(h.amount) for h in normalize_holdings(holdings)}
+    last_prices = {coin: [v for v in (closes_by_coin[coin].get(day) for day in days) if v is not None][-1] for coin in coins}
+    values = {coin: amounts[coin] * last_prices[coin] for coin in coins if coin in amounts}
+    total = sum(values.values())
+    weights = {coin: value / total for coin, value in values.items()}
+
+    variance = 0.0
+    for a, wa in weights.items():
+        for b, wb in weights.items():
+            pairs = [(x, y) for x, y in zip(expected[a], expected[b]) if x is not None and y is not None]
+            if len(pairs) >= 2:
+                variance += wa * wb * statistics.covariance(*zip(*pairs))
+    check('portfolio volatility', failures, close(math.sqrt(variance), report['volatility']),
+          (math.sqrt(variance), report['volatility']))
+
+    portfolio = []
+    for t in range(len(days)):
+        held = [coin for coin in weights if expected[coin][t] is not None]
+        if held:
+            portfolio.append(sum(weights[coin] * expected[coin][t] for coin in held))
+    check('portfolio returns', failures, len(portfolio) == len(report['portfolio_returns']) and all(
+        close(e, a) for e, a in zip(portfolio, report['portfolio_returns'])))
+
+    for confidence in CONFIDENCES:
+        ref = reference_var(portfolio, confidence)
+        got = report['var'][confidence]['historical']
+        check(f'historical VaR/CVaR at {confidence:.0%}', failures, close(ref[0], got[0]) and close(ref[1], got[1]), (ref, got))
+
+        normal = statistics.NormalDist(statistics.fmean(portfolio), math.sqrt(variance))
+        ref_var = -normal.inv_cdf(1 - confidence)
+        # Normal expected shortfall by numerically integrating the tail quantiles
+        steps = 20000
+        ref_cvar = -sum(normal.inv_cdf((k + 0.5) / steps * (1 - confidence)) for k in range(steps)) / steps
+        got = report['var'][confidence]['parametric']
+        check(f'parametric VaR/CVaR at {confidence:.0%}', failures,
+              close(ref_var, got[0]) and math.isclose(ref_cvar, got[1], rel_tol=1e-4), ((ref_var, ref_cvar), got))
+
+        coin_var, coin_cvar = report['var'][confidence]['coin_historical']
+        bad = None
+        for i, coin in enumerate(coins):
+            observed = [v for v in expected[coin] if v is not None]
+            if observed:
+                ref = reference_var(observed, confidence)
+                if not (close(ref[0], coin_var[i]) and close(ref[1], coin_cvar[i])):
+                    bad = (coin, ref, (coin_var[i], coin_cvar[i]))
+        check(f'per-coin historical VaR/CVaR at {confidence:.0%}', failures, bad is None, bad)
+
+    wealth, value = [1.0], 1.0
+    for r in portfolio:
+        value *= 1 + r
+        wealth.append(value)
+    check('portfolio max drawdown', failures, close(reference_max_drawdown(wealth), report['max_drawdown']),
+          (reference_max_drawdown(wealth), report['max_drawdown']))
+    bad = None
+    for i, coin in enumerate(coins):
+        ref = reference_max_drawdown([closes_by_coin[coin].get(day) for day in days])
+        if not close(ref, report['coin_max_drawdowns'][i]):
+            bad = (coin, ref, report['coin_max_drawdowns'][i])
+    check('per-coin max drawdown', failures, bad is None, bad)
+    return failures
+
+def synthetic_closes(coins=25, days=120, seed=11):
+    """Random walks with staggered listings, delistings and missing days"""
+    rng = np.random.default_rng(seed)
+    start = date(2023, 1, 1)
+    closes = {}
+    for i in range(coins):
+        price = float(rng.uniform(0.5, 500))
+        first = int(rng.integers(0, days // 2)) if i % 3 else 0
+        last = days - int(rng.integers(0, days // 4)) if i % 5 == 4 else days
+        by_day = {}
+        for d in range(first, last):
+            price *= math.exp(rng.normal(0, 0.04))
+            if rng.random() < 0.1 and d != first:
+                continue
+            by_day[(start + timedelta(days=d)).isoformat()] = price
+        closes[f'coin-{i:02d}'] = by_day
+    holdings = [(f'coin-{i:02d}', f'C{i}', f'Coin {i}', float(rng.uniform(1, 100)), ('Layer 1', 'DeFi', 'Meme')[i % 3])
+                for i in range(0, coins, 2)]
+    return closes, holdings
+
+def verify(backend='sqlite'):
+    failures = []
+    rows = make_fixture_rows()
+    conn = connect(backend)
+    cur = load_fixture(conn, rows)
+    try:
+        from_warehouse = load_returns(cur)
+    finally:
+        conn.close()
+    history = PriceHistory.from_rows(rows)
+    from_history = returns_from_history(history)
+    check(f'DAILY_OHLC closes on {backend} match the raw ticks', failures,
+          list(from_warehouse.coins) == list(from_history.coins)
+          and np.array_equal(from_warehouse.dates, from_history.dates)
+          and np.allclose(from_warehouse.prices, from_history.prices, rtol=TOLERANCE, equal_nan=True))
+
+    fixture_closes = {}
+    for coin, series in history.items():
+        days, _, _, _, closes, _, _ = daily_ohlc(series)
+        fixture_closes[coin] = {str(day): float(price) for day, price in zip(days, closes)}
+    failures += verify_against_reference('Fixture', fixture_closes, HOLDINGS)
+    failures += verify_against_reference('Synthetic', *synthetic_closes())
+    return len(failures)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Cross-check the NumPy risk engine against reference loops')
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite')
+    args = parser.parse_args()
+    raise SystemExit(1 if verify(args.backend) else 0)
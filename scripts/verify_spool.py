@@ -0,0 +1,209 @@
+"""Outage, crash and corruption checks for the sync spool on an embedded database.
+
+Every statement pays a simulated round trip (--latency-ms), as against a
+remote warehouse. Checks:
+- queueing a sync returns well before a direct sync would
+- syncs queued while the database is unreachable all succeed, and the
+  flusher applies every one of them in a few large transactions once it is
+  back, leaving each portfolio with its last queued holdings
+- syncs committed by a flush whose checkpoint was lost are not applied again
+- a record torn by a crash mid-append is skipped and later ones are applied
+- appends from several processes at once are all readable
+"""
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backends import DuckDBConnection, SQLiteConnection
+from connection_pool import ConnectionPool
+from sync_spool import FRAME, MAGIC, SpoolFlusher
+
+COINS = [f'coin-{i}' for i in range(20)]
+PORTFOLIOS = ['alice', 'bob', 'carol', 'dave']
+
+class Outage:
+    """Connection factory that fails while `down` is set, like an unreachable warehouse"""
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.down = threading.Event()
+        self.refused = 0
+
+    def __call__(self):
+        if self.down.is_set():
+            self.refused += 1
+            raise ConnectionError("simulated outage")
+        return self.connect()
+
+def make_payload(rng, portfolio_id):
+    return {
+        'portfolio_id': portfolio_id,
+        'holdings': [
+            {'coin_id': coin, 'symbol': coin.upper(), 'name': coin, 'amount': rng.uniform(0.1, 10)}
+            for coin in rng.sample(COINS, 5)
+        ],
+        'prices': [
+            {'coin_id': coin, 'price_usd': rng.uniform(1, 1000), 'volume_24h_usd': rng.uniform(1e6, 1e8)}
+            for coin in COINS
+        ]
+    }
+
+def queue_payloads(seed, count):
+    """Queue `count` syncs from a separate process; returns how many were accepted"""
+    from snowflake_sync import sync_data
+
+    rng = random.Random(seed)
+    return sum(sync_data(make_payload(rng, rng.choice(PORTFOLIOS)), spool=True)['status'] == 'success'
+               for _ in range(count))
+
+def count(pool, sql):
+    with pool.checkout() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(sql)
+            return cur.fetchone()[0]
+        finally:
+            cur.close()
+
+def holdings(pool, portfolio_id):
+    with pool.checkout() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COIN_ID, AMOUNT FROM HOLDINGS WHERE PORTFOLIO_ID = %s", (portfolio_id,))
+            return sorted((coin_id, round(amount, 9)) for coin_id, amount in cur.fetchall())
+        finally:
+            cur.close()
+
+def expected_holdings(payload):
+    return sorted((holding['coin_id'], round(holding['amount'], 9)) for holding in payload['holdings'])
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def check(name, ok, failures):
+    print(f"{'✅' if ok else '❌'} {name}")
+    if not ok:
+        failures.append(name)
+
+def verify(backend='sqlite', syncs=200, latency=0.005, timeout=60):
+    failures = []
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as directory:
+        # Keeps the sync's spool and local state in the temporary directory
+        os.environ.update({'STORAGE_BACKEND': backend, 'SYNC_STATE_DIR': directory})
+        from setup_snowflake import create_tables
+        from snowflake_sync import get_config, sync_data
+        from sync_spool import get_spool
+
+        get_config.cache_clear()
+        path = os.path.join(directory, f'portfolio.{backend}')
+        connection = SQLiteConnection if backend == 'sqlite' else DuckDBConnection
+        conn = connection(path)
+        create_tables(conn.cursor())
+        conn.close()
+        spool = get_spool()
+        outage = Outage(lambda: connection(path, latency=latency))
+        pool = ConnectionPool(outage, max_size=1)
+        local = ConnectionPool(lambda: connection(path), max_size=1)
+
+        # Queueing versus writing directly
+        direct = []
+        for _ in range(20):
+            start = time.perf_counter()
+            result = sync_data(make_payload(rng, 'alice'), pool=pool, spool=False)
+            direct.append(time.perf_counter() - start)
+        queued = []
+        for _ in range(20):
+            start = time.perf_counter()
+            sync_data(make_payload(rng, 'alice'), spool=True)
+            queued.append(time.perf_counter() - start)
+        print(f"direct sync p50 {statistics.median(direct) * 1000:.2f} ms, "
+              f"queued p50 {statistics.median(queued) * 1000:.2f} ms, p99 {percentile(queued, 0.99) * 1000:.2f} ms")
+        check("queueing a sync returns faster than a direct sync",
+              result['status'] == 'success' and percentile(queued, 0.99) < statistics.median(direct), failures)
+        flusher = SpoolFlusher(pool=pool)
+        check("the queued syncs drain in one flush", flusher.drain() is None and flusher.stats['flushes'] == 1, failures)
+
+        # An outage: nothing can connect while the syncs are queued
+        pool.close()
+        pool = ConnectionPool(outage, max_size=1)
+        before = count(local, "SELECT COUNT(*) FROM PRICES")
+        outage.down.set()
+        flusher = SpoolFlusher(pool=pool, poll_seconds=0.05).start()
+        last = {}
+        accepted = 0
+        for _ in range(syncs):
+            payload = make_payload(rng, rng.choice(PORTFOLIOS))
+            accepted += sync_data(payload, spool=True)['status'] == 'success'
+            last[payload['portfolio_id']] = payload
+        time.sleep(1)
+        check(f"all {syncs} syncs queued during the outage ({outage.refused} connection attempts refused)",
+              accepted == syncs and outage.refused > 0 and count(local, "SELECT COUNT(*) FROM PRICES") == before,
+              failures)
+        outage.down.clear()
+        deadline = time.monotonic() + timeout
+        while spool.info()['queued'] and time.monotonic() < deadline:
+            time.sleep(0.1)
+        flusher.stop()
+        written = count(local, "SELECT COUNT(*) FROM PRICES") - before
+        check(f"after the outage {flusher.stats['applied']} syncs were applied in {flusher.stats['flushes']} flush(es)",
+              written == syncs * len(COINS) and flusher.stats['applied'] == syncs
+              and flusher.stats['flushes'] <= max(1, syncs // 10), failures)
+        check("each portfolio holds its last queued holdings",
+              all(holdings(local, portfolio_id) == expected_holdings(payload) for portfolio_id, payload in last.items()),
+              failures)
+
+        # A flush that committed but never wrote its checkpoint
+        for _ in range(10):
+            sync_data(make_payload(rng, 'bob'), spool=True)
+        position = spool.checkpoint()
+        flusher = SpoolFlusher(pool=pool)
+        flusher.flush_once()
+        before = count(local, "SELECT COUNT(*) FROM PRICES")
+        spool.ack(position)
+        result = flusher.flush_once()
+        check(f"a redelivered flush skipped its {result['details']['batches_duplicate']} applied syncs",
+              result['details']['batches_duplicate'] == 10 and result['details']['batches_applied'] == 0
+              and count(local, "SELECT COUNT(*) FROM PRICES") == before, failures)
+
+        # A crash partway through an append leaves a torn record
+        torn = FRAME.pack(MAGIC, 4096, 0) + b'{"id":'
+        segment = spool._path(spool.seqs()[-1])
+        with open(segment, 'ab') as f:
+            f.write(torn)
+        for _ in range(5):
+            sync_data(make_payload(rng, 'carol'), spool=True)
+        flusher = SpoolFlusher(pool=pool)
+        check("the syncs queued after a torn record are applied and the torn bytes skipped",
+              flusher.drain() is None and flusher.stats['applied'] == 5
+              and flusher.stats['corrupt_bytes'] == len(torn), failures)
+
+        # Several processes appending at once
+        with ProcessPoolExecutor(4) as executor:
+            accepted = sum(executor.map(queue_payloads, range(4), [50] * 4))
+        info = spool.info()
+        check(f"{info['queued']} syncs queued by 4 processes are all readable",
+              accepted == info['queued'] == 200 and info['corrupt_bytes'] == 0, failures)
+        flusher = SpoolFlusher(pool=pool)
+        check("they drain with each batch id applied once",
+              flusher.drain() is None and flusher.stats['applied'] == 200
+              and count(local, "SELECT COUNT(*) FROM SYNC_BATCHES")
+              == count(local, "SELECT COUNT(DISTINCT BATCH_ID) FROM SYNC_BATCHES"), failures)
+        pool.close()
+        local.close()
+    return len(failures)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check that spooled syncs survive outages, crashes and torn writes')
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite')
+    parser.add_argument('--syncs', type=int, default=200, help='syncs queued during the simulated outage')
+    parser.add_argument('--latency-ms', type=float, default=5, help='simulated round trip per statement')
+    args = parser.parse_args()
+    raise SystemExit(1 if verify(args.backend, args.syncs, args.latency_ms / 1000) else 0)
@@ -3,6 +3,7 @@ SELECT * FROM PORTFOLIO_PERFORMANCE;
 
 -- Add these queries to verify the data flow
 SELECT 
+    h.PORTFOLIO_ID,
     p.COIN_ID,
     h.SYMBOL,
     p.PRICE_USD,
@@ -15,6 +16,7 @@ ORDER BY p.TIMESTAMP DESC;
 
 -- Check the weighted average calculation
 SELECT 
+    h.PORTFOLIO_ID,
     h.CATEGORY,
     SUM(h.AMOUNT * p.PRICE_USD) as TOTAL_VALUE,
     SUM(h.AMOUNT * p.PRICE_USD * p.PRICE_CHANGE_24H_PCT) / 
@@ -29,5 +31,5 @@ JOIN (
     FROM PRICES
     WHERE TIMESTAMP >= DATEADD(hour, -24, CURRENT_TIMESTAMP())
 ) p ON h.COIN_ID = p.COIN_ID AND p.rn = 1
-GROUP BY h.CATEGORY
-ORDER BY TOTAL_VALUE DESC;
\ No newline at end of file
+GROUP BY h.PORTFOLIO_ID, h.CATEGORY
+ORDER BY h.PORTFOLIO_ID, TOTAL_VALUE DESC;
\ No newline at end of file
@@ -288,7 +288,7 @@ app.get('/api/search', async (req, res) => {
 app.post('/api/sync-snowflake', async (req, res) => {
   try {
     console.log('\n=== Starting Snowflake Sync ===')
-    const { holdings, prices } = req.body
+    const { holdings, prices, portfolio_id: portfolioId } = req.body
     
     if (!holdings || !prices) {
       console.log('❌ Missing required data')
@@ -301,6 +301,7 @@ app.post('/api/sync-snowflake', async (req, res) => {
     console.log('📊 Sync request received:', {
       holdings: holdings.length,
       prices: prices.length,
+      portfolio: portfolioId || process.env.PORTFOLIO_ID || 'default',
       timestamp: new Date().toISOString()
     })
 
@@ -315,8 +316,8 @@ app.post('/api/sync-snowflake', async (req, res) => {
     }
     console.log('✅ Snowflake configuration validated')
 
-    // Sync data using Node.js Snowflake driver
-    const result = await syncData(holdings, prices)
+    // Sync data through the Python sync, which also maintains LATEST_PRICES and the rollups
+    const result = await syncData(holdings, prices, portfolioId)
     
     if (result.status === 'error') {
       console.error('❌ Sync failed:', result.message)
@@ -89,8 +89,8 @@ export default function TechnicalIndicators() {
     // Safely parse numeric values with fallbacks
     const priceChange = parseFloat(item.price_change) || 0
     const rsi = parseFloat(item.rsi) || 0
-    const sma20 = parseFloat(item.sma_20) || 0
-    const ema50 = parseFloat(item.ema_50) || 0
+    const sma14 = parseFloat(item.sma_14) || 0
+    const sma30 = parseFloat(item.sma_30) || 0
 
     return (
       <Box key={item.coin} p={4} borderWidth="1px" borderRadius="md">
@@ -118,15 +118,15 @@ export default function TechnicalIndicators() {
         </Grid>
         <Grid templateColumns="repeat(2, 1fr)" gap={4} mt={4}>
           <Stat>
-            <StatLabel>SMA (20)</StatLabel>
-            <StatNumber>${sma20.toLocaleString(undefined, {
+            <StatLabel>SMA (14)</StatLabel>
+            <StatNumber>${sma14.toLocaleString(undefined, {
               minimumFractionDigits: 2,
               maximumFractionDigits: 2
             })}</StatNumber>
           </Stat>
           <Stat>
-            <StatLabel>EMA (50)</StatLabel>
-            <StatNumber>${ema50.toLocaleString(undefined, {
+            <StatLabel>SMA (30)</StatLabel>
+            <StatNumber>${sma30.toLocaleString(undefined, {
               minimumFractionDigits: 2,
               maximumFractionDigits: 2
             })}</StatNumber>
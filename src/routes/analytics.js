@@ -166,18 +166,16 @@ const mockData = {
     {
       coin: 'BTC',
       rsi: 65.4,
-      macd: 245.67,
-      sma_20: 43250.45,
-      ema_50: 42980.34,
+      sma_14: 43250.45,
+      sma_30: 42980.34,
       signal: 'buy',
       price_change: 2.5
     },
     {
       coin: 'ETH',
       rsi: 58.2,
-      macd: 78.45,
-      sma_20: 2280.12,
-      ema_50: 2245.78,
+      sma_14: 2280.12,
+      sma_30: 2245.78,
       signal: 'hold',
       price_change: -1.2
     }
@@ -358,28 +356,25 @@ router.get('/technical', async (req, res) => {
     const result = await getDataWithFallback(
       'technical',
       `
-      SELECT 
-        h.SYMBOL as COIN,
-        p.PRICE_USD,
-        p.PRICE_CHANGE_24H_PCT,
-        LAG(p.PRICE_USD, 20) OVER (PARTITION BY h.COIN_ID ORDER BY p.TIMESTAMP) as PRICE_20D_AGO,
-        LAG(p.PRICE_USD, 50) OVER (PARTITION BY h.COIN_ID ORDER BY p.TIMESTAMP) as PRICE_50D_AGO,
-        CASE 
-          WHEN p.PRICE_CHANGE_24H_PCT > 5 THEN 'buy'
-          WHEN p.PRICE_CHANGE_24H_PCT < -5 THEN 'sell'
-          ELSE 'hold'
-        END as SIGNAL
-      FROM HOLDINGS h
-      JOIN (${getLatestPricesQuery()}) p ON h.COIN_ID = p.COIN_ID
+      SELECT
+        t.SYMBOL as COIN,
+        t.PRICE_USD,
+        t.SMA_14,
+        t.SMA_30,
+        t.RSI,
+        t.TREND_SIGNAL,
+        l.PRICE_CHANGE_24H_PCT
+      FROM TECHNICAL_INDICATORS t
+      JOIN LATEST_PRICES l ON t.COIN_ID = l.COIN_ID
+      QUALIFY ROW_NUMBER() OVER (PARTITION BY t.COIN_ID ORDER BY t.TIMESTAMP DESC) = 1
       `,
       (rows) => rows.map(row => ({
         coin: row.COIN,
         price_change: row.PRICE_CHANGE_24H_PCT,
-        signal: row.SIGNAL,
-        sma_20: row.PRICE_20D_AGO || row.PRICE_USD,
-        ema_50: row.PRICE_50D_AGO || row.PRICE_USD,
-        rsi: calculateRSI(row.PRICE_CHANGE_24H_PCT),
-        macd: calculateMACD(row.PRICE_USD, row.PRICE_20D_AGO || row.PRICE_USD)
+        signal: row.TREND_SIGNAL === 'BULLISH' ? 'buy' : row.TREND_SIGNAL === 'BEARISH' ? 'sell' : 'hold',
+        sma_14: row.SMA_14,
+        sma_30: row.SMA_30,
+        rsi: row.RSI
       }))
     )
     res.json(result)
@@ -393,20 +388,6 @@ router.get('/technical', async (req, res) => {
   }
 })
 
-// Helper functions for technical calculations
-const calculateRSI = (priceChange) => {
-  // Simple RSI calculation based on 24h price change
-  const gain = Math.max(priceChange, 0)
-  const loss = Math.abs(Math.min(priceChange, 0))
-  const rs = gain / (loss || 1)
-  return 100 - (100 / (1 + rs))
-}
-
-const calculateMACD = (currentPrice, oldPrice) => {
-  // Simple MACD calculation
-  return currentPrice - oldPrice
-}
-
 // Risk analysis endpoint
 router.get('/risk', async (req, res) => {
   try {
@@ -1,5 +1,11 @@
+import path from 'path'
+import { fileURLToPath } from 'url'
+import pkg from 'python-shell'
 import snowflake from 'snowflake-sdk'
 
+const { PythonShell } = pkg
+const SCRIPTS_DIR = path.join(path.dirname(fileURLToPath(import.meta.url)), '..', '..', 'scripts')
+
 export const validateSnowflakeConfig = () => {
   const requiredVars = [
     'SNOWFLAKE_ACCOUNT',
@@ -48,113 +54,43 @@ export const getSnowflakeConnection = () => {
   })
 }
 
-export const syncData = async (holdings, prices) => {
-  try {
-    console.log('Starting Snowflake sync...')
-    const connection = await getSnowflakeConnection()
-
-    // Begin transaction
-    await new Promise((resolve, reject) => {
-      connection.execute({
-        sqlText: 'BEGIN',
-        complete: (err) => err ? reject(err) : resolve()
-      })
+// Runs scripts/snowflake_sync.py on one {holdings, prices} document. The Python
+// sync is the only supported writer: besides HOLDINGS and PRICES it maintains
+// LATEST_PRICES and the OHLC rollups the analytics views read, and it replaces
+// only the synced portfolio's holdings
+const runPythonSync = (payload, portfolioId) => {
+  return new Promise((resolve, reject) => {
+    const shell = new PythonShell('snowflake_sync.py', {
+      mode: 'text',
+      pythonPath: process.env.PYTHON_PATH || 'python3',
+      scriptPath: SCRIPTS_DIR,
+      args: ['--stdin'],
+      // Without one, the sync uses the server's PORTFOLIO_ID or 'default'
+      env: portfolioId ? { ...process.env, PORTFOLIO_ID: portfolioId } : process.env
     })
-
-    try {
-      // Clear existing holdings
-      await new Promise((resolve, reject) => {
-        connection.execute({
-          sqlText: 'DELETE FROM HOLDINGS',
-          complete: (err) => err ? reject(err) : resolve()
-        })
-      })
-
-      // Insert new holdings
-      for (const holding of holdings) {
-        await new Promise((resolve, reject) => {
-          connection.execute({
-            sqlText: `
-              INSERT INTO HOLDINGS (
-                COIN_ID,
-                SYMBOL,
-                NAME,
-                AMOUNT,
-                CATEGORY
-              ) VALUES (?, ?, ?, ?, ?)
-            `,
-            binds: [
-              holding.coin_id,
-              holding.symbol,
-              holding.name,
-              holding.amount,
-              holding.category || 'Other'
-            ],
-            complete: (err) => err ? reject(err) : resolve()
-          })
-        })
-      }
-
-      // Insert new prices
-      const timestamp = new Date().toISOString()
-      for (const price of prices) {
-        await new Promise((resolve, reject) => {
-          connection.execute({
-            sqlText: `
-              INSERT INTO PRICES (
-                COIN_ID,
-                TIMESTAMP,
-                PRICE_USD,
-                MARKET_CAP_USD,
-                VOLUME_24H_USD,
-                PRICE_CHANGE_24H_PCT
-              ) VALUES (?, ?, ?, ?, ?, ?)
-            `,
-            binds: [
-              price.coin_id,
-              timestamp,
-              price.price_usd,
-              price.market_cap_usd || 0,
-              price.volume_24h_usd || 0,
-              price.price_change_24h_pct || 0
-            ],
-            complete: (err) => err ? reject(err) : resolve()
-          })
-        })
+    const lines = []
+    shell.on('message', (line) => lines.push(line))
+    shell.on('stderr', (line) => console.log(line))
+    shell.send(JSON.stringify(payload))
+    shell.end((err) => {
+      // The script prints its result as JSON, including on failure
+      try {
+        resolve(JSON.parse(lines[lines.length - 1]))
+      } catch {
+        reject(err || new Error('Sync script returned no result'))
       }
+    })
+  })
+}
 
-      // Commit transaction
-      await new Promise((resolve, reject) => {
-        connection.execute({
-          sqlText: 'COMMIT',
-          complete: (err) => err ? reject(err) : resolve()
-        })
-      })
-
+export const syncData = async (holdings, prices, portfolioId) => {
+  try {
+    console.log('Starting Snowflake sync...')
+    const result = await runPythonSync({ holdings, prices }, portfolioId)
+    if (result.status === 'success') {
       console.log('✅ Sync completed successfully!')
-      return {
-        status: 'success',
-        message: 'Data synced successfully',
-        details: {
-          holdings_count: holdings.length,
-          prices_count: prices.length,
-          timestamp: timestamp
-        }
-      }
-    } catch (error) {
-      // Rollback on error
-      await new Promise((resolve) => {
-        connection.execute({
-          sqlText: 'ROLLBACK',
-          complete: () => resolve()
-        })
-      })
-      throw error
-    } finally {
-      connection.destroy((err) => {
-        if (err) console.error('Error destroying connection:', err)
-      })
     }
+    return result
   } catch (error) {
     console.error('Error syncing data:', error)
     return {
@@ -166,4 +102,4 @@ export const syncData = async (holdings, prices) => {
       }
     }
   }
-} 
\ No newline at end of file
+}